@@ -5,6 +5,10 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Поток push-событий /events/ (Server-Sent Events) держит соединение
+открытым и работает только здесь, например:
+    uvicorn bron.asgi:application
 """
 
 import os
@@ -37,6 +37,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'meeting_reservation_system',
 ]
 
@@ -136,5 +137,38 @@ EMAIL_USE_TLS = True
 EMAIL_HOST_USER = 'kirieshkayub2006@gmail.com'  # ЗАМЕНИ на свой Gmail
 EMAIL_HOST_PASSWORD = 'ixwm lmhd wpng qemv'  # Пароль из 16 символов
 EMAIL_USE_LOCALTIME = True
+EMAIL_TIMEOUT = 10  # секунды: зависший SMTP не должен держать воркер очереди
+EMAIL_POOL_SIZE = 2  # открытых SMTP-сессий на процесс воркера
+EMAIL_POOL_IDLE_TIMEOUT = 60  # секунды простоя, после которых сессия закрывается
+
+# Кэш процесса. Кэш строк отчётов сбрасывается в процессе, где изменили
+# бронь, поэтому с LocMemCache изменения из cron (update_booking_statuses)
+# веб-процесс видит не позже REPORT_ROWS_CACHE_TTL, а воркеры process_reports
+# кэш строк не используют. Для точного сброса и нескольких веб-воркеров
+# подключите общий кэш (Redis/Memcached)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+
+SITE_DOMAIN = 'http://localhost:8000'
 
-SITE_DOMAIN = 'http://localhost:8000'
\ No newline at end of file
+# Удержание слота на время заполнения формы брони
+BOOKING_HOLD_STORE = 'meeting_reservation_system.holds.DatabaseHoldStore'
+BOOKING_HOLD_TTL = 300  # секунды
+
+# Брокер push-событий (SSE): память процесса подходит для одного ASGI-процесса
+BOOKING_EVENT_BROKER = 'meeting_reservation_system.events.InMemoryEventBroker'
+
+# Фоновые отчёты: рендерер на формат, срок жизни готового файла, процессы воркера
+REPORT_RENDERERS = {
+    'pdf': 'meeting_reservation_system.reports.PdfkitReportRenderer',
+    'xlsx': 'meeting_reservation_system.reports.ExcelReportRenderer',
+}
+REPORT_CACHE_TTL = 600  # секунды
+REPORT_ROWS_CACHE_TTL = 300  # секунды: строки отчёта по фильтрам (сбрасываются и при изменении броней)
+REPORT_CACHE_ALIAS = 'default'
+REPORT_WORKERS = 2
+WKHTMLTOPDF_PATH = ''  # пусто — искать wkhtmltopdf в PATH
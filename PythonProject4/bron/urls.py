@@ -20,6 +20,7 @@ urlpatterns = [
     path('login/success/', views.login_success_view, name='login_with_success'),
     path('admin-panel/', views.admin_panel, name='admin_panel'),
     path('manager-panel/', views.manager_panel, name='manager_panel'),
+    path('api/manager-bookings/', views.manager_bookings_api, name='manager_bookings_api'),
     path('admin-panel/user/<int:user_id>/', views.admin_user_profile, name='admin_user_profile'),
     path('info/', views.info_page, name='info'),
 
@@ -30,9 +31,14 @@ urlpatterns = [
     path('support/ticket/<int:ticket_id>/close/', views.close_ticket, name='close_ticket'),
     path('support/ticket/<int:ticket_id>/check-status/', views.check_ticket_status, name='check_ticket_status'),
     path('support/ticket/<int:ticket_id>/delete/', views.delete_ticket, name='delete_ticket'),
+    path('events/', views.event_stream, name='event_stream'),
 
     path('api/available-rooms/', views.get_available_rooms, name='available_rooms'),
     path('api/create-booking/', views.create_booking, name='create_booking'),
+    path('api/create-recurring-booking/', views.create_recurring_booking, name='create_recurring_booking'),
+    path('api/hold-slot/', views.hold_slot_api, name='hold_slot'),
+    path('api/release-hold/', views.release_hold_api, name='release_hold'),
+    path('api/join-waitlist/', views.join_waitlist_api, name='join_waitlist'),
 
     path('room-management/', views.room_management_main, name='room_management_main'),
     path('room-management/<str:category>/', views.room_management_category, name='room_management_category'),
@@ -45,7 +51,11 @@ urlpatterns = [
 
 
     path('api/update-booking-status/<int:booking_id>/', views.update_booking_status, name='update_booking_status'),
+    path('api/bulk-update-booking-status/', views.bulk_update_booking_status, name='bulk_update_booking_status'),
     path('api/available-times/<int:room_id>/', views.get_available_times, name='available_times'),
+    path('api/availability-matrix/', views.get_availability_matrix, name='availability_matrix'),
+    path('api/next-slots/', views.find_next_slots_api, name='next_slots_api'),
+    path('next-slots/', views.next_slots_page, name='next_slots'),
     path('api/delete-booking/<int:booking_id>/', views.delete_booking, name='delete_booking'),
 
     path('api/delete-user/<int:user_id>/', views.delete_user, name='delete_user'),
@@ -62,7 +72,14 @@ urlpatterns = [
 
     path('report/', views.report_page, name='report_page'),
     path('report/export_excel/', views.export_excel, name='export_excel'),
+    path('api/report/rollups/', views.rollup_stats_api, name='rollup_stats_api'),
+    path('api/report/analytics/', views.occupancy_analytics_api, name='occupancy_analytics_api'),
+    path('report/export_analytics/', views.export_analytics, name='export_analytics'),
+    path('report/export_csv/', views.export_csv, name='export_csv'),
+    path('report/export_parquet/', views.export_parquet, name='export_parquet'),
     path('report/export_pdf/', views.export_pdf, name='export_pdf'),
+    path('report/jobs/<int:job_id>/', views.report_job_status, name='report_job_status'),
+    path('report/jobs/<int:job_id>/download/', views.download_report, name='download_report'),
 ]
 
 urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
@@ -1,5 +1,11 @@
 from django.contrib import admin
-from .models import User, Room, Booking, SupportTicket, TicketResponse, FAQ,  Office
+from django.utils import timezone
+from .availability import BUSY_STATUSES
+from .events import booking_deleted, bookings_deleted
+from .occupancy import booking_changed, bookings_changed
+from .reminders import schedule_reminders
+from .waitlist import booking_released
+from .models import User, Room, Booking, SupportTicket, TicketResponse, FAQ,  Office, SlotHold, WaitlistEntry, OutboxEmail, ReportJob, BookingRollup
 
 
 @admin.register(Office)
@@ -63,4 +69,71 @@ class RoomAdmin(admin.ModelAdmin):
 class BookingAdmin(admin.ModelAdmin):
     list_display = ['user', 'room', 'start_time', 'end_time', 'status']
     list_filter = ['status', 'start_time']
-    search_fields = ['user__username', 'room__name']
\ No newline at end of file
+    search_fields = ['user__username', 'room__name']
+    readonly_fields = ['reminder_stage', 'next_reminder_at']
+
+    # Правки из админки тоже должны попадать в RoomOccupancy и расписание напоминаний
+    def save_model(self, request, obj, form, change):
+        if change:
+            booking_changed(Booking.objects.get(pk=obj.pk))
+        if 'start_time' in form.changed_data:
+            obj.reminder_stage = 0
+        schedule_reminders(obj)
+        super().save_model(request, obj, form, change)
+        booking_changed(obj)
+
+    def delete_model(self, request, obj):
+        booking_id = obj.pk
+        super().delete_model(request, obj)
+        booking_changed(obj)
+        booking_deleted(obj, booking_id)
+        if obj.status in BUSY_STATUSES:
+            booking_released(obj)
+
+    def delete_queryset(self, request, queryset):
+        bookings = list(queryset)
+        super().delete_queryset(request, queryset)
+        bookings_changed([(booking.room_id, booking.start_time, booking.end_time) for booking in bookings])
+        bookings_deleted([(booking.id, booking.user_id) for booking in bookings])
+        for booking in bookings:
+            if booking.status in BUSY_STATUSES:
+                booking_released(booking)
+
+
+@admin.register(SlotHold)
+class SlotHoldAdmin(admin.ModelAdmin):
+    list_display = ['room', 'user', 'start_time', 'end_time', 'expires_at']
+    list_filter = ['room']
+
+
+@admin.register(WaitlistEntry)
+class WaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ['user', 'room', 'start_time', 'end_time', 'status', 'created_at']
+    list_filter = ['status', 'room']
+    search_fields = ['user__username', 'room__name']
+
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ['subject', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at']
+    list_filter = ['status']
+    search_fields = ['subject', 'last_error']
+    actions = ['retry_now']
+
+    @admin.action(description='Повторить отправку сейчас')
+    def retry_now(self, request, queryset):
+        queryset.exclude(status='sent').update(status='pending', attempts=0, next_attempt_at=timezone.now())
+
+
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'format', 'status', 'requested_by', 'created_at', 'finished_at', 'expires_at']
+    list_filter = ['status', 'format']
+    readonly_fields = ['key', 'params', 'error']
+
+
+@admin.register(BookingRollup)
+class BookingRollupAdmin(admin.ModelAdmin):
+    list_display = ['day', 'room', 'office', 'confirmed_count', 'completed_count', 'cancelled_count', 'booked_minutes', 'revenue']
+    list_filter = ['office']
+    date_hierarchy = 'day'
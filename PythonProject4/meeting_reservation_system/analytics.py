@@ -0,0 +1,355 @@
+"""
+Аналитика загрузки комнат на NumPy: тепловые карты «час × день недели»,
+пиковая одновременная занятость и перцентили загрузки.
+
+Интервалы броней читаются одним запросом сразу в массивы int64 — минуты
+местного времени от эпохи, без создания моделей. Дальше всё считается
+векторно:
+
+* занятость по минутам — разностный массив (np.bincount начал минус
+  np.bincount концов) и np.cumsum: число занятых комнат группы на каждой
+  минуте периода за O(броней + минут);
+* тепловая карта — минуты сворачиваются reshape в (день, час, минута),
+  усредняются по часу и складываются по дням недели;
+* загрузка комнат — доля рабочего дня (WORK_DAY_START–WORK_DAY_END),
+  занятая бронями, для каждой пары (комната, день); брони через полночь
+  режутся по дням через np.repeat.
+
+Группы — офисы или категории комнат. Доли в тепловой карте — средняя
+доля занятых комнат группы. Результат кэшируется по фильтрам с версиями
+дней периода (report_cache), так что новая бронь сбрасывает только
+задетые отчёты.
+"""
+from datetime import date, datetime, time, timedelta
+
+import numpy as np
+from django.db import connection
+from django.db.models import BigIntegerField, F, Func, Value
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from openpyxl import Workbook
+from openpyxl.formatting.rule import ColorScaleRule
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter
+
+from . import report_cache
+from .availability import WORK_DAY_END, WORK_DAY_START
+from .models import Booking, Room
+from .occupancy import OCCUPANCY_STATUSES
+
+
+MINUTES_PER_DAY = 24 * 60
+
+# Период по умолчанию — четыре недели: каждый день недели встречается поровну
+DEFAULT_DAYS = 28
+MAX_DAYS = 366
+
+GROUPINGS = ('office', 'category')
+
+PERCENTILES = (50, 75, 90, 99)
+
+WEEKDAYS = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс']
+
+# Строка выборки: начало, конец (минуты местного времени от эпохи), room_id
+INTERVAL_DTYPE = np.dtype((np.int64, 3))
+
+EPOCH_DAY = date(1970, 1, 1)
+
+
+class LocalMinutes(Func):
+    """Минуты местного времени от эпохи: EXTRACT(EPOCH FROM момент AT TIME ZONE пояс) / 60"""
+    template = 'FLOOR(EXTRACT(EPOCH FROM (%(expressions)s)) / 60)::bigint'
+    arg_joiner = ' AT TIME ZONE '
+    output_field = BigIntegerField()
+
+
+def parse_options(query):
+    """
+    Параметры аналитики из GET: start_date, end_date, group_by, office, category.
+
+    По умолчанию — DEFAULT_DAYS дней по сегодня, группы — офисы.
+    Некорректные параметры — ValueError с текстом для пользователя.
+    """
+    today = timezone.localdate()
+    try:
+        last_day = parse_date(query.get('end_date') or '') or today
+        first_day = parse_date(query.get('start_date') or '') or last_day - timedelta(days=DEFAULT_DAYS - 1)
+    except ValueError:
+        raise ValueError('Неверный формат даты')
+    if first_day > last_day:
+        raise ValueError('Начало периода позже конца')
+    if (last_day - first_day).days >= MAX_DAYS:
+        raise ValueError(f'Период не длиннее {MAX_DAYS} дней')
+
+    group_by = query.get('group_by') or 'office'
+    if group_by not in GROUPINGS:
+        raise ValueError('Неизвестная группировка')
+    return {
+        'first_day': first_day,
+        'last_day': last_day,
+        'group_by': group_by,
+        'office_id': query.get('office') or None,
+        'category': query.get('category') or None,
+    }
+
+
+def load_rooms(office_id=None, category=None):
+    """Комнаты отчёта: (id, office_id, название офиса, категория)"""
+    rooms = Room.objects.all()
+    if office_id:
+        rooms = rooms.filter(office_id=office_id)
+    if category:
+        rooms = rooms.filter(category=category)
+    return list(rooms.order_by('id').values_list('id', 'office_id', 'office__name', 'category'))
+
+
+def load_intervals(first_day, last_day, room_ids):
+    """
+    Брони, задевающие период, как массив (n, 3) int64 — один запрос.
+
+    Строки курсора сразу собираются np.fromiter, без промежуточного списка
+    кортежей и без моделей.
+    """
+    tz = timezone.get_current_timezone()
+    window_start = timezone.make_aware(datetime.combine(first_day, time.min), tz)
+    window_end = timezone.make_aware(datetime.combine(last_day + timedelta(days=1), time.min), tz)
+    tzname = Value(timezone.get_current_timezone_name())
+
+    bookings = (
+        Booking.objects
+        .filter(
+            # Обычное условие пересечения: длину брони ничто не ограничивает
+            status__in=OCCUPANCY_STATUSES, room_id__in=room_ids,
+            start_time__lt=window_end, end_time__gt=window_start,
+        )
+        .annotate(
+            start_minute=LocalMinutes(F('start_time'), tzname),
+            end_minute=LocalMinutes(F('end_time'), tzname),
+        )
+        .values_list('start_minute', 'end_minute', 'room_id')
+        .order_by()
+    )
+    sql, params = bookings.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return np.fromiter(cursor, dtype=INTERVAL_DTYPE)
+
+
+def minute_occupancy(starts, ends, minutes):
+    """Число занятых комнат на каждой минуте периода (разностный массив + cumsum)"""
+    starts = np.clip(starts, 0, minutes)
+    ends = np.clip(ends, 0, minutes)
+    delta = np.bincount(starts, minlength=minutes + 1) - np.bincount(ends, minlength=minutes + 1)
+    return np.cumsum(delta[:minutes], dtype=np.int32)
+
+
+def weekday_heatmap(occupancy, first_weekday):
+    """Среднее число занятых комнат по (день недели, час) — массив 7 × 24"""
+    days = occupancy.size // MINUTES_PER_DAY
+    hourly = occupancy.reshape(days, 24, 60).mean(axis=2)
+    weekdays = (first_weekday + np.arange(days)) % 7
+    sums = np.zeros((7, 24))
+    np.add.at(sums, weekdays, hourly)
+    counts = np.bincount(weekdays, minlength=7)[:, None]
+    return np.divide(sums, counts, out=np.zeros_like(sums), where=counts > 0)
+
+
+def room_day_utilization(starts, ends, rooms, room_count, days):
+    """
+    Доля рабочего дня, занятая бронями, — массив (комната, день).
+
+    Интервал, переходящий через полночь, размножается по дням (np.repeat)
+    и каждый кусок обрезается рабочим окном своего дня.
+    """
+    work_start = WORK_DAY_START.hour * 60 + WORK_DAY_START.minute
+    work_end = WORK_DAY_END.hour * 60 + WORK_DAY_END.minute
+    starts = np.clip(starts, 0, days * MINUTES_PER_DAY)
+    ends = np.clip(ends, 0, days * MINUTES_PER_DAY)
+    keep = ends > starts
+    starts, ends, rooms = starts[keep], ends[keep], rooms[keep]
+
+    first = starts // MINUTES_PER_DAY
+    spans = (ends - 1) // MINUTES_PER_DAY - first + 1
+    piece = np.repeat(np.arange(starts.size), spans)
+    day = first[piece] + np.arange(piece.size) - np.repeat(np.cumsum(spans) - spans, spans)
+    day_start = day * MINUTES_PER_DAY
+    busy = (
+        np.minimum(ends[piece], day_start + work_end)
+        - np.maximum(starts[piece], day_start + work_start)
+    ).clip(min=0)
+
+    minutes = np.bincount(rooms[piece] * days + day, weights=busy, minlength=room_count * days)
+    return np.minimum(minutes.reshape(room_count, days) / (work_end - work_start), 1.0)
+
+
+def analyze(intervals, room_groups, group_count, first_day, days):
+    """
+    Векторный расчёт по интервалам ``intervals`` (начало, конец, индекс комнаты).
+
+    ``room_groups`` — номер группы для каждого индекса комнаты. Возвращает
+    по группам (и итог последним элементом) словари с занятостью по
+    минутам, тепловой картой и загрузкой пар (комната, день).
+    """
+    minutes = days * MINUTES_PER_DAY
+    base = (first_day - EPOCH_DAY).days * MINUTES_PER_DAY
+    starts = intervals[:, 0] - base
+    ends = intervals[:, 1] - base
+    rooms = intervals[:, 2]
+
+    utilization = room_day_utilization(starts, ends, rooms, room_groups.size, days)
+
+    # Интервалы по группам: одна сортировка, дальше срезы
+    groups = room_groups[rooms]
+    order = np.argsort(groups, kind='stable')
+    bounds = np.searchsorted(groups[order], np.arange(group_count + 1))
+
+    results = []
+    total = np.zeros(minutes, dtype=np.int32)
+    for group in range(group_count):
+        part = order[bounds[group]:bounds[group + 1]]
+        occupancy = minute_occupancy(starts[part], ends[part], minutes)
+        total += occupancy
+        results.append(_group_stats(occupancy, utilization[room_groups == group], first_day))
+    results.append(_group_stats(total, utilization, first_day))
+    return results
+
+
+def _group_stats(occupancy, utilization, first_day):
+    peak = int(occupancy.argmax()) if occupancy.size else 0
+    return {
+        'occupancy': occupancy,
+        'heatmap': weekday_heatmap(occupancy, first_day.weekday()),
+        'peak': int(occupancy[peak]) if occupancy.size else 0,
+        'peak_minute': peak,
+        'utilization': utilization.ravel(),
+    }
+
+
+def _group_key(room, group_by):
+    room_id, office_id, office_name, category = room
+    if group_by == 'office':
+        return office_id or 0, office_name or 'Без офиса'
+    return category, dict(Room.CATEGORY_CHOICES).get(category, category)
+
+
+def _summary(key, label, rooms, stats, first_day):
+    heatmap = stats['heatmap'] / rooms
+    weekday, hour = np.unravel_index(int(heatmap.argmax()), heatmap.shape)
+    peak_at = None
+    if stats['peak']:
+        peak_at = timezone.make_aware(
+            datetime.combine(first_day, time.min) + timedelta(minutes=stats['peak_minute']),
+        ).isoformat()
+    utilization = stats['utilization']
+    return {
+        'key': key,
+        'label': label,
+        'rooms': rooms,
+        'heatmap': np.round(heatmap, 4).tolist(),
+        'busiest': {'weekday': WEEKDAYS[weekday], 'hour': int(hour), 'share': round(float(heatmap[weekday, hour]), 4)},
+        'peak_concurrency': stats['peak'],
+        'peak_at': peak_at,
+        'utilization': {
+            'mean': round(float(utilization.mean()), 4),
+            **{
+                f'p{percentile}': round(float(value), 4)
+                for percentile, value in zip(PERCENTILES, np.percentile(utilization, PERCENTILES))
+            },
+        },
+    }
+
+
+def occupancy_analytics(first_day, last_day, group_by='office', office_id=None, category=None):
+    """
+    Тепловые карты, пики и перцентили загрузки по группам комнат.
+
+    Два запроса (комнаты и интервалы броней); результат — словарь,
+    готовый для JSON, кэшируется по фильтрам и версиям дней периода.
+    """
+    params = {
+        'start_date': first_day, 'end_date': last_day, 'group_by': group_by,
+        'office': office_id, 'category': category,
+    }
+    key = report_cache.cache_key('analytics', params, report_cache.version_keys(first_day, last_day))
+    result = report_cache.load(key)
+    if result is not None:
+        return result
+
+    days = (last_day - first_day).days + 1
+    result = {
+        'start_date': first_day.isoformat(),
+        'end_date': last_day.isoformat(),
+        'group_by': group_by,
+        'weekdays': WEEKDAYS,
+        'intervals': 0,
+        'groups': [],
+        'total': None,
+    }
+    rooms = load_rooms(office_id, category)
+    if rooms:
+        room_ids = np.array([room[0] for room in rooms], dtype=np.int64)
+        lookup = np.full(int(room_ids.max()) + 1, -1, dtype=np.int64)
+        lookup[room_ids] = np.arange(room_ids.size)
+
+        keys = sorted({_group_key(room, group_by) for room in rooms}, key=lambda item: str(item[1]))
+        index = {group_key: position for position, (group_key, label) in enumerate(keys)}
+        room_groups = np.array([index[_group_key(room, group_by)[0]] for room in rooms], dtype=np.int64)
+
+        intervals = load_intervals(first_day, last_day, room_ids.tolist())
+        intervals[:, 2] = lookup[intervals[:, 2]]
+        stats = analyze(intervals, room_groups, len(keys), first_day, days)
+
+        sizes = np.bincount(room_groups, minlength=len(keys))
+        result['intervals'] = len(intervals)
+        result['groups'] = [
+            _summary(group_key, label, int(sizes[position]), stats[position], first_day)
+            for position, (group_key, label) in enumerate(keys)
+        ]
+        result['total'] = _summary('all', 'Все комнаты', len(rooms), stats[-1], first_day)
+
+    report_cache.store(key, result)
+    return result
+
+
+def write_analytics_excel(result, target):
+    """Книга xlsx: сводка по группам и лист «Загрузка по часам» с тепловыми картами"""
+    workbook = Workbook()
+    bold = Font(bold=True)
+
+    summary = workbook.active
+    summary.title = 'Сводка'
+    headers = ['Группа', 'Комнат', 'Пик занятых', 'Момент пика', 'Самый загруженный час', 'Средняя загрузка']
+    headers += [f'P{percentile}' for percentile in PERCENTILES]
+    summary.append(headers)
+    for cell in summary[1]:
+        cell.font = bold
+    groups = result['groups'] + ([result['total']] if result['total'] else [])
+    for group in groups:
+        busiest = group['busiest']
+        summary.append([
+            group['label'], group['rooms'], group['peak_concurrency'], group['peak_at'] or '',
+            f"{busiest['weekday']} {busiest['hour']:02d}:00",
+            group['utilization']['mean'],
+            *[group['utilization'][f'p{percentile}'] for percentile in PERCENTILES],
+        ])
+    for index, width in enumerate([30, 10, 12, 28, 22, 16] + [8] * len(PERCENTILES), 1):
+        summary.column_dimensions[get_column_letter(index)].width = width
+
+    sheet = workbook.create_sheet('Загрузка по часам')
+    sheet.column_dimensions['A'].width = 30
+    row = 1
+    for group in groups:
+        sheet.cell(row=row, column=1, value=group['label']).font = bold
+        for hour in range(24):
+            sheet.cell(row=row, column=hour + 2, value=f'{hour:02d}').font = bold
+        for weekday, shares in enumerate(group['heatmap']):
+            sheet.cell(row=row + weekday + 1, column=1, value=WEEKDAYS[weekday])
+            for hour, share in enumerate(shares):
+                cell = sheet.cell(row=row + weekday + 1, column=hour + 2, value=share)
+                cell.number_format = '0%'
+        sheet.conditional_formatting.add(
+            f'B{row + 1}:Y{row + 7}',
+            ColorScaleRule(start_type='num', start_value=0, start_color='FFFFFF', end_type='num', end_value=1, end_color='F8696B'),
+        )
+        row += 9
+    workbook.save(target)
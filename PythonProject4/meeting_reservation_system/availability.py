@@ -0,0 +1,272 @@
+"""
+Движок доступности комнат.
+
+Работает с интервалами времени, а не с почасовыми строками: брони комнаты
+достаются одним запросом на пересечение диапазонов, склеиваются в
+отсортированный список занятых интервалов, а слоты любой длины
+(15/30/60 минут) нарезаются одним проходом по этому списку.
+"""
+import heapq
+from bisect import bisect_right
+from datetime import datetime, time, timedelta
+from time import monotonic
+
+from django.db.backends.postgresql.psycopg_any import DateTimeTZRange
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import Booking, Room, TsTzRange
+
+
+# Статусы, которые занимают комнату (совпадают с условием booking_no_overlap)
+BUSY_STATUSES = ('pending', 'confirmed')
+
+# Имя exclusion-ограничения, запрещающего пересечение активных броней
+OVERLAP_CONSTRAINT = 'booking_no_overlap'
+
+# Рабочий день (локальное время, Asia/Irkutsk)
+WORK_DAY_START = time(9, 0)
+WORK_DAY_END = time(20, 0)
+
+# Допустимая длина слота в минутах
+SLOT_GRANULARITIES = (15, 30, 60)
+DEFAULT_GRANULARITY = 60
+
+# Поиск ближайшего свободного окна: шаг просмотра, горизонт и бюджет времени
+SEARCH_WINDOW_DAYS = 7
+SEARCH_HORIZON_DAYS = 180
+SEARCH_TIME_BUDGET = 0.25  # секунды
+
+
+def day_bounds(day, tz=None):
+    """Начало и конец рабочего дня ``day`` как aware datetime"""
+    tz = tz or timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(day, WORK_DAY_START), tz)
+    end = timezone.make_aware(datetime.combine(day, WORK_DAY_END), tz)
+    return start, end
+
+
+def overlapping_bookings(start, end, room_ids=None):
+    """
+    Активные брони, пересекающие полуинтервал [start, end).
+
+    Условие записано тем же выражением tstzrange(start_time, end_time) &&,
+    что и в ограничении booking_no_overlap, поэтому запрос идёт по его
+    GiST-индексу.
+    """
+    bookings = Booking.objects.alias(
+        span=TsTzRange('start_time', 'end_time'),
+    ).filter(
+        span__overlap=DateTimeTZRange(start, end),
+        status__in=BUSY_STATUSES,
+    )
+    if room_ids is not None:
+        bookings = bookings.filter(room_id__in=room_ids)
+    return bookings
+
+
+def free_rooms(start, end, rooms=None):
+    """
+    Комнаты, свободные на всём окне [start, end).
+
+    Занятость проверяется одним коррелированным NOT EXISTS-подзапросом
+    (anti-join) внутри запроса к комнатам, а не циклом по комнатам.
+    """
+    if rooms is None:
+        rooms = Room.objects.all()
+    busy = overlapping_bookings(start, end).filter(room_id=OuterRef('pk'))
+    return rooms.filter(~Exists(busy))
+
+
+def parse_window(date_str, time_str, duration_hours):
+    """Окно брони по дате YYYY-MM-DD, времени HH:MM и длительности в часах"""
+    naive = datetime.strptime(f"{date_str} {time_str}", "%Y-%m-%d %H:%M")
+    start = timezone.make_aware(naive, timezone.get_current_timezone())
+    return start, start + timedelta(hours=int(duration_hours))
+
+
+def is_overlap_error(exc):
+    """IntegrityError вызвана ограничением booking_no_overlap?"""
+    diag = getattr(exc.__cause__, 'diag', None)
+    return getattr(diag, 'constraint_name', None) == OVERLAP_CONSTRAINT
+
+
+def merge_intervals(intervals):
+    """Сортирует интервалы и склеивает пересекающиеся и смежные"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+def clip_intervals(intervals, start, end):
+    """Обрезает отсортированные интервалы по окну [start, end)"""
+    clipped = []
+    for busy_start, busy_end in intervals:
+        if busy_end <= start or busy_start >= end:
+            continue
+        clipped.append((max(busy_start, start), min(busy_end, end)))
+    return clipped
+
+
+def busy_intervals(room_id, start, end):
+    """Склеенные занятые интервалы комнаты внутри окна — один запрос к БД"""
+    rows = overlapping_bookings(start, end, [room_id]).values_list('start_time', 'end_time')
+    return clip_intervals(merge_intervals(rows), start, end)
+
+
+def overlaps_any(busy, start, end):
+    """Пересекает ли [start, end) отсортированные склеенные интервалы — бинарный поиск"""
+    index = bisect_right(busy, start, key=lambda interval: interval[1])
+    return index < len(busy) and busy[index][0] < end
+
+
+def free_intervals(busy, start, end):
+    """Дополнение к занятым интервалам внутри окна [start, end)"""
+    free = []
+    cursor = start
+    for busy_start, busy_end in busy:
+        if busy_start > cursor:
+            free.append((cursor, busy_start))
+        cursor = max(cursor, busy_end)
+    if cursor < end:
+        free.append((cursor, end))
+    return free
+
+
+def split_slots(busy, start, end, granularity=DEFAULT_GRANULARITY):
+    """
+    Нарезает окно на слоты по ``granularity`` минут.
+
+    ``busy`` — отсортированные склеенные интервалы. Слот свободен, если
+    [t, t + granularity) не пересекается ни с одним из них. Возвращает
+    (свободные, занятые) списки начал слотов. Один проход двумя указателями:
+    O(слотов + интервалов), без сканирования списков.
+    """
+    step = timedelta(minutes=granularity)
+    free, booked = [], []
+    index = 0
+    slot_start = start
+    while slot_start + step <= end:
+        slot_end = slot_start + step
+        while index < len(busy) and busy[index][1] <= slot_start:
+            index += 1
+        if index < len(busy) and busy[index][0] < slot_end:
+            booked.append(slot_start)
+        else:
+            free.append(slot_start)
+        slot_start = slot_end
+    return free, booked
+
+
+def slot_labels(granularity=DEFAULT_GRANULARITY):
+    """Подписи слотов рабочего дня: ['09:00', '10:00', ...]"""
+    start = datetime.combine(datetime.min, WORK_DAY_START)
+    end = datetime.combine(datetime.min, WORK_DAY_END)
+    step = timedelta(minutes=granularity)
+    labels = []
+    while start + step <= end:
+        labels.append(start.strftime('%H:%M'))
+        start += step
+    return labels
+
+
+def align_up(value, day_start, step):
+    """Округляет время вверх до ближайшей границы слота от начала дня"""
+    return day_start - ((day_start - value) // step) * step
+
+
+def find_next_slots(room_ids, start_from, duration, limit=5,
+                    horizon_days=SEARCH_HORIZON_DAYS, time_budget=SEARCH_TIME_BUDGET,
+                    granularity=DEFAULT_GRANULARITY):
+    """
+    Первые ``limit`` свободных окон длиной ``duration`` не раньше ``start_from``.
+
+    Время просматривается порциями по SEARCH_WINDOW_DAYS дней: на порцию —
+    один запрос броней всех комнат, затем по каждой комнате один проход
+    (sweep) по её отсортированным занятым интервалам и рабочим дням.
+    Из каждого свободного промежутка берётся самое раннее начало на границе
+    слота. Как только набрано ``limit`` окон, более поздние дни не смотрим.
+
+    Возвращает (список (start, end, room_id), поиск_завершён). Если
+    ``time_budget`` секунд исчерпан, отдаётся найденное на этот момент,
+    а поиск считается незавершённым.
+    """
+    if duration <= timedelta(0):
+        raise ValueError('Длительность должна быть положительной')
+    deadline = monotonic() + time_budget
+    step = timedelta(minutes=granularity)
+    found = []
+    if not room_ids:
+        return found, True
+
+    day = timezone.localtime(start_from).date()
+    last_day = day + timedelta(days=horizon_days - 1)
+    while day <= last_day:
+        if monotonic() > deadline:
+            return found, False
+
+        days = [day + timedelta(days=i) for i in range(min(SEARCH_WINDOW_DAYS, (last_day - day).days + 1))]
+        bounds = [day_bounds(d) for d in days]
+
+        busy_by_room = {room_id: [] for room_id in room_ids}
+        rows = overlapping_bookings(bounds[0][0], bounds[-1][1], room_ids).values_list(
+            'room_id', 'start_time', 'end_time',
+        )
+        for room_id, start, end in rows:
+            busy_by_room[room_id].append((start, end))
+
+        candidates = []
+        for room_id in room_ids:
+            busy = merge_intervals(busy_by_room[room_id])
+            index = 0
+            for day_start, day_end in bounds:
+                cursor = align_up(max(day_start, start_from), day_start, step)
+                # Интервалы, закончившиеся до курсора, больше не понадобятся
+                while index < len(busy) and busy[index][1] <= cursor:
+                    index += 1
+                position = index
+                while cursor + duration <= day_end:
+                    busy_start = busy[position][0] if position < len(busy) else day_end
+                    if cursor + duration <= min(busy_start, day_end):
+                        candidates.append((cursor, cursor + duration, room_id))
+                    if position >= len(busy) or busy_start >= day_end:
+                        break
+                    cursor = align_up(max(cursor, busy[position][1]), day_start, step)
+                    position += 1
+
+        found = heapq.nsmallest(limit, found + candidates)
+        if len(found) >= limit:
+            return found, True
+        day = days[-1] + timedelta(days=1)
+
+    return found, True
+
+
+def room_day_availability(room_id, day, granularity=DEFAULT_GRANULARITY, extra_busy=()):
+    """
+    Свободные/занятые интервалы и слоты комнаты на рабочий день.
+
+    ``extra_busy`` — дополнительные занятые интервалы (например, удержания
+    слотов другими пользователями).
+    """
+    start, end = day_bounds(day)
+    busy = busy_intervals(room_id, start, end)
+    if extra_busy:
+        busy = clip_intervals(merge_intervals(list(busy) + list(extra_busy)), start, end)
+    free_slots, booked_slots = split_slots(busy, start, end, granularity)
+    return {
+        'busy': busy,
+        'free': free_intervals(busy, start, end),
+        'free_slots': free_slots,
+        'booked_slots': booked_slots,
+    }
+
+
+def format_time(value):
+    """Локальное время в формате HH:MM"""
+    return timezone.localtime(value).strftime('%H:%M')
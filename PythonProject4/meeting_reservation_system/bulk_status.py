@@ -0,0 +1,130 @@
+"""
+Массовая смена статусов броней менеджером.
+
+Все изменения применяются в одной транзакции: брони блокируются и
+читаются одним запросом, затем записываются одним UPDATE ... CASE
+(bulk_update). Поштучно, в savepoint, пишутся только брони, которые
+снова становятся активными — они могут упереться в ограничение
+booking_no_overlap, и такая ошибка должна касаться лишь своей строки.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError, transaction
+
+from .availability import BUSY_STATUSES, is_overlap_error
+from .email_booking import queue_booking_confirmations
+from .events import booking_statuses_changed
+from .models import Booking
+from .occupancy import bookings_changed
+from .reminders import schedule_reminders
+from .waitlist import booking_released
+
+
+# Сколько броней можно изменить одним запросом
+MAX_BULK_UPDATES = 500
+
+UPDATE_FIELDS = ['status', 'custom_price', 'manager_comment', 'next_reminder_at']
+
+
+def _parse_update(item):
+    """Проверяет один элемент запроса; возвращает (id, изменения) или бросает ValueError"""
+    try:
+        booking_id = int(item['id'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError('Не указан id брони')
+
+    changes = {}
+    status = item.get('status')
+    if status:
+        if status not in dict(Booking.STATUS_CHOICES):
+            raise ValueError('Неизвестный статус')
+        changes['status'] = status
+
+    price = item.get('total_price')
+    if price:
+        try:
+            changes['custom_price'] = Decimal(str(price))
+        except InvalidOperation:
+            raise ValueError('Некорректная цена')
+
+    if item.get('manager_comment') is not None:
+        changes['manager_comment'] = item['manager_comment']
+    return booking_id, changes
+
+
+def apply_status_updates(items):
+    """
+    Применить список изменений вида {id, status, total_price, manager_comment}.
+
+    Возвращает результаты по каждому id в порядке запроса:
+    {'id', 'success', 'status'} или {'id', 'success': False, 'error'}.
+    """
+    results = {}
+    parsed = {}
+    order = []
+    for index, item in enumerate(items):
+        try:
+            booking_id, changes = _parse_update(item)
+        except ValueError as e:
+            key = ('invalid', index)
+            raw_id = item.get('id') if isinstance(item, dict) else None
+            results[key] = {'id': raw_id, 'success': False, 'error': str(e)}
+            order.append(key)
+            continue
+        parsed[booking_id] = changes
+        order.append(booking_id)
+
+    with transaction.atomic():
+        bookings = Booking.objects.select_for_update(of=('self',)).select_related(
+            'room__office', 'user',
+        ).in_bulk(list(parsed))
+
+        batch, reactivated, confirmed, intervals, statuses = [], [], [], [], []
+        for booking_id, changes in parsed.items():
+            booking = bookings.get(booking_id)
+            if booking is None:
+                results[booking_id] = {'id': booking_id, 'success': False, 'error': 'Бронь не найдена'}
+                continue
+
+            booking.previous_status = booking.status
+            for field, value in changes.items():
+                setattr(booking, field, value)
+            schedule_reminders(booking)
+
+            if booking.previous_status not in BUSY_STATUSES and booking.status in BUSY_STATUSES:
+                reactivated.append(booking)
+            else:
+                batch.append(booking)
+
+        # Пересечений тут быть не может: активные брони остаются активными
+        # или освобождают время — одним UPDATE для всех
+        Booking.objects.bulk_update(batch, UPDATE_FIELDS)
+        saved = list(batch)
+
+        for booking in reactivated:
+            try:
+                with transaction.atomic():
+                    booking.save(update_fields=UPDATE_FIELDS)
+            except IntegrityError as e:
+                if not is_overlap_error(e):
+                    raise
+                results[booking.id] = {'id': booking.id, 'success': False, 'error': 'Комната уже занята в это время'}
+                continue
+            saved.append(booking)
+
+        for booking in saved:
+            results[booking.id] = {'id': booking.id, 'success': True, 'status': booking.status}
+            intervals.append((booking.room_id, booking.start_time, booking.end_time))
+            if booking.status != booking.previous_status:
+                statuses.append((booking.id, booking.user_id, booking.status))
+            if booking.previous_status in BUSY_STATUSES and booking.status not in BUSY_STATUSES:
+                booking_released(booking)
+            if booking.status == 'confirmed' and 'status' in parsed[booking.id]:
+                confirmed.append(booking)
+
+        bookings_changed(intervals)
+        booking_statuses_changed(statuses)
+        # Письма попадают в outbox той же транзакцией, одним INSERT
+        queue_booking_confirmations(confirmed)
+
+    return [results[key] for key in order]
@@ -0,0 +1,162 @@
+"""
+Ежедневная сводка для менеджеров.
+
+Данные сводки одинаковы для всех получателей, поэтому считаются один раз
+несколькими агрегирующими запросами (заявки по офисам, обращения без
+ответа, расписание на день), а текст — один раз рендерится. На каждого
+менеджера приходится только строка в outbox, вставляемая общим
+bulk_create: нагрузка на БД не растёт с числом менеджеров, а письма уходят
+пачками через пул SMTP-соединений.
+"""
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.db import transaction
+from django.db.models import Count, F, Min, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from .availability import BUSY_STATUSES
+from .models import Booking, SupportTicket, TicketResponse, User
+from .outbox import enqueue
+
+
+# Сколько строк каждого раздела показывать в письме
+DIGEST_LIST_LIMIT = 20
+
+MANAGER_ROLES = ['admin', 'manager']
+
+
+def local_day_range(day):
+    """Полуинтервал [начало дня, начало следующего) в текущем часовом поясе"""
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(day, time.min), tz)
+    return start, start + timedelta(days=1)
+
+
+def pending_by_office(since):
+    """Заявки в ожидании с началом не раньше ``since``, по офисам — один GROUP BY"""
+    return list(
+        Booking.objects
+        .filter(status='pending', start_time__gte=since)
+        .values('room__office__name')
+        .annotate(count=Count('id'), nearest=Min('start_time'))
+        .order_by('-count', 'room__office__name')
+    )
+
+
+def tickets_awaiting_answer():
+    """
+    Незакрытые обращения, где последнее слово за пользователем
+    (ответов нет или последний ответ — от автора обращения).
+    """
+    last_responder = (
+        TicketResponse.objects
+        .filter(ticket=OuterRef('pk'))
+        .order_by('-created_at', '-id')
+        .values('user_id')[:1]
+    )
+    tickets = (
+        SupportTicket.objects
+        .exclude(status='closed')
+        .annotate(last_responder=Subquery(last_responder))
+        .filter(Q(last_responder__isnull=True) | Q(last_responder=F('user_id')))
+    )
+    total = tickets.count()
+    rows = list(
+        tickets.order_by('last_activity').values_list('id', 'subject', 'user__username', 'last_activity')[:DIGEST_LIST_LIMIT]
+    )
+    return total, rows
+
+
+def day_schedule(day):
+    """Активные брони на день по возрастанию начала"""
+    start, end = local_day_range(day)
+    return list(
+        Booking.objects
+        .filter(status__in=BUSY_STATUSES, start_time__lt=end, end_time__gt=start)
+        .order_by('start_time', 'room__name')
+        .values_list('start_time', 'end_time', 'room__name', 'room__office__name', 'user__username', 'status')
+    )
+
+
+def collect_digest(day=None, now=None):
+    """
+    Данные сводки — общие для всех получателей.
+
+    Сводка за сегодня показывает заявки с текущего момента, за другой
+    день (--date) — с начала этого дня.
+    """
+    now = now or timezone.now()
+    since = local_day_range(day)[0] if day else now
+    day = day or timezone.localtime(now).date()
+    tickets_total, tickets = tickets_awaiting_answer()
+    return {
+        'day': day,
+        'pending': pending_by_office(since),
+        'tickets_total': tickets_total,
+        'tickets': tickets,
+        'schedule': day_schedule(day),
+    }
+
+
+def fmt(value):
+    return timezone.localtime(value).strftime('%d.%m %H:%M')
+
+
+def render_digest(data):
+    """Текст сводки (без обращения к получателю)"""
+    statuses = dict(Booking.STATUS_CHOICES)
+    lines = [f"📋 Сводка на {data['day'].strftime('%d.%m.%Y')}", '']
+
+    pending_total = sum(row['count'] for row in data['pending'])
+    lines.append(f'⏳ Заявки, ожидающие подтверждения: {pending_total}')
+    for row in data['pending']:
+        office = row['room__office__name'] or 'Без офиса'
+        lines.append(f"  🏢 {office}: {row['count']} (ближайшая {fmt(row['nearest'])})")
+    lines.append('')
+
+    lines.append(f"💬 Обращения без ответа: {data['tickets_total']}")
+    for ticket_id, subject, username, last_activity in data['tickets']:
+        lines.append(f'  #{ticket_id} {subject} — {username}, с {fmt(last_activity)}')
+    if data['tickets_total'] > len(data['tickets']):
+        lines.append(f"  … и ещё {data['tickets_total'] - len(data['tickets'])}")
+    lines.append('')
+
+    lines.append(f"📅 Расписание на день: {len(data['schedule'])} броней")
+    for start, end, room, office, username, status in data['schedule'][:DIGEST_LIST_LIMIT]:
+        start_local, end_local = timezone.localtime(start), timezone.localtime(end)
+        lines.append(
+            f"  {start_local.strftime('%H:%M')}–{end_local.strftime('%H:%M')} {room}"
+            f"{f' ({office})' if office else ''} — {username}, {statuses.get(status, status).strip()}"
+        )
+    if len(data['schedule']) > DIGEST_LIST_LIMIT:
+        lines.append(f"  … и ещё {len(data['schedule']) - DIGEST_LIST_LIMIT}")
+
+    return '\n'.join(lines)
+
+
+def send_manager_digest(day=None, now=None):
+    """
+    Поставить сводку в outbox всем активным менеджерам с email.
+
+    Возвращает число писем. Запросов к БД — константа, сколько бы ни было
+    менеджеров: агрегаты, список получателей и один bulk INSERT.
+    """
+    data = collect_digest(day, now)
+    body = render_digest(data)
+    subject = f"Сводка менеджера на {data['day'].strftime('%d.%m.%Y')}"
+
+    managers = (
+        User.objects
+        .filter(role__in=MANAGER_ROLES, is_active=True)
+        .exclude(email='')
+        .values_list('email', 'first_name', 'username')
+    )
+    messages = [
+        EmailMessage(subject, f'Здравствуйте, {first_name or username}!\n\n{body}', settings.EMAIL_HOST_USER, [email])
+        for email, first_name, username in managers.iterator()
+    ]
+    with transaction.atomic():
+        enqueue(messages)
+    return len(messages)
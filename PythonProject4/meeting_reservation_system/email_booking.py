@@ -1,8 +1,17 @@
-from django.core.mail import send_mail
+"""
+Письма о бронях. Ничего не отправляется из запроса: письма ставятся в
+исходящую очередь (outbox) в текущей транзакции, доставляет их воркер
+process_outbox.
+"""
+from django.core.mail import EmailMessage
 from django.utils.timezone import localtime
 from django.conf import settings
 
-def send_booking_confirmation(booking):
+from .outbox import enqueue, enqueue_mail
+
+
+def booking_confirmation_message(booking):
+    """Письмо о подтверждении брони (EmailMessage, ещё не отправленное)"""
     user = booking.user
     room = booking.room
 
@@ -49,10 +58,68 @@ def send_booking_confirmation(booking):
 
     message += "Если у вас возникнут вопросы — просто ответьте на это письмо."
 
-    send_mail(
-        subject,
-        message,
-        settings.EMAIL_HOST_USER,
-        [user.email],
-        fail_silently=False,
-    )
+    return EmailMessage(subject, message, settings.EMAIL_HOST_USER, [user.email])
+
+
+def send_booking_confirmation(booking):
+    enqueue([booking_confirmation_message(booking)])
+
+
+def queue_booking_confirmations(bookings):
+    """Поставить в очередь письма о подтверждении пачки броней одним INSERT"""
+    enqueue([booking_confirmation_message(booking) for booking in bookings if booking.user.email])
+
+
+def send_waitlist_promotion(booking):
+    user = booking.user
+    if not user.email:
+        return
+
+    start = localtime(booking.start_time)
+    end = localtime(booking.end_time)
+
+    subject = f"Освободилось время в комнате {booking.room.name}"
+    message = f"""
+Здравствуйте, {user.first_name or user.username}!
+
+Вы стояли в листе ожидания, и нужное время освободилось.
+Мы создали для вас бронирование — оно ожидает подтверждения менеджером.
+
+📅 Дата: {start.strftime('%d.%m.%Y')}
+⏰ Время: {start.strftime('%H:%M')} — {end.strftime('%H:%M')}
+🚪 Комната: {booking.room.name}
+
+Если бронь больше не нужна — просто ответьте на это письмо.
+"""
+
+    enqueue_mail(subject, message, [user.email])
+
+
+def booking_reminder_message(booking, offset):
+    """Напоминание о скором начале брони; ``offset`` — за сколько до начала"""
+    user = booking.user
+    room = booking.room
+    start = localtime(booking.start_time)
+    end = localtime(booking.end_time)
+
+    hours = int(offset.total_seconds() // 3600)
+    when = 'завтра' if hours >= 24 else f'через {hours} ч.'
+    subject = f"Напоминание: {room.name} {when} в {start.strftime('%H:%M')}"
+
+    office = room.office
+    place = f"{office.name}, {office.address}" if office else room.location
+
+    message = f"""
+Здравствуйте, {user.first_name or user.username}!
+
+Напоминаем о вашем бронировании.
+
+🚪 Комната: {room.name}
+🏢 Где: {place}
+📅 Дата: {start.strftime('%d.%m.%Y')}
+⏰ Время: {start.strftime('%H:%M')} — {end.strftime('%H:%M')}
+
+Если планы изменились — пожалуйста, отмените бронь, чтобы комната досталась другим.
+"""
+
+    return EmailMessage(subject, message, settings.EMAIL_HOST_USER, [user.email])
@@ -1,8 +1,13 @@
-from django.core.mail import send_mail
-from django.conf import settings
+"""
+Письма с кодами. Код и письмо с ним сохраняются одной транзакцией:
+письмо ставится в исходящую очередь, отправляет его воркер process_outbox.
+"""
+from django.db import transaction
 from .models import EmailConfirmation
+from .outbox import enqueue_mail
 
 
+@transaction.atomic
 def send_confirmation_code(user, email):
     """Отправляет 6-значный код на email"""
 
@@ -29,18 +34,13 @@ def send_confirmation_code(user, email):
     С уважением, Администратор сайта :)
     """
 
-    # Отправляем письмо
-    send_mail(
-        subject,
-        message,
-        settings.EMAIL_HOST_USER,
-        [email],
-        fail_silently=False,
-    )
+    # Ставим письмо в очередь
+    enqueue_mail(subject, message, [email])
 
     return confirmation.code
 
 
+@transaction.atomic
 def send_recovery_code(user, email):
     """Отправляет код для восстановления пароля"""
     # Удаляем старые коды восстановления
@@ -72,12 +72,6 @@ def send_recovery_code(user, email):
 Система бронирования переговорок
 """
 
-    send_mail(
-        subject,
-        message,
-        settings.EMAIL_HOST_USER,
-        [email],
-        fail_silently=False,
-    )
+    enqueue_mail(subject, message, [email])
 
     return recovery.code
\ No newline at end of file
@@ -0,0 +1,273 @@
+"""
+Push-уведомления о бронях и обращениях (Server-Sent Events).
+
+Изменения публикуются после коммита в брокер событий по «аудиториям»:
+менеджерам (канал managers) и владельцу брони/обращения (канал
+user:<id>). Представление event_stream на ASGI-приложении подписывается
+на нужные каналы и отдаёт события браузеру через EventSource — страницам
+больше не нужно перезагружаться или опрашивать сервер.
+
+Брокер подключаемый (настройка BOOKING_EVENT_BROKER, по аналогии с
+BOOKING_HOLD_STORE): по умолчанию — память процесса, чего достаточно для
+одного ASGI-процесса и тестов; для нескольких процессов нужен внешний
+брокер с тем же интерфейсом.
+"""
+import asyncio
+import itertools
+import json
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils.module_loading import import_string
+
+from .models import Booking
+
+
+DEFAULT_EVENT_BROKER = 'meeting_reservation_system.events.InMemoryEventBroker'
+
+MANAGERS_CHANNEL = 'managers'
+
+# Сколько событий может ждать медленного клиента, прежде чем он получит resync
+SUBSCRIPTION_QUEUE_SIZE = 100
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+def channels_for(user):
+    """Каналы, которые слушает пользователь"""
+    channels = [user_channel(user.id)]
+    if user.role in ['admin', 'manager']:
+        channels.append(MANAGERS_CHANNEL)
+    return channels
+
+
+class Subscription:
+    """
+    Подписка одного клиента: очередь событий в его event loop.
+
+    ``push`` можно вызывать из любого потока — событие передаётся в loop
+    через call_soon_threadsafe. Если очередь переполнена, лишние события
+    отбрасываются, а клиент получает событие resync.
+    """
+
+    def __init__(self, broker, channels):
+        self.broker = broker
+        self.channels = channels
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=SUBSCRIPTION_QUEUE_SIZE)
+        self.overflowed = False
+
+    def push(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # Цикл клиента уже закрыт — подписка отомрёт сама
+            pass
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout=None):
+        """Следующее событие или None, если за ``timeout`` секунд ничего не пришло"""
+        if self.overflowed:
+            self.overflowed = False
+            return {'id': None, 'type': 'resync', 'data': {}}
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class BaseEventBroker:
+    """Интерфейс брокера событий"""
+
+    def publish(self, channels, event):
+        """Разослать событие подписчикам каналов ``channels``"""
+        raise NotImplementedError
+
+    def subscribe(self, channels):
+        """Подписка на каналы; вызывается из работающего event loop"""
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription):
+        raise NotImplementedError
+
+    def has_subscribers(self, channel):
+        """Есть ли у канала подписчики; брокер, который не знает, отвечает True"""
+        return True
+
+
+class InMemoryEventBroker(BaseEventBroker):
+    """Брокер в памяти процесса"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def publish(self, channels, event):
+        with self._lock:
+            targets = set()
+            for channel in channels:
+                targets |= self._subscribers.get(channel, set())
+        for subscription in targets:
+            subscription.push(event)
+
+    def subscribe(self, channels):
+        subscription = Subscription(self, channels)
+        with self._lock:
+            for channel in channels:
+                self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscribers.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[channel]
+
+    def has_subscribers(self, channel):
+        with self._lock:
+            return bool(self._subscribers.get(channel))
+
+
+_brokers = {}
+_event_ids = itertools.count(1)
+
+
+def get_event_broker():
+    """Брокер из настройки BOOKING_EVENT_BROKER (один экземпляр на путь)"""
+    path = getattr(settings, 'BOOKING_EVENT_BROKER', DEFAULT_EVENT_BROKER)
+    if path not in _brokers:
+        _brokers[path] = import_string(path)()
+    return _brokers[path]
+
+
+def publish(channels, event_type, data):
+    """Опубликовать событие сразу (без ожидания коммита)"""
+    event = {'id': next(_event_ids), 'type': event_type, 'data': data}
+    get_event_broker().publish(channels, event)
+
+
+def publish_on_commit(channels, event_type, data):
+    """Опубликовать событие после коммита текущей транзакции"""
+    transaction.on_commit(lambda: publish(channels, event_type, data))
+
+
+def format_sse(event):
+    """Событие в формате text/event-stream"""
+    lines = []
+    if event.get('id') is not None:
+        lines.append(f"id: {event['id']}")
+    lines.append(f"event: {event['type']}")
+    lines.append(f"data: {json.dumps(event['data'], ensure_ascii=False)}")
+    return '\n'.join(lines) + '\n\n'
+
+
+def _publish_to_managers(event_type, ids, data, cards=True):
+    """
+    После коммита разослать менеджерам событие с актуальными карточками
+    панели: брони перечитываются одним запросом с комнатой и пользователем.
+
+    Без ``cards`` событие несёт только данные — так публикуют массовые
+    пересчёты, которым нельзя загружать модели. Если менеджеров в канале
+    нет (например, в cron-процессе), ничего не читается и не рендерится.
+    """
+    def send():
+        if not get_event_broker().has_subscribers(MANAGERS_CHANNEL):
+            return
+        payload = dict(data, ids=ids)
+        if cards:
+            bookings = Booking.objects.select_related('room', 'user').filter(id__in=ids).order_by('-created_at', '-id')
+            payload['html'] = render_to_string('manager_booking_cards.html', {'bookings': bookings})
+        publish([MANAGERS_CHANNEL], event_type, payload)
+
+    transaction.on_commit(send)
+
+
+def bookings_created(bookings):
+    """Новые брони: менеджерам — карточки одним событием, владельцам — id"""
+    if not bookings:
+        return
+    _publish_to_managers('booking_created', [booking.id for booking in bookings], {})
+    by_user = defaultdict(list)
+    for booking in bookings:
+        by_user[booking.user_id].append(booking.id)
+    for user_id, ids in by_user.items():
+        publish_on_commit([user_channel(user_id)], 'booking_created', {'ids': ids})
+
+
+def booking_statuses_changed(rows, cards=True):
+    """
+    Смена статусов: ``rows`` — кортежи (booking_id, user_id, status).
+
+    Менеджерам уходит одно событие на всю пачку, каждому владельцу — своё.
+    Без ``cards`` менеджеры получают только статусы, без HTML карточек.
+    """
+    if not rows:
+        return
+    labels = dict(Booking.STATUS_CHOICES)
+    by_user = defaultdict(list)
+    items = []
+    for booking_id, user_id, status in rows:
+        item = {'id': booking_id, 'status': status, 'status_display': labels.get(status, status).strip()}
+        items.append(item)
+        by_user[user_id].append(item)
+
+    _publish_to_managers('booking_status_changed', [row[0] for row in rows], {'bookings': items}, cards)
+    for user_id, part in by_user.items():
+        publish_on_commit([user_channel(user_id)], 'booking_status_changed', {'bookings': part})
+
+
+def booking_status_changed(booking):
+    booking_statuses_changed([(booking.id, booking.user_id, booking.status)])
+
+
+def bookings_deleted(rows):
+    """
+    Удаление броней: ``rows`` — кортежи (booking_id, user_id).
+
+    id берутся до delete() — после него у объекта модели id уже None.
+    """
+    if not rows:
+        return
+    by_user = defaultdict(list)
+    for booking_id, user_id in rows:
+        by_user[user_id].append(booking_id)
+
+    publish_on_commit([MANAGERS_CHANNEL], 'booking_deleted', {'ids': [row[0] for row in rows]})
+    for user_id, ids in by_user.items():
+        publish_on_commit([user_channel(user_id)], 'booking_deleted', {'ids': ids})
+
+
+def booking_deleted(booking, booking_id):
+    bookings_deleted([(booking_id, booking.user_id)])
+
+
+def ticket_response_added(response):
+    """Новый ответ в обращении — автору обращения и менеджерам"""
+    ticket = response.ticket
+    data = {
+        'ticket_id': ticket.id,
+        'subject': ticket.subject,
+        'ticket_status': ticket.status,
+        'ticket_status_display': ticket.get_status_display(),
+        'responses_count': ticket.responses.count(),
+        'author': response.user.username,
+        'author_id': response.user_id,
+    }
+    publish_on_commit([user_channel(ticket.user_id), MANAGERS_CHANNEL], 'ticket_response', data)
+
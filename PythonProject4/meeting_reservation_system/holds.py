@@ -0,0 +1,164 @@
+"""
+Короткие удержания слотов.
+
+Пока пользователь заполняет форму на room_detail, выбранный интервал
+удерживается за ним на HOLD_TTL секунд. Чужие удержания считаются занятым
+временем в get_available_times, а create_booking превращает своё удержание
+в бронь. Хранилище подключаемое (настройка BOOKING_HOLD_STORE, по аналогии
+с EMAIL_BACKEND): по умолчанию таблица в БД, для тестов — память процесса.
+"""
+import threading
+import uuid
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .availability import overlapping_bookings
+from .models import Room, SlotHold
+
+
+DEFAULT_HOLD_STORE = 'meeting_reservation_system.holds.DatabaseHoldStore'
+DEFAULT_HOLD_TTL = 300  # секунды
+
+Hold = namedtuple('Hold', 'token room_id user_id start end expires_at')
+
+
+class BaseHoldStore:
+    """Интерфейс хранилища удержаний"""
+
+    def acquire(self, room_id, user_id, start, end, ttl):
+        """Удержать [start, end) за пользователем; None, если пересекается с чужим удержанием"""
+        raise NotImplementedError
+
+    def get(self, token):
+        """Действующее удержание по токену или None"""
+        raise NotImplementedError
+
+    def release(self, token):
+        """Снять удержание"""
+        raise NotImplementedError
+
+    def held(self, room_ids, start, end, exclude_user_id=None):
+        """Действующие удержания комнат, пересекающие [start, end)"""
+        raise NotImplementedError
+
+
+class DatabaseHoldStore(BaseHoldStore):
+    """Удержания в таблице SlotHold; просроченные просто игнорируются и подчищаются"""
+
+    def acquire(self, room_id, user_id, start, end, ttl):
+        now = timezone.now()
+        with transaction.atomic():
+            # Блокировка строки комнаты сериализует удержания одной комнаты
+            Room.objects.select_for_update().filter(id=room_id).exists()
+            SlotHold.objects.filter(room_id=room_id, expires_at__lte=now).delete()
+            if self.held([room_id], start, end, exclude_user_id=user_id):
+                return None
+            # Повторный выбор слота тем же пользователем заменяет прежнее удержание
+            SlotHold.objects.filter(room_id=room_id, user_id=user_id).delete()
+            hold = SlotHold.objects.create(
+                token=uuid.uuid4().hex,
+                room_id=room_id,
+                user_id=user_id,
+                start_time=start,
+                end_time=end,
+                expires_at=now + timedelta(seconds=ttl),
+            )
+        return self._to_hold(hold)
+
+    def get(self, token):
+        hold = SlotHold.objects.filter(token=token, expires_at__gt=timezone.now()).first()
+        return self._to_hold(hold) if hold else None
+
+    def release(self, token):
+        SlotHold.objects.filter(token=token).delete()
+
+    def held(self, room_ids, start, end, exclude_user_id=None):
+        holds = SlotHold.objects.filter(
+            room_id__in=room_ids,
+            start_time__lt=end,
+            end_time__gt=start,
+            expires_at__gt=timezone.now(),
+        )
+        if exclude_user_id is not None:
+            holds = holds.exclude(user_id=exclude_user_id)
+        return [self._to_hold(hold) for hold in holds]
+
+    @staticmethod
+    def _to_hold(hold):
+        return Hold(hold.token, hold.room_id, hold.user_id, hold.start_time, hold.end_time, hold.expires_at)
+
+
+class InMemoryHoldStore(BaseHoldStore):
+    """Удержания в памяти процесса — для тестов и одиночного dev-сервера"""
+
+    def __init__(self):
+        self._holds = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, room_id, user_id, start, end, ttl):
+        with self._lock:
+            self._purge()
+            if self._held([room_id], start, end, user_id):
+                return None
+            for token in [t for t, h in self._holds.items() if h.room_id == room_id and h.user_id == user_id]:
+                del self._holds[token]
+            hold = Hold(uuid.uuid4().hex, room_id, user_id, start, end,
+                        timezone.now() + timedelta(seconds=ttl))
+            self._holds[hold.token] = hold
+            return hold
+
+    def get(self, token):
+        with self._lock:
+            self._purge()
+            return self._holds.get(token)
+
+    def release(self, token):
+        with self._lock:
+            self._holds.pop(token, None)
+
+    def held(self, room_ids, start, end, exclude_user_id=None):
+        with self._lock:
+            self._purge()
+            return self._held(room_ids, start, end, exclude_user_id)
+
+    def _held(self, room_ids, start, end, exclude_user_id):
+        return [
+            hold for hold in self._holds.values()
+            if hold.room_id in room_ids and hold.start < end and hold.end > start
+            and hold.user_id != exclude_user_id
+        ]
+
+    def _purge(self):
+        now = timezone.now()
+        for token in [t for t, h in self._holds.items() if h.expires_at <= now]:
+            del self._holds[token]
+
+
+_stores = {}
+
+
+def get_hold_store():
+    """Хранилище из настройки BOOKING_HOLD_STORE (один экземпляр на путь)"""
+    path = getattr(settings, 'BOOKING_HOLD_STORE', DEFAULT_HOLD_STORE)
+    if path not in _stores:
+        _stores[path] = import_string(path)()
+    return _stores[path]
+
+
+def hold_slot(room_id, user_id, start, end):
+    """Удержать слот, если он не занят бронью и не удержан другим пользователем"""
+    if overlapping_bookings(start, end, [room_id]).exists():
+        return None
+    ttl = getattr(settings, 'BOOKING_HOLD_TTL', DEFAULT_HOLD_TTL)
+    return get_hold_store().acquire(room_id, user_id, start, end, ttl)
+
+
+def held_intervals(room_id, start, end, exclude_user_id=None):
+    """Чужие удержания комнаты как интервалы (start, end)"""
+    holds = get_hold_store().held([room_id], start, end, exclude_user_id=exclude_user_id)
+    return [(hold.start, hold.end) for hold in holds]
@@ -0,0 +1,75 @@
+"""
+Автоматические переходы статусов броней.
+
+Завершившиеся подтверждённые брони становятся «завершёнными», а так и не
+подтверждённые к началу встречи — «отменёнными». Обновление идёт пачками
+set-based UPDATE без загрузки моделей в память; функцию можно вызывать из
+cron/планировщика напрямую или через команду update_booking_statuses.
+Подписчики получают по одному событию смены статуса на пачку — только
+статусы, без карточек панели.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .events import booking_statuses_changed
+from .models import Booking
+from .occupancy import bookings_changed
+
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# Сколько ждать подтверждения после начала встречи, прежде чем отменить
+DEFAULT_PENDING_GRACE = timedelta(0)
+
+
+def _update_in_chunks(queryset, chunk_size, refresh_occupancy=False, **values):
+    """
+    UPDATE queryset пачками по ``chunk_size`` строк, каждая в своей транзакции.
+
+    Обновлённые строки перестают подходить под условие, поэтому каждый раз
+    берётся первая пачка. Пачка блокируется (FOR UPDATE), а события
+    строятся по строкам, которые после UPDATE действительно в новом
+    статусе. Сводки и кэш отчётов затронутых дней сбрасываются всегда,
+    занятость комнат пересчитывается, только если ``refresh_occupancy``
+    (читаются только кортежи, не модели).
+    """
+    total = 0
+    while True:
+        with transaction.atomic():
+            ids = list(queryset.order_by('pk').select_for_update().values_list('pk', flat=True)[:chunk_size])
+            if not ids:
+                break
+            # Условие queryset повторяется в UPDATE — параллельно изменённые строки не трогаем
+            total += queryset.filter(pk__in=ids).update(**values)
+            updated = list(
+                Booking.objects
+                .filter(pk__in=ids, status=values['status'])
+                .values_list('pk', 'user_id', 'room_id', 'start_time', 'end_time')
+            )
+            bookings_changed([row[2:] for row in updated], refresh_occupancy)
+            booking_statuses_changed([(row[0], row[1], values['status']) for row in updated], cards=False)
+        if len(ids) < chunk_size:
+            break
+    return total
+
+
+def run_booking_lifecycle(now=None, chunk_size=DEFAULT_CHUNK_SIZE, pending_grace=DEFAULT_PENDING_GRACE):
+    """Выполнить автоматические переходы статусов; вернуть счётчики"""
+    now = now or timezone.now()
+
+    completed = _update_in_chunks(
+        Booking.objects.filter(status='confirmed', end_time__lte=now),
+        chunk_size,
+        status='completed',
+        next_reminder_at=None,
+    )
+    # Отмена освобождает комнату — занятость пересчитываем
+    expired = _update_in_chunks(
+        Booking.objects.filter(status='pending', start_time__lte=now - pending_grace),
+        chunk_size,
+        refresh_occupancy=True,
+        status='cancelled',
+    )
+    return {'completed': completed, 'expired': expired}
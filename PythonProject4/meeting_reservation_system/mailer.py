@@ -0,0 +1,169 @@
+"""
+Пакетная отправка писем через пул SMTP-соединений.
+
+Открытие SMTP-сессии (TCP + STARTTLS + AUTH) обходится дороже самой
+отправки письма. Пул держит ограниченное число уже открытых соединений
+(get_connection) и отдаёт их повторно, так что пачка писем уходит за одно
+рукопожатие, а следующие пачки того же воркера — вообще без него.
+По каждой пачке собираются метрики времени: соединение, отправка, итого.
+"""
+import logging
+import queue
+import threading
+from collections import deque, namedtuple
+from contextlib import contextmanager
+from time import monotonic
+
+from django.conf import settings
+from django.core.mail import get_connection
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 2
+
+# Соединение, простоявшее дольше, закрываем: SMTP-серверы рвут молчащие сессии
+DEFAULT_IDLE_TIMEOUT = 60  # секунды
+
+# Сколько последних пачек помнить для recent_batches()
+METRICS_HISTORY = 100
+
+BatchMetrics = namedtuple(
+    'BatchMetrics', 'size sent failed reused connect_seconds send_seconds total_seconds',
+)
+
+
+def _is_alive(connection):
+    """Открытое SMTP-соединение ещё отвечает? Для не-SMTP бэкендов — всегда да"""
+    smtp = getattr(connection, 'connection', None)
+    if smtp is None:
+        return not hasattr(connection, 'connection')
+    try:
+        return smtp.noop()[0] == 250
+    except Exception:
+        return False
+
+
+def _close_quietly(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+class ConnectionPool:
+    """
+    Ограниченный пул открытых соединений почтового бэкенда.
+
+    Одновременно выдаётся не больше ``size`` соединений; остальные
+    вызывающие ждут. Соединение, на котором случилась ошибка, в пул не
+    возвращается.
+    """
+
+    def __init__(self, size=DEFAULT_POOL_SIZE, idle_timeout=DEFAULT_IDLE_TIMEOUT, factory=get_connection):
+        self.idle_timeout = idle_timeout
+        self.factory = factory
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = queue.LifoQueue()
+
+    def _take(self):
+        """Свежее соединение из пула или новое; возвращает (соединение, переиспользовано)"""
+        while True:
+            try:
+                connection, released_at = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if monotonic() - released_at < self.idle_timeout and _is_alive(connection):
+                return connection, True
+            _close_quietly(connection)
+
+        connection = self.factory()
+        connection.open()
+        return connection, False
+
+    @contextmanager
+    def connection(self):
+        """Взять соединение на время блока: ``with pool.connection() as (conn, reused)``"""
+        self._slots.acquire()
+        connection = None
+        try:
+            connection, reused = self._take()
+            yield connection, reused
+        except Exception:
+            if connection is not None:
+                _close_quietly(connection)
+                connection = None
+            raise
+        finally:
+            if connection is not None:
+                self._idle.put((connection, monotonic()))
+            self._slots.release()
+
+    def close_all(self):
+        while True:
+            try:
+                connection, released_at = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            _close_quietly(connection)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_metrics = deque(maxlen=METRICS_HISTORY)
+
+
+def get_pool():
+    """Общий пул процесса (размер — настройка EMAIL_POOL_SIZE)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(
+                size=getattr(settings, 'EMAIL_POOL_SIZE', DEFAULT_POOL_SIZE),
+                idle_timeout=getattr(settings, 'EMAIL_POOL_IDLE_TIMEOUT', DEFAULT_IDLE_TIMEOUT),
+            )
+        return _pool
+
+
+def send_batch(messages, pool=None):
+    """
+    Отправить пачку писем через одно соединение из пула.
+
+    Ошибка одного письма не мешает остальным. Возвращает
+    (метрики, [(индекс письма, исключение)]). Если соединение не удалось
+    открыть, исключение пробрасывается — пачка целиком не отправлена.
+    """
+    pool = pool or get_pool()
+    failed = []
+    started = monotonic()
+    with pool.connection() as (connection, reused):
+        connected = monotonic()
+        for index, message in enumerate(messages):
+            message.connection = connection
+            try:
+                connection.send_messages([message])
+            except Exception as e:
+                failed.append((index, e))
+    finished = monotonic()
+
+    metrics = BatchMetrics(
+        size=len(messages),
+        sent=len(messages) - len(failed),
+        failed=len(failed),
+        reused=reused,
+        connect_seconds=connected - started,
+        send_seconds=finished - connected,
+        total_seconds=finished - started,
+    )
+    _metrics.append(metrics)
+    logger.info(
+        'Пачка писем: %s отправлено, %s с ошибкой, соединение %s за %.3f с, отправка %.3f с',
+        metrics.sent, metrics.failed, 'из пула' if reused else 'новое',
+        metrics.connect_seconds, metrics.send_seconds,
+    )
+    return metrics, failed
+
+
+def recent_batches():
+    """Метрики последних METRICS_HISTORY пачек (от старых к новым)"""
+    return list(_metrics)
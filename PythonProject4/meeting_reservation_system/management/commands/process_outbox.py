@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+from meeting_reservation_system.mailer import get_pool
+from meeting_reservation_system.outbox import deliver_batch, DEFAULT_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Отправляет письма из исходящей очереди (с повторами и dead letter)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true',
+                            help='Работать постоянно, опрашивая очередь')
+        parser.add_argument('--interval', type=float, default=5,
+                            help='Пауза между опросами пустой очереди в режиме --loop, секунды')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        taken_total = sent_total = dead_total = batches = 0
+        send_seconds = 0.0
+
+        while True:
+            taken, sent, dead, metrics = deliver_batch(batch_size)
+            taken_total += taken
+            sent_total += sent
+            dead_total += dead
+            if metrics:
+                batches += 1
+                send_seconds += metrics.total_seconds
+                if options['verbosity'] >= 2:
+                    self.stdout.write(
+                        f'📨 Пачка {metrics.size}: соединение '
+                        f'{"из пула" if metrics.reused else "новое"} {metrics.connect_seconds * 1000:.0f} мс, '
+                        f'отправка {metrics.send_seconds * 1000:.0f} мс, ошибок {metrics.failed}'
+                    )
+
+            if taken < batch_size:
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+
+        get_pool().close_all()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'✅ Взято {taken_total} писем: отправлено {sent_total}, '
+                f'не доставлено окончательно {dead_total} '
+                f'({batches} пачек, {send_seconds:.2f} с на отправку)'
+            )
+        )
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+from meeting_reservation_system.report_jobs import create_pool, run_jobs, purge_expired, worker_count
+
+
+class Command(BaseCommand):
+    help = 'Формирует отчёты из очереди в пуле процессов и удаляет устаревшие файлы'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Процессов рендеринга (по умолчанию REPORT_WORKERS)')
+        parser.add_argument('--loop', action='store_true',
+                            help='Работать постоянно, опрашивая очередь')
+        parser.add_argument('--interval', type=float, default=2,
+                            help='Пауза между опросами пустой очереди в режиме --loop, секунды')
+
+    def handle(self, *args, **options):
+        done_total = failed_total = purged_total = 0
+
+        limit = worker_count(options['workers'])
+        with create_pool(limit) as pool:
+            while True:
+                purged_total += purge_expired()
+                done, failed = run_jobs(pool, limit)
+                done_total += done
+                failed_total += failed
+
+                if done + failed < limit:
+                    if not options['loop']:
+                        break
+                    time.sleep(options['interval'])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'✅ Отчётов сформировано: {done_total}, с ошибкой: {failed_total}, '
+                f'удалено устаревших: {purged_total}'
+            )
+        )
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from meeting_reservation_system.waitlist import drain_waitlist, DEFAULT_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Продвигает лист ожидания: освободившиеся интервалы превращаются в брони'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        checked_total = promoted_total = 0
+        last_id = 0
+
+        # Каждая заявка за один запуск проверяется один раз
+        while True:
+            checked, promoted, last_id = drain_waitlist(batch_size, last_id)
+            checked_total += checked
+            promoted_total += promoted
+            if checked < batch_size:
+                break
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ Проверено {checked_total} заявок, переведено в брони {promoted_total}')
+        )
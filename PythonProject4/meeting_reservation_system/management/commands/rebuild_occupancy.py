@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from meeting_reservation_system.models import Booking, RoomOccupancy
+from meeting_reservation_system.occupancy import compute_occupancy, occupancy_rows
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает таблицу занятости комнат из броней и проверяет расхождения'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Только найти расхождения, ничего не менять')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        # Брони читаем потоково, без загрузки моделей
+        rows = occupancy_rows(Booking.objects.order_by()).iterator(chunk_size=batch_size)
+        expected = compute_occupancy(rows)
+
+        actual = {
+            (room_id, day): [mask, minutes, revenue]
+            for room_id, day, mask, minutes, revenue in RoomOccupancy.objects.values_list(
+                'room_id', 'day', 'slot_mask', 'booked_minutes', 'revenue',
+            ).iterator(chunk_size=batch_size)
+        }
+
+        missing = expected.keys() - actual.keys()
+        extra = actual.keys() - expected.keys()
+        different = [key for key in expected.keys() & actual.keys() if expected[key] != actual[key]]
+        drift = len(missing) + len(extra) + len(different)
+
+        self.stdout.write(
+            f'Строк: ожидается {len(expected)}, в таблице {len(actual)}; '
+            f'нет {len(missing)}, лишних {len(extra)}, расходится {len(different)}'
+        )
+
+        if options['check']:
+            if drift:
+                self.stdout.write(self.style.WARNING(f'⚠️ Найдено расхождений: {drift}'))
+            else:
+                self.stdout.write(self.style.SUCCESS('✅ Расхождений нет'))
+            return
+
+        with transaction.atomic():
+            RoomOccupancy.objects.all().delete()
+            RoomOccupancy.objects.bulk_create(
+                [
+                    RoomOccupancy(room_id=room_id, day=day, slot_mask=mask,
+                                  booked_minutes=minutes, revenue=revenue)
+                    for (room_id, day), (mask, minutes, revenue) in expected.items()
+                ],
+                batch_size=batch_size,
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ Занятость пересобрана: {len(expected)} строк, исправлено {drift}')
+        )
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+from meeting_reservation_system.rollups import refresh_rollups, mark_all_dirty, DEFAULT_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает сводки выручки и загрузки за отмеченные дни (инкрементально)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Отметить и пересчитать все дни с бронями (первый запуск, правка цен)')
+        parser.add_argument('--loop', action='store_true',
+                            help='Работать постоянно, опрашивая отметки')
+        parser.add_argument('--interval', type=float, default=30,
+                            help='Пауза между опросами в режиме --loop, секунды')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            marked = mark_all_dirty()
+            self.stdout.write(f'Отмечено дней для пересчёта: {marked}')
+
+        total = 0
+        while True:
+            total += refresh_rollups(options['batch_size'])
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Сводки пересчитаны: {total} (комната, день)'))
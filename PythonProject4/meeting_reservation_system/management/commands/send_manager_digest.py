@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_date
+from meeting_reservation_system.digest import send_manager_digest
+
+
+class Command(BaseCommand):
+    help = 'Ставит в очередь ежедневную сводку для менеджеров (запускать раз в день)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='День сводки YYYY-MM-DD (по умолчанию сегодня)')
+
+    def handle(self, *args, **options):
+        day = parse_date(options['date']) if options['date'] else None
+        sent = send_manager_digest(day)
+        self.stdout.write(self.style.SUCCESS(f'✅ Сводка поставлена в очередь для {sent} менеджеров'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from meeting_reservation_system.reminders import send_due_reminders, DEFAULT_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Ставит в очередь напоминания о подтверждённых бронях (за 24 ч и за 1 ч до начала)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        checked, queued = send_due_reminders(batch_size=options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ Проверено {checked} броней, напоминаний в очереди {queued}')
+        )
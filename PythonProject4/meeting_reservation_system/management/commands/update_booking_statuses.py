@@ -0,0 +1,26 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from meeting_reservation_system.lifecycle import run_booking_lifecycle, DEFAULT_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Завершает прошедшие подтверждённые брони и отменяет неподтверждённые'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help='Сколько строк обновлять за один UPDATE')
+        parser.add_argument('--pending-grace', type=int, default=0,
+                            help='Сколько минут после начала ждать подтверждения')
+
+    def handle(self, *args, **options):
+        counts = run_booking_lifecycle(
+            chunk_size=options['chunk_size'],
+            pending_grace=timedelta(minutes=options['pending_grace']),
+        )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"✅ Завершено {counts['completed']} броней, отменено неподтверждённых {counts['expired']}"
+            )
+        )
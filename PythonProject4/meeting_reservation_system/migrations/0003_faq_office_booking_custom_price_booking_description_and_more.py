@@ -0,0 +1,158 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meeting_reservation_system', '0002_user_avatar_user_email_verification_code_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FAQ',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('question', models.CharField(max_length=200, verbose_name='Вопрос')),
+                ('answer', models.TextField(verbose_name='Ответ')),
+                ('category', models.CharField(choices=[('general', '📋 Общие вопросы'), ('booking', '📅 Бронирование'), ('payment', '💳 Оплата'), ('technical', '🛠️ Технические вопросы')], default='general', max_length=20)),
+                ('order', models.IntegerField(default=0, verbose_name='Порядок отображения')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Активно')),
+            ],
+            options={
+                'ordering': ['order', 'id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Office',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, verbose_name='Название офиса')),
+                ('address', models.CharField(max_length=300, verbose_name='Адрес')),
+                ('phone', models.CharField(blank=True, max_length=20, verbose_name='Телефон')),
+                ('work_hours', models.CharField(blank=True, max_length=100, verbose_name='Часы работы')),
+                ('latitude', models.FloatField(verbose_name='Широта')),
+                ('longitude', models.FloatField(verbose_name='Долгота')),
+                ('yandex_map_url', models.URLField(blank=True, verbose_name='Ссылка на Яндекс.Карты')),
+                ('description', models.TextField(blank=True, verbose_name='Описание')),
+                ('marker_text', models.CharField(blank=True, default='Офис', max_length=100, verbose_name='Текст маркера')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Активен')),
+                ('parking', models.CharField(blank=True, max_length=100, verbose_name='Парковка')),
+                ('transport', models.CharField(blank=True, max_length=100, verbose_name='Транспорт')),
+                ('amenities', models.CharField(blank=True, max_length=200, verbose_name='Удобства')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Офис',
+                'verbose_name_plural': 'Офисы',
+            },
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='custom_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='description',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='manager_comment',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='participants_count',
+            field=models.IntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='amenities',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='category',
+            field=models.CharField(choices=[('economy', '🟢 Эконом'), ('standard', '🔵 Стандарт'), ('comfort', '🟡 Комфорт'), ('vip', '🟣 VIP'), ('luxury', '🔴 Люкс')], default='standard', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='is_active',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='status',
+            field=models.CharField(choices=[('active', '✅ Активна'), ('maintenance', '🚧 На ремонте'), ('hidden', '🔒 Скрыта'), ('inactive', '❌ Неактивна')], default='active', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='birth_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='gender',
+            field=models.CharField(blank=True, choices=[('M', 'Мужской'), ('F', 'Женский')], max_length=1),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='patronymic',
+            field=models.CharField(blank=True, max_length=30),
+        ),
+        migrations.AlterField(
+            model_name='booking',
+            name='status',
+            field=models.CharField(choices=[('pending', ' Ожидание'), ('confirmed', ' Подтверждено'), ('cancelled', ' Отменено'), ('completed', ' Завершено')], default='pending', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='room',
+            name='equipment',
+            field=models.TextField(blank=True, help_text='Вводите каждый пункт с новой строки.'),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='first_name',
+            field=models.CharField(blank=True, max_length=30),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='last_name',
+            field=models.CharField(blank=True, max_length=30),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='office',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='rooms', to='meeting_reservation_system.office', verbose_name='Офис'),
+        ),
+        migrations.CreateModel(
+            name='SupportTicket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=200, verbose_name='Тема вопроса')),
+                ('message', models.TextField(verbose_name='Сообщение')),
+                ('status', models.CharField(choices=[('open', '🔴 Открыт'), ('in_progress', '🟡 В работе'), ('closed', '🟢 Закрыт')], default='open', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('last_activity', models.DateTimeField(auto_now=True)),
+                ('auto_close_date', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tickets', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TicketResponse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('message', models.TextField(verbose_name='Ответ')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('ticket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='responses', to='meeting_reservation_system.supportticket')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Ответивший')),
+            ],
+        ),
+    ]
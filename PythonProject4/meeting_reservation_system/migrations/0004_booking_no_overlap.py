@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:40
+
+import django.contrib.postgres.constraints
+from django.contrib.postgres.operations import BtreeGistExtension
+import meeting_reservation_system.models
+from django.db import migrations, models
+
+
+OVERLAPS_SQL = """
+    SELECT o.id, b.id
+    FROM meeting_reservation_system_booking AS b
+    JOIN meeting_reservation_system_booking AS o
+      ON o.room_id = b.room_id
+     AND o.id < b.id
+     AND o.start_time < b.end_time
+     AND o.end_time > b.start_time
+    WHERE b.status IN ('pending', 'confirmed')
+      AND o.status IN ('pending', 'confirmed')
+    ORDER BY o.id, b.id
+"""
+
+
+def check_no_overlaps(apps, schema_editor):
+    """Остановить миграцию, если есть пересекающиеся активные брони одной комнаты"""
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(OVERLAPS_SQL)
+        pairs = cursor.fetchall()
+    if pairs:
+        listed = ', '.join(f'{first}/{second}' for first, second in pairs)
+        raise RuntimeError(
+            f'Пересекающиеся активные брони (id/id): {listed}. '
+            'Отмените или перенесите одну из броней каждой пары и повторите миграцию.'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meeting_reservation_system', '0003_faq_office_booking_custom_price_booking_description_and_more'),
+    ]
+
+    operations = [
+        # btree_gist нужен для сравнения room_id через "=" внутри GiST-индекса
+        BtreeGistExtension(),
+        # Уже существующие двойные брони не дадут создать ограничение.
+        # Сами их не трогаем: миграция падает со списком пар, чтобы их
+        # разобрали вручную (отменили или перенесли одну из броней)
+        migrations.RunPython(check_no_overlaps, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='booking',
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(condition=models.Q(('status__in', ['pending', 'confirmed'])), expressions=[('room', '='), (meeting_reservation_system.models.TsTzRange('start_time', 'end_time'), '&&')], name='booking_no_overlap'),
+        ),
+    ]
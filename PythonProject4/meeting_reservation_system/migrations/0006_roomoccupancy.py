@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meeting_reservation_system', '0005_slothold'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('slot_mask', models.BigIntegerField(default=0)),
+                ('booked_minutes', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupancy', to='meeting_reservation_system.room')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('room', 'day'), name='room_occupancy_room_day')],
+            },
+        ),
+    ]
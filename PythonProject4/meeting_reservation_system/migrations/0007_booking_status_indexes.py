@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meeting_reservation_system', '0006_roomoccupancy'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['status', 'start_time'], name='booking_status_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['status', 'end_time'], name='booking_status_end_idx'),
+        ),
+    ]
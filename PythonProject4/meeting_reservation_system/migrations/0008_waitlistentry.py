@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meeting_reservation_system', '0007_booking_status_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WaitlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_time', models.DateTimeField()),
+                ('end_time', models.DateTimeField()),
+                ('description', models.TextField(blank=True)),
+                ('status', models.CharField(choices=[('waiting', '⏳ Ожидает'), ('promoted', '✅ Переведена в бронь'), ('expired', '⌛ Истекла'), ('cancelled', '❌ Отменена')], default='waiting', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('promoted_at', models.DateTimeField(blank=True, null=True)),
+                ('booking', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='waitlist_entry', to='meeting_reservation_system.booking')),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist', to='meeting_reservation_system.room')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['created_at', 'id'],
+                'indexes': [models.Index(fields=['room', 'status', 'created_at'], name='waitlist_queue_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meeting_reservation_system', '0010_outboxemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='next_reminder_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='reminder_stage',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(condition=models.Q(('next_reminder_at__isnull', False)), fields=['next_reminder_at'], name='booking_reminder_due_idx'),
+        ),
+        # Уже подтверждённым будущим броням ставим первый этап; если он
+        # прошёл, планировщик сам перейдёт к актуальному
+        migrations.RunSQL(
+            sql="""
+                UPDATE meeting_reservation_system_booking
+                SET next_reminder_at = start_time - INTERVAL '24 hours'
+                WHERE status = 'confirmed' AND start_time > NOW()
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meeting_reservation_system', '0011_booking_reminders'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(db_index=True, max_length=64)),
+                ('format', models.CharField(max_length=10)),
+                ('params', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('pending', '⏳ В очереди'), ('running', '⚙️ Формируется'), ('done', '✅ Готов'), ('failed', '❌ Ошибка')], default='pending', max_length=10)),
+                ('file', models.FileField(blank=True, upload_to='reports/')),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('expires_at', models.DateTimeField(blank=True, null=True)),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='report_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status__in', ['pending', 'running'])), fields=('key',), name='report_job_active_key')],
+            },
+        ),
+    ]
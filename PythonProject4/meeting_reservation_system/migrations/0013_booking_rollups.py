@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:10
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meeting_reservation_system', '0012_reportjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('pending_count', models.PositiveIntegerField(default=0)),
+                ('confirmed_count', models.PositiveIntegerField(default=0)),
+                ('cancelled_count', models.PositiveIntegerField(default=0)),
+                ('completed_count', models.PositiveIntegerField(default=0)),
+                ('booked_minutes', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('office', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='rollups', to='meeting_reservation_system.office')),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='meeting_reservation_system.room')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='booking_rollup_day_idx'), models.Index(fields=['office', 'day'], name='booking_rollup_office_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('room', 'day'), name='booking_rollup_room_day')],
+            },
+        ),
+        migrations.CreateModel(
+            name='RollupDirtyDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('marked_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='meeting_reservation_system.room')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('room', 'day'), name='rollup_dirty_room_day')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meeting_reservation_system', '0013_booking_rollups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['start_time', 'room', 'status'], name='booking_start_room_status_idx'),
+        ),
+    ]
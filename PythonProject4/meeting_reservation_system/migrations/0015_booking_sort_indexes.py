@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meeting_reservation_system', '0014_booking_report_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['room', 'start_time', 'id'], name='booking_room_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['user', 'start_time', 'id'], name='booking_user_start_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+from django.db import migrations
+
+from meeting_reservation_system.occupancy import OCCUPANCY_STATUSES, compute_occupancy
+
+
+BATCH_SIZE = 2000
+
+
+def backfill_occupancy(apps, schema_editor):
+    """
+    Заполнить RoomOccupancy по существующим броням — то же, что
+    rebuild_occupancy: карта занятости читает только эту таблицу и без
+    заполнения показывала бы все комнаты свободными.
+    """
+    Booking = apps.get_model('meeting_reservation_system', 'Booking')
+    RoomOccupancy = apps.get_model('meeting_reservation_system', 'RoomOccupancy')
+
+    rows = (
+        Booking.objects
+        .filter(status__in=OCCUPANCY_STATUSES)
+        .order_by()
+        .values_list('room_id', 'start_time', 'end_time', 'status', 'custom_price', 'room__price_per_hour')
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+    computed = compute_occupancy(rows)
+
+    RoomOccupancy.objects.all().delete()
+    RoomOccupancy.objects.bulk_create(
+        [
+            RoomOccupancy(room_id=room_id, day=day, slot_mask=mask, booked_minutes=minutes, revenue=revenue)
+            for (room_id, day), (mask, minutes, revenue) in computed.items()
+        ],
+        batch_size=BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meeting_reservation_system', '0015_booking_sort_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_occupancy, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+from meeting_reservation_system.rollups import aggregate_rollups, rollup_from_row
+
+
+BATCH_SIZE = 2000
+
+
+def backfill_rollups(apps, schema_editor):
+    """
+    Заполнить BookingRollup по существующим броням — то же, что
+    refresh_rollups --rebuild: отчёты читают только сводки и без заполнения
+    показывали бы нули за всё время до миграции.
+    """
+    Booking = apps.get_model('meeting_reservation_system', 'Booking')
+    BookingRollup = apps.get_model('meeting_reservation_system', 'BookingRollup')
+    RollupDirtyDay = apps.get_model('meeting_reservation_system', 'RollupDirtyDay')
+
+    rows = aggregate_rollups(Booking.objects.all()).iterator(chunk_size=BATCH_SIZE)
+
+    # Сводки пересобираются целиком, накопленные отметки больше не нужны
+    RollupDirtyDay.objects.all().delete()
+    BookingRollup.objects.all().delete()
+    BookingRollup.objects.bulk_create(
+        [rollup_from_row(row, BookingRollup) for row in rows],
+        batch_size=BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meeting_reservation_system', '0016_backfill_room_occupancy'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
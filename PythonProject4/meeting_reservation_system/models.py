@@ -1,4 +1,6 @@
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import DateTimeRangeField, RangeOperators
 from django.db import models
 import random
 from django.utils import timezone
@@ -206,6 +208,12 @@ class EmailConfirmation(models.Model):
         return f"{self.user.username} - {self.email} - {self.code}"
 
 
+class TsTzRange(models.Func):
+    """tstzrange(start, end) — полуинтервал [start, end) для exclusion-ограничений"""
+    function = 'TSTZRANGE'
+    output_field = DateTimeRangeField()
+
+
 class Booking(models.Model):
     STATUS_CHOICES = [
         ('pending', ' Ожидание'),
@@ -238,5 +246,222 @@ class Booking(models.Model):
     description = models.TextField(blank=True)
     manager_comment = models.TextField(blank=True, null=True)
 
+    # Напоминания: сколько этапов уже пройдено и когда следующий (NULL — не нужен)
+    reminder_stage = models.PositiveSmallIntegerField(default=0)
+    next_reminder_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # Две активные брони одной комнаты не могут пересекаться по времени.
+            # GiST-индекс этого ограничения обслуживает и все запросы на пересечение.
+            ExclusionConstraint(
+                name='booking_no_overlap',
+                expressions=[
+                    ('room', RangeOperators.EQUAL),
+                    (TsTzRange('start_time', 'end_time'), RangeOperators.OVERLAPS),
+                ],
+                condition=models.Q(status__in=['pending', 'confirmed']),
+            ),
+        ]
+        indexes = [
+            # Автоматические переходы статусов (lifecycle) выбирают по статусу и времени
+            models.Index(fields=['status', 'start_time'], name='booking_status_start_idx'),
+            models.Index(fields=['status', 'end_time'], name='booking_status_end_idx'),
+            # Фильтры отчётов: диапазон по start_time, дальше комната и статус
+            models.Index(fields=['start_time', 'room', 'status'], name='booking_start_room_status_idx'),
+            # Сортировки страницы отчёта по комнате и по пользователю
+            models.Index(fields=['room', 'start_time', 'id'], name='booking_room_start_idx'),
+            models.Index(fields=['user', 'start_time', 'id'], name='booking_user_start_idx'),
+            # Keyset-пагинация панели менеджера: ORDER BY created_at DESC, id DESC
+            models.Index(fields=['created_at', 'id'], name='booking_created_idx'),
+            models.Index(fields=['status', 'created_at', 'id'], name='booking_status_created_idx'),
+            # Планировщик напоминаний видит только брони, которым что-то причитается
+            models.Index(
+                fields=['next_reminder_at'],
+                name='booking_reminder_due_idx',
+                condition=models.Q(next_reminder_at__isnull=False),
+            ),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.room.name}"
+
+
+class SlotHold(models.Model):
+    """Временное удержание слота, пока пользователь заполняет форму брони"""
+    token = models.CharField(max_length=32, unique=True)
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='holds')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='slot_holds')
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['room', 'start_time', 'end_time']),
+        ]
+
+    def __str__(self):
+        return f"{self.room.name}: {self.start_time} — {self.end_time} ({self.user.username})"
+
+
+class RoomOccupancy(models.Model):
+    """
+    Производная таблица занятости: одна строка на комнату и день.
+
+    Поддерживается модулем occupancy при каждом изменении брони
+    и пересобирается командой rebuild_occupancy.
+    """
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='occupancy')
+    day = models.DateField()
+    # Бит i — i-й 15-минутный слот рабочего дня, 1 = занят
+    slot_mask = models.BigIntegerField(default=0)
+    booked_minutes = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['room', 'day'], name='room_occupancy_room_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.room.name} — {self.day}"
+
+
+class BookingRollup(models.Model):
+    """
+    Сводка броней по комнате и дню (день начала брони, местное время).
+
+    Офис денормализован, чтобы отчёты по офисам не делали JOIN. Таблицу
+    инкрементально обновляет команда refresh_rollups по отметкам
+    RollupDirtyDay; дашборды и API отчётов читают только её.
+    """
+    day = models.DateField()
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='rollups')
+    office = models.ForeignKey(Office, on_delete=models.SET_NULL, null=True, blank=True, related_name='rollups')
+    pending_count = models.PositiveIntegerField(default=0)
+    confirmed_count = models.PositiveIntegerField(default=0)
+    cancelled_count = models.PositiveIntegerField(default=0)
+    completed_count = models.PositiveIntegerField(default=0)
+    booked_minutes = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['room', 'day'], name='booking_rollup_room_day'),
+        ]
+        indexes = [
+            models.Index(fields=['day'], name='booking_rollup_day_idx'),
+            models.Index(fields=['office', 'day'], name='booking_rollup_office_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.room.name} — {self.day}"
+
+
+class RollupDirtyDay(models.Model):
+    """Отметка «пересчитать сводку комнаты за день»: пишется в транзакции изменения брони"""
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='+')
+    day = models.DateField()
+    marked_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['room', 'day'], name='rollup_dirty_room_day'),
+        ]
+
+
+class WaitlistEntry(models.Model):
+    """Заявка в лист ожидания на занятый интервал комнаты"""
+    STATUS_CHOICES = [
+        ('waiting', '⏳ Ожидает'),
+        ('promoted', '✅ Переведена в бронь'),
+        ('expired', '⌛ Истекла'),
+        ('cancelled', '❌ Отменена'),
+    ]
+
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='waitlist')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='waitlist_entries')
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    description = models.TextField(blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='waiting')
+    booking = models.OneToOneField(Booking, on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name='waitlist_entry')
+    created_at = models.DateTimeField(auto_now_add=True)
+    promoted_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at', 'id']
+        indexes = [
+            models.Index(fields=['room', 'status', 'created_at'], name='waitlist_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} — {self.room.name} ({self.get_status_display()})"
+
+
+class OutboxEmail(models.Model):
+    """Письмо в исходящей очереди: пишется в транзакции бизнес-изменения, отправляется воркером"""
+    STATUS_CHOICES = [
+        ('pending', '⏳ В очереди'),
+        ('sent', '✅ Отправлено'),
+        ('dead', '☠️ Не доставлено'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255, blank=True)
+    to = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Воркер выбирает созревшие письма: status = 'pending' AND next_attempt_at <= now
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} → {', '.join(self.to)} ({self.get_status_display()})"
+
+
+class ReportJob(models.Model):
+    """Фоновая генерация отчёта; готовый файл переиспользуется для тех же фильтров до expires_at"""
+    STATUS_CHOICES = [
+        ('pending', '⏳ В очереди'),
+        ('running', '⚙️ Формируется'),
+        ('done', '✅ Готов'),
+        ('failed', '❌ Ошибка'),
+    ]
+
+    key = models.CharField(max_length=64, db_index=True)  # sha256 от формата и фильтров
+    format = models.CharField(max_length=10)
+    params = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    file = models.FileField(upload_to='reports/', blank=True)
+    error = models.TextField(blank=True)
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='report_jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # Одинаковый отчёт не ставится в очередь дважды, пока первый не готов
+            models.UniqueConstraint(
+                fields=['key'], condition=models.Q(status__in=['pending', 'running']),
+                name='report_job_active_key',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Отчёт {self.format} #{self.pk} ({self.get_status_display()})"
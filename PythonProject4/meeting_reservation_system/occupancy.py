@@ -0,0 +1,189 @@
+"""
+Материализованная занятость комнат по дням (RoomOccupancy).
+
+Каждая строка хранит битовую карту 15-минутных слотов рабочего дня,
+число занятых минут и выручку. При изменении брони пересчитываются только
+затронутые пары (комната, день) — после коммита транзакции и под
+advisory-блокировкой комнаты, чтобы параллельные пересчёты не затирали
+друг друга устаревшими данными.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .availability import day_bounds
+from .models import Booking, RoomOccupancy
+from .report_cache import bump_report_versions
+
+
+# Брони, которые занимают комнату (прошедшие завершённые тоже)
+OCCUPANCY_STATUSES = ('pending', 'confirmed', 'completed')
+
+# Выручку считаем только по подтверждённым и завершённым
+REVENUE_STATUSES = ('confirmed', 'completed')
+
+# Разрешение битовой карты в минутах
+OCCUPANCY_SLOT_MINUTES = 15
+
+# Пространство ключей advisory-блокировок пересчёта
+OCCUPANCY_LOCK_SPACE = 8001
+
+
+def booking_price(start, end, custom_price, price_per_hour):
+    """То же, что Booking.total_price, но без загрузки модели"""
+    if custom_price:
+        return custom_price
+    return int((end - start).total_seconds() // 3600) * price_per_hour
+
+
+def local_days(start, end):
+    """Локальные даты, которые захватывает полуинтервал [start, end)"""
+    first = timezone.localtime(start).date()
+    last = timezone.localtime(end - timedelta(microseconds=1)).date()
+    return [first + timedelta(days=i) for i in range((last - first).days + 1)]
+
+
+def slot_mask(start, end, day):
+    """Битовая карта 15-минутных слотов рабочего дня ``day``, занятых [start, end)"""
+    day_start, day_end = day_bounds(day)
+    busy_start, busy_end = max(start, day_start), min(end, day_end)
+    if busy_start >= busy_end:
+        return 0
+    step = timedelta(minutes=OCCUPANCY_SLOT_MINUTES)
+    first = (busy_start - day_start) // step
+    last = -((day_start - busy_end) // step)
+    return ((1 << (last - first)) - 1) << first
+
+
+def compute_occupancy(rows, pairs=None):
+    """
+    Строки занятости из броней.
+
+    ``rows`` — кортежи (room_id, start, end, status, custom_price, price_per_hour).
+    Если задан ``pairs``, считаются только эти (room_id, day).
+    Возвращает {(room_id, day): [slot_mask, booked_minutes, revenue]}.
+    """
+    result = defaultdict(lambda: [0, 0, Decimal('0')])
+    tz = timezone.get_current_timezone()
+    for room_id, start, end, status, custom_price, price_per_hour in rows:
+        days = local_days(start, end)
+        for day in days:
+            if pairs is not None and (room_id, day) not in pairs:
+                continue
+            midnight = timezone.make_aware(datetime.combine(day, time.min), tz)
+            overlap = min(end, midnight + timedelta(days=1)) - max(start, midnight)
+            entry = result[(room_id, day)]
+            entry[0] |= slot_mask(start, end, day)
+            entry[1] += int(overlap.total_seconds() // 60)
+            # Выручка целиком относится ко дню начала брони
+            if status in REVENUE_STATUSES and day == days[0]:
+                entry[2] += booking_price(start, end, custom_price, price_per_hour)
+    return result
+
+
+def occupancy_rows(bookings):
+    """Кортежи для compute_occupancy из queryset броней"""
+    return bookings.filter(status__in=OCCUPANCY_STATUSES).values_list(
+        'room_id', 'start_time', 'end_time', 'status', 'custom_price', 'room__price_per_hour',
+    )
+
+
+def refresh_room_days(pairs):
+    """Пересчитать занятость для пар (room_id, day) по текущим броням"""
+    pairs = set(pairs)
+    if not pairs:
+        return
+    tz = timezone.get_current_timezone()
+    room_ids = sorted({room_id for room_id, _ in pairs})
+    first_day = min(day for _, day in pairs)
+    last_day = max(day for _, day in pairs)
+    window_start = timezone.make_aware(datetime.combine(first_day, time.min), tz)
+    window_end = timezone.make_aware(datetime.combine(last_day + timedelta(days=1), time.min), tz)
+
+    with transaction.atomic():
+        # Пересчёты одной комнаты выполняются строго по очереди
+        with connection.cursor() as cursor:
+            for room_id in room_ids:
+                cursor.execute('SELECT pg_advisory_xact_lock(%s, %s)', [OCCUPANCY_LOCK_SPACE, room_id])
+
+        rows = occupancy_rows(Booking.objects.filter(
+            room_id__in=room_ids,
+            start_time__lt=window_end,
+            end_time__gt=window_start,
+        ))
+        computed = compute_occupancy(rows, pairs)
+
+        RoomOccupancy.objects.bulk_create(
+            [
+                RoomOccupancy(room_id=room_id, day=day, slot_mask=mask,
+                              booked_minutes=minutes, revenue=revenue)
+                for (room_id, day), (mask, minutes, revenue) in computed.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['room', 'day'],
+            update_fields=['slot_mask', 'booked_minutes', 'revenue', 'updated_at'],
+        )
+        # Дни, где броней не осталось, удаляем
+        empty = pairs - set(computed)
+        for room_id in room_ids:
+            days = [day for r, day in empty if r == room_id]
+            if days:
+                RoomOccupancy.objects.filter(room_id=room_id, day__in=days).delete()
+
+
+def bookings_changed(intervals, refresh_occupancy=True):
+    """
+    Сообщить об изменении броней: ``intervals`` — кортежи (room_id, start, end).
+
+    Пересчёт занятости выполняется после коммита текущей транзакции, чтобы
+    видеть все закоммиченные брони; там же сбрасывается кэш отчётов по
+    этим дням. Сводки BookingRollup только отмечаются и пересчитываются
+    командой refresh_rollups. Без ``refresh_occupancy`` (смена статуса,
+    не меняющая занятость) RoomOccupancy не пересчитывается.
+    """
+    pairs = {(room_id, day) for room_id, start, end in intervals for day in local_days(start, end)}
+    if pairs:
+        # Отметки для сводок пишутся сразу, в той же транзакции, что и изменение
+        # (импорт здесь: rollups сам зависит от этого модуля)
+        from .rollups import mark_dirty
+
+        mark_dirty(pairs)
+        if refresh_occupancy:
+            transaction.on_commit(lambda: refresh_room_days(pairs))
+        transaction.on_commit(lambda: bump_report_versions(pairs))
+
+
+def booking_changed(booking):
+    """bookings_changed для одной брони"""
+    bookings_changed([(booking.room_id, booking.start_time, booking.end_time)])
+
+
+def fold_mask(mask, granularity):
+    """Перевести 15-минутную карту в карту слотов по ``granularity`` минут"""
+    ratio = granularity // OCCUPANCY_SLOT_MINUTES
+    if ratio == 1:
+        return mask
+    group = (1 << ratio) - 1
+    folded = 0
+    index = 0
+    while mask:
+        if mask & group:
+            folded |= 1 << index
+        mask >>= ratio
+        index += 1
+    return folded
+
+
+def occupancy_matrix(room_ids, first_day, last_day, granularity):
+    """Карта занятости {room_id: [маска на каждый день]} из RoomOccupancy — один запрос"""
+    days = [first_day + timedelta(days=i) for i in range((last_day - first_day).days + 1)]
+    matrix = {room_id: [0] * len(days) for room_id in room_ids}
+    rows = RoomOccupancy.objects.filter(
+        room_id__in=room_ids, day__gte=first_day, day__lte=last_day,
+    ).values_list('room_id', 'day', 'slot_mask')
+    for room_id, day, mask in rows:
+        matrix[room_id][(day - first_day).days] = fold_mask(mask, granularity)
+    return days, matrix
@@ -0,0 +1,133 @@
+"""
+Исходящая очередь писем (transactional outbox).
+
+Код запроса не ходит в SMTP: письмо записывается строкой OutboxEmail в той
+же транзакции, что и бизнес-изменение, — откат изменения откатывает и
+письмо. Воркер (команда process_outbox) забирает созревшие письма пачками,
+отправляет каждую пачку через одно соединение из пула (mailer), неудачные
+откладывает с экспоненциальной задержкой, а после MAX_ATTEMPTS попыток
+помечает «не доставлено» (dead letter) — такие письма видны в админке.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .mailer import send_batch
+from .models import OutboxEmail
+
+
+DEFAULT_BATCH_SIZE = 50
+
+# По сколько строк вставлять в очередь одним INSERT (рассылки на сотни адресов)
+ENQUEUE_BATCH_SIZE = 500
+
+MAX_ATTEMPTS = 6
+
+# Задержка перед повтором: BACKOFF_BASE * 2 ** (попытка - 1), но не больше BACKOFF_MAX
+BACKOFF_BASE = timedelta(seconds=30)
+BACKOFF_MAX = timedelta(hours=1)
+
+# На это время воркер «арендует» взятые письма: если он упадёт посреди
+# отправки, письма снова станут доступны другим воркерам
+LEASE_TIME = timedelta(minutes=5)
+
+
+def enqueue(messages):
+    """Поставить EmailMessage в очередь (в текущей транзакции); вернуть строки очереди"""
+    rows = [
+        OutboxEmail(
+            subject=message.subject,
+            body=message.body,
+            from_email=message.from_email or '',
+            to=list(message.to),
+        )
+        for message in messages
+        if message.to
+    ]
+    return OutboxEmail.objects.bulk_create(rows, batch_size=ENQUEUE_BATCH_SIZE)
+
+
+def enqueue_mail(subject, message, recipient_list, from_email=None):
+    """Замена send_mail: то же API, но письмо только ставится в очередь"""
+    from_email = from_email or settings.EMAIL_HOST_USER
+    return enqueue([EmailMessage(subject, message, from_email, recipient_list)])
+
+
+def backoff(attempts):
+    """Через сколько повторить письмо после ``attempts`` неудачных попыток"""
+    return min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+
+
+def to_message(row):
+    return EmailMessage(row.subject, row.body, row.from_email or settings.EMAIL_HOST_USER, row.to)
+
+
+def claim_batch(batch_size=DEFAULT_BATCH_SIZE, now=None):
+    """
+    Забрать пачку созревших писем и продлить их аренду.
+
+    Строки, уже взятые параллельным воркером, пропускаются (SKIP LOCKED).
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        rows = list(
+            OutboxEmail.objects
+            .filter(status='pending', next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')
+            .select_for_update(skip_locked=True)[:batch_size]
+        )
+        if rows:
+            OutboxEmail.objects.filter(pk__in=[row.pk for row in rows]).update(
+                next_attempt_at=now + LEASE_TIME,
+            )
+    return rows
+
+
+def record_results(sent, failed, now=None):
+    """Записать итоги пачки: отправленные — одним UPDATE, неудачные — с новой попыткой или в dead"""
+    now = now or timezone.now()
+    if sent:
+        OutboxEmail.objects.filter(pk__in=[row.pk for row in sent]).update(
+            status='sent', sent_at=now, attempts=F('attempts') + 1, last_error='',
+        )
+    dead = 0
+    for row, error in failed:
+        row.attempts += 1
+        row.last_error = f'{type(error).__name__}: {error}'[:2000]
+        if row.attempts >= MAX_ATTEMPTS:
+            row.status = 'dead'
+            dead += 1
+        else:
+            row.next_attempt_at = now + backoff(row.attempts)
+    OutboxEmail.objects.bulk_update(
+        [row for row, error in failed], ['attempts', 'last_error', 'status', 'next_attempt_at'],
+    )
+    return dead
+
+
+def deliver_batch(batch_size=DEFAULT_BATCH_SIZE, pool=None):
+    """
+    Отправить одну пачку писем. Возвращает (взято, отправлено, в dead, метрики).
+
+    Если SMTP-сервер недоступен целиком, вся пачка считается неудачной
+    попыткой и уходит на повтор; метрики в этом случае — None.
+    """
+    rows = claim_batch(batch_size)
+    if not rows:
+        return 0, 0, 0, None
+
+    try:
+        metrics, errors = send_batch([to_message(row) for row in rows], pool)
+    except Exception as e:
+        metrics, failed = None, [(row, e) for row in rows]
+    else:
+        failed = [(rows[index], error) for index, error in errors]
+
+    failed_ids = {row.pk for row, error in failed}
+    sent = [row for row in rows if row.pk not in failed_ids]
+    dead = record_results(sent, failed)
+    return len(rows), len(sent), dead, metrics
@@ -0,0 +1,60 @@
+"""
+Keyset-пагинация (seek method).
+
+Страница задаётся не номером/OFFSET, а курсором — значениями ключа
+сортировки последней показанной строки. Следующая страница выбирается
+условием «строго после курсора» по тому же составному индексу, поэтому
+стоимость запроса не растёт с глубиной прокрутки.
+"""
+import base64
+import json
+
+from django.db.models import Q
+
+
+def encode_cursor(value, pk):
+    """Курсор: непрозрачная url-safe строка из (значение ключа, id)"""
+    if hasattr(value, 'isoformat'):
+        value = value.isoformat()
+    raw = json.dumps([value, pk], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, field):
+    """Разбирает курсор обратно в (значение поля ``field``, id); ValueError при мусоре"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        value, pk = json.loads(raw)
+        return field.to_python(value), int(pk)
+    except Exception as exc:
+        raise ValueError('Некорректный курсор') from exc
+
+
+def keyset_page(queryset, cursor=None, page_size=30, key='created_at', descending=True):
+    """
+    Одна страница ``queryset``, упорядоченного по (``key``, id).
+
+    Возвращает (строки, курсор_следующей_страницы). Курсор равен None,
+    если дальше строк нет. Берётся page_size + 1 строка, чтобы узнать
+    о продолжении без COUNT(*).
+    """
+    field = queryset.model._meta.get_field(key)
+    prefix = '-' if descending else ''
+    queryset = queryset.order_by(f'{prefix}{key}', f'{prefix}id')
+
+    if cursor:
+        value, pk = decode_cursor(cursor, field)
+        before = 'lt' if descending else 'gt'
+        # Первое условие — диапазон по ведущему столбцу индекса,
+        # второе отсекает строки с тем же значением ключа до курсора
+        queryset = queryset.filter(
+            Q(**{f'{key}__{before}e': value}),
+            Q(**{f'{key}__{before}': value}) | Q(**{f'id__{before}': pk}),
+        )
+
+    rows = list(queryset[:page_size + 1])
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, key), last.pk)
@@ -0,0 +1,143 @@
+"""
+Повторяющиеся бронирования.
+
+Правило (ежедневно / еженедельно / ежемесячно, до даты или N раз)
+разворачивается в список вхождений на сервере. Конфликты всех вхождений
+проверяются одним запросом, свободные вставляются одним bulk_create
+в одной транзакции — число запросов не зависит от числа вхождений.
+"""
+import calendar
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .availability import is_overlap_error, merge_intervals, overlapping_bookings, overlaps_any
+from .models import Booking
+from .events import bookings_created
+from .holds import held_intervals
+from .occupancy import bookings_changed
+
+
+FREQUENCIES = ('daily', 'weekly', 'monthly')
+
+# Больше вхождений за один запрос не создаём (два года еженедельно)
+MAX_OCCURRENCES = 104
+
+# Сколько раз повторить попытку, если параллельная бронь заняла слот
+MAX_ATTEMPTS = 3
+
+
+def _add_months(value, months):
+    """Тот же день через ``months`` месяцев или None, если такого дня нет (31-е)"""
+    month_index = value.month - 1 + months
+    year, month = value.year + month_index // 12, month_index % 12 + 1
+    if value.day > calendar.monthrange(year, month)[1]:
+        return None
+    return value.replace(year=year, month=month)
+
+
+def expand_occurrences(start, duration, frequency, interval=1, count=None, until=None):
+    """
+    Развернуть правило в список (start, end) вхождений.
+
+    Шаг считается в локальном времени, чтобы вхождения оставались
+    в тот же час дня. ``until`` — последняя допустимая дата (включительно).
+    Серия, вхождения которой пересекаются друг с другом (длительность
+    больше шага), — ValueError: такие брони никогда не пройдут
+    ограничение booking_no_overlap.
+    """
+    if frequency not in FREQUENCIES:
+        raise ValueError(f'Неизвестная частота: {frequency}')
+    if interval < 1:
+        raise ValueError('Интервал должен быть положительным')
+    if count is None and until is None:
+        raise ValueError('Укажите количество повторений или дату окончания')
+    if count is not None and count < 1:
+        raise ValueError('Количество повторений должно быть положительным')
+    if duration <= timedelta(0):
+        raise ValueError('Длительность должна быть положительной')
+
+    limit = min(count if count is not None else MAX_OCCURRENCES, MAX_OCCURRENCES)
+    tz = timezone.get_current_timezone()
+    local_start = timezone.localtime(start, tz).replace(tzinfo=None)
+
+    occurrences = []
+    step = 0
+    while len(occurrences) < limit:
+        if frequency == 'daily':
+            current = local_start + timedelta(days=step * interval)
+        elif frequency == 'weekly':
+            current = local_start + timedelta(weeks=step * interval)
+        else:
+            current = _add_months(local_start, step * interval)
+            # Ограничиваем перебор, если день месяца подходит редко
+            if step > MAX_OCCURRENCES * 2:
+                break
+        step += 1
+
+        if current is None:
+            continue
+        if until is not None and current.date() > until:
+            break
+
+        occurrence_start = timezone.make_aware(current, tz)
+        if occurrences and occurrence_start < occurrences[-1][1]:
+            raise ValueError('Вхождения серии пересекаются: длительность больше шага повторения')
+        occurrences.append((occurrence_start, occurrence_start + duration))
+    return occurrences
+
+
+def create_recurring_bookings(user, room, occurrences, description=''):
+    """
+    Создать свободные вхождения, вернуть отчёт по каждому.
+
+    Один запрос на занятость всего диапазона, проверка каждого вхождения
+    бинарным поиском по склеенным интервалам и один bulk_create. Слоты,
+    удерживаемые другими пользователями, тоже пропускаются (статус held).
+    Если параллельный запрос успел занять слот (сработало ограничение
+    booking_no_overlap), вся вставка откатывается и проверка повторяется;
+    после MAX_ATTEMPTS попыток IntegrityError уходит вызывающему.
+    """
+    now = timezone.now()
+    first_start, last_end = occurrences[0][0], occurrences[-1][1]
+    for attempt in range(MAX_ATTEMPTS):
+        busy = merge_intervals(
+            overlapping_bookings(first_start, last_end, [room.id])
+            .values_list('start_time', 'end_time')
+        )
+        held = merge_intervals(held_intervals(room.id, first_start, last_end, exclude_user_id=user.id))
+
+        report = []
+        to_create = []
+        for start, end in occurrences:
+            if start < now:
+                status = 'past'
+            elif overlaps_any(busy, start, end):
+                status = 'conflict'
+            elif overlaps_any(held, start, end):
+                status = 'held'
+            else:
+                status = 'created'
+                to_create.append(Booking(
+                    user=user,
+                    room=room,
+                    start_time=start,
+                    end_time=end,
+                    description=description,
+                    status='pending',
+                ))
+            report.append({'start': start, 'end': end, 'status': status})
+
+        try:
+            with transaction.atomic():
+                created = Booking.objects.bulk_create(to_create)
+                # bulk_create не вызывает save(), поэтому занятость обновляем явно
+                bookings_changed([(room.id, b.start_time, b.end_time) for b in created])
+                bookings_created(created)
+        except IntegrityError as e:
+            if not is_overlap_error(e) or attempt == MAX_ATTEMPTS - 1:
+                raise
+            continue
+
+        return created, report
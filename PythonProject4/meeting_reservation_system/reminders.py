@@ -0,0 +1,104 @@
+"""
+Напоминания о подтверждённых бронях (за 24 часа и за 1 час до начала).
+
+У брони хранится время следующего напоминания next_reminder_at; поле
+заполнено только у подтверждённых будущих броней и покрыто частичным
+индексом, поэтому планировщик читает лишь созревшие строки, сколько бы
+броней ни было в будущем. Письмо ставится в outbox в той же транзакции,
+в которой бронь переходит на следующий этап, — повторный или
+параллельный запуск одно и то же напоминание второй раз не отправит.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .email_booking import booking_reminder_message
+from .models import Booking
+from .outbox import enqueue
+
+
+# За сколько до начала напоминать, по порядку этапов
+REMINDER_OFFSETS = (timedelta(hours=24), timedelta(hours=1))
+
+DEFAULT_BATCH_SIZE = 200
+
+
+def next_reminder_time(start_time, stage):
+    """Когда отправлять напоминание этапа ``stage``; None, если этапов больше нет"""
+    if stage >= len(REMINDER_OFFSETS):
+        return None
+    return start_time - REMINDER_OFFSETS[stage]
+
+
+def schedule_reminders(booking):
+    """
+    Пересчитать next_reminder_at после смены статуса или времени брони.
+
+    Сохранение — на вызывающем (save/bulk_update с полем next_reminder_at).
+    """
+    if booking.status == 'confirmed':
+        booking.next_reminder_at = next_reminder_time(booking.start_time, booking.reminder_stage)
+    else:
+        booking.next_reminder_at = None
+
+
+def current_stage(booking, now):
+    """
+    Этап, который пора отправить сейчас.
+
+    Если бронь подтвердили поздно и уже наступило время более позднего
+    этапа, ранние пропускаются: за 30 минут до начала письмо «через сутки»
+    не нужно.
+    """
+    stage = booking.reminder_stage
+    while stage + 1 < len(REMINDER_OFFSETS) and next_reminder_time(booking.start_time, stage + 1) <= now:
+        stage += 1
+    return stage
+
+
+def _process(bookings, now):
+    """Отправить напоминания по заблокированным броням; вернуть число поставленных писем"""
+    messages = []
+    for booking in bookings:
+        if booking.status != 'confirmed' or booking.start_time <= now:
+            # Бронь отменили/завершили мимо schedule_reminders или встреча уже идёт
+            booking.next_reminder_at = None
+            continue
+
+        stage = current_stage(booking, now)
+        if booking.user.email:
+            messages.append(booking_reminder_message(booking, REMINDER_OFFSETS[stage]))
+        booking.reminder_stage = stage + 1
+        booking.next_reminder_at = next_reminder_time(booking.start_time, stage + 1)
+
+    enqueue(messages)
+    Booking.objects.bulk_update(bookings, ['reminder_stage', 'next_reminder_at'])
+    return len(messages)
+
+
+def send_due_reminders(now=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Разобрать созревшие напоминания пачками; вернуть (проверено броней, писем).
+
+    Каждая пачка — своя транзакция: строки блокируются с SKIP LOCKED,
+    так что несколько планировщиков могут работать одновременно.
+    """
+    now = now or timezone.now()
+    checked = queued = 0
+    while True:
+        with transaction.atomic():
+            bookings = list(
+                Booking.objects
+                .filter(next_reminder_at__lte=now)
+                .order_by('next_reminder_at')
+                .select_related('room__office', 'user')
+                .select_for_update(of=('self',), skip_locked=True)[:batch_size]
+            )
+            if not bookings:
+                break
+            checked += len(bookings)
+            queued += _process(bookings, now)
+        if len(bookings) < batch_size:
+            break
+    return checked, queued
@@ -0,0 +1,119 @@
+"""
+Кэш строк отчёта по фильтрам.
+
+Ключ записи — нормализованные фильтры плюс версии всех дней, которые
+отчёт покрывает: счётчик (комната, день), если отчёт по одной комнате,
+и счётчик дня по всем комнатам — если по всем. Изменение брони
+(occupancy.bookings_changed) после коммита увеличивает счётчики своих
+дней, поэтому новая бронь сбрасывает только отчёты, в которые попадает.
+Отчёт без ограничения по датам зависит от общего счётчика.
+
+Счётчики живут в том же кэше и могут быть вытеснены. Отсутствующий
+счётчик заводится заново со значением time_ns(), а не с нуля, — иначе
+после вытеснения старая запись снова совпала бы по ключу.
+
+Сброс точен, только если кэш общий для всех процессов. С памятью
+процесса (LocMemCache) счётчики видит лишь тот процесс, где изменили
+бронь: воркеры отчётов поэтому работают мимо кэша (bypass_if_local),
+а изменения из других процессов (cron) веб-процесс увидит не позже
+REPORT_ROWS_CACHE_TTL.
+"""
+import hashlib
+import json
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+from time import time_ns
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+
+DEFAULT_CACHE_ALIAS = 'default'
+DEFAULT_CACHE_TTL = 300  # секунды
+
+# Отчёты дольше этого числа дней зависят от общего счётчика, а не от
+# счётчиков каждого дня (иначе ключ собирался бы из тысяч версий)
+MAX_VERSIONED_DAYS = 400
+
+GLOBAL_VERSION_KEY = 'report:v:all'
+
+_bypassed = ContextVar('report_cache_bypassed', default=False)
+
+
+def get_cache():
+    return caches[getattr(settings, 'REPORT_CACHE_ALIAS', DEFAULT_CACHE_ALIAS)]
+
+
+def is_shared():
+    """Общий ли кэш для всех процессов (не память текущего процесса)"""
+    return not isinstance(get_cache(), LocMemCache)
+
+
+@contextmanager
+def bypass_if_local():
+    """Внутри блока не читать и не писать записи, если кэш — память процесса"""
+    token = _bypassed.set(not is_shared())
+    try:
+        yield
+    finally:
+        _bypassed.reset(token)
+
+
+def day_version_key(day, room_id=None):
+    if room_id:
+        return f'report:v:{room_id}:{day.isoformat()}'
+    return f'report:v:{day.isoformat()}'
+
+
+def version_keys(first_day, last_day, room_id=None):
+    """Ключи счётчиков, от которых зависит отчёт за [first_day, last_day]"""
+    if first_day is None or last_day is None or (last_day - first_day).days >= MAX_VERSIONED_DAYS:
+        return [GLOBAL_VERSION_KEY]
+    days = (last_day - first_day).days + 1
+    return [day_version_key(first_day + timedelta(days=offset), room_id) for offset in range(days)]
+
+
+def current_versions(keys):
+    """Значения счётчиков; отсутствующие заводятся заново"""
+    cache = get_cache()
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, time_ns(), timeout=None)
+        versions.update(cache.get_many(missing))
+    return [versions.get(key, 0) for key in keys]
+
+
+def cache_key(kind, params, keys):
+    """Ключ записи: вид данных, фильтры и текущие версии покрытых дней"""
+    payload = json.dumps([kind, params, current_versions(keys)], sort_keys=True, default=str)
+    return f'report:{kind}:{hashlib.sha256(payload.encode()).hexdigest()}'
+
+
+def bump_report_versions(pairs):
+    """Сбросить кэш отчётов, покрывающих (room_id, day) из ``pairs``"""
+    cache = get_cache()
+    keys = {GLOBAL_VERSION_KEY}
+    for room_id, day in pairs:
+        keys.add(day_version_key(day, room_id))
+        keys.add(day_version_key(day))
+    for key in sorted(keys):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time_ns(), timeout=None)
+
+
+def load(key):
+    if _bypassed.get():
+        return None
+    return get_cache().get(key)
+
+
+def store(key, value):
+    if _bypassed.get():
+        return
+    get_cache().set(key, value, getattr(settings, 'REPORT_ROWS_CACHE_TTL', DEFAULT_CACHE_TTL))
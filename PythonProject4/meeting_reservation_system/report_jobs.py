@@ -0,0 +1,163 @@
+"""
+Фоновая генерация отчётов.
+
+Запрос только ставит задачу ReportJob с ключом от формата и фильтров;
+если такой же отчёт уже формируется или готовый файл ещё не устарел
+(REPORT_CACHE_TTL), возвращается существующая задача. Воркер (команда
+process_reports) забирает задачи и рендерит их в пуле процессов — тяжёлый
+wkhtmltopdf не держит ни веб-воркер, ни GIL основного процесса. Клиент
+опрашивает статус задачи и скачивает готовый файл.
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import report_cache, report_worker
+from .models import ReportJob
+from .reports import get_renderer
+
+
+DEFAULT_CACHE_TTL = 600  # секунды
+DEFAULT_WORKERS = 2
+
+# Попыток поставить задачу, если параллельный запрос ставит тот же отчёт
+CREATE_ATTEMPTS = 3
+
+# Задача в статусе running дольше этого считается брошенной упавшим воркером
+JOB_TIMEOUT = timedelta(minutes=30)
+
+
+def report_key(fmt, params):
+    """Ключ отчёта: одинаковые формат и фильтры — один и тот же ключ"""
+    payload = json.dumps({'format': fmt, 'params': params}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def request_report(fmt, params, user=None, now=None):
+    """
+    Вернуть задачу на отчёт: действующую с теми же фильтрами или новую.
+
+    Неизвестный формат — KeyError (как у get_renderer).
+    """
+    get_renderer(fmt)
+    now = now or timezone.now()
+    key = report_key(fmt, params)
+    reusable = Q(status__in=['pending', 'running']) | Q(status='done', expires_at__gt=now)
+
+    reusable_jobs = ReportJob.objects.filter(reusable, key=key).order_by('-created_at')
+
+    for attempt in range(CREATE_ATTEMPTS):
+        job = reusable_jobs.first()
+        if job:
+            return job
+        try:
+            with transaction.atomic():
+                return ReportJob.objects.create(
+                    key=key, format=fmt, params=params,
+                    requested_by=user if user and user.is_authenticated else None,
+                )
+        except IntegrityError:
+            # Параллельный запрос успел поставить тот же отчёт; он мог уже
+            # и завершиться — ищем тем же условием, а если задача упала, создаём снова
+            if attempt == CREATE_ATTEMPTS - 1:
+                raise
+
+
+def claim_jobs(limit, now=None):
+    """Забрать до ``limit`` задач в работу; вернуть их id"""
+    now = now or timezone.now()
+    with transaction.atomic():
+        ids = list(
+            ReportJob.objects
+            .filter(Q(status='pending') | Q(status='running', started_at__lt=now - JOB_TIMEOUT))
+            .order_by('created_at')
+            .select_for_update(skip_locked=True)
+            .values_list('id', flat=True)[:limit]
+        )
+        ReportJob.objects.filter(pk__in=ids).update(status='running', started_at=now)
+    return ids
+
+
+def render_job(job_id):
+    """
+    Сформировать файл задачи (выполняется в процессе пула); вернуть итоговый статус.
+
+    Исключения наружу не выходят — иначе pool.map остановил бы весь цикл
+    воркера. Удалённая задача — статус missing, ошибка БД — failed.
+    """
+    try:
+        job = ReportJob.objects.get(pk=job_id)
+    except ReportJob.DoesNotExist:
+        return 'missing'
+    except DatabaseError:
+        connection.close()
+        return 'failed'
+
+    try:
+        renderer = get_renderer(job.format)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, f'report.{renderer.extension}')
+            # Воркер не видит сбросов версий из веб-процесса — локальный кэш строк не годится
+            with report_cache.bypass_if_local():
+                renderer.render(job.params, path)
+            with open(path, 'rb') as artifact:
+                job.file.save(f'{job.key[:16]}.{renderer.extension}', File(artifact), save=False)
+    except Exception as e:
+        job.status = 'failed'
+        job.error = f'{type(e).__name__}: {e}'[:2000]
+    else:
+        job.status = 'done'
+        ttl = getattr(settings, 'REPORT_CACHE_TTL', DEFAULT_CACHE_TTL)
+        job.expires_at = timezone.now() + timedelta(seconds=ttl)
+    job.finished_at = timezone.now()
+    try:
+        job.save(update_fields=['status', 'file', 'error', 'finished_at', 'expires_at'])
+    except DatabaseError:
+        # Задача останется в running и будет перезабрана после JOB_TIMEOUT
+        connection.close()
+        return 'failed'
+    return job.status
+
+
+def worker_count(workers=None):
+    return workers or getattr(settings, 'REPORT_WORKERS', DEFAULT_WORKERS)
+
+
+def create_pool(workers=None):
+    return ProcessPoolExecutor(
+        max_workers=worker_count(workers),
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=report_worker.init_worker,
+    )
+
+
+def run_jobs(pool, limit):
+    """Забрать задачи и сформировать их в пуле; вернуть (сделано, с ошибкой)"""
+    ids = claim_jobs(limit)
+    statuses = list(pool.map(report_worker.render, ids))
+    return statuses.count('done'), statuses.count('failed')
+
+
+def purge_expired(now=None):
+    """Удалить устаревшие файлы отчётов и их задачи; вернуть число задач"""
+    now = now or timezone.now()
+    expired = ReportJob.objects.filter(
+        Q(status='done', expires_at__lte=now) | Q(status='failed', finished_at__lte=now - JOB_TIMEOUT)
+    )
+    count = 0
+    for job in expired.iterator():
+        if job.file:
+            job.file.delete(save=False)
+        job.delete()
+        count += 1
+    return count
@@ -0,0 +1,18 @@
+"""
+Точки входа процессов пула отчётов.
+
+Процессы запускаются через spawn: чистый интерпретатор без унаследованных
+соединений с БД. Модуль импортируется до django.setup(), поэтому модели
+здесь подключаются только внутри функций.
+"""
+import django
+
+
+def init_worker():
+    django.setup()
+
+
+def render(job_id):
+    from .report_jobs import render_job
+
+    return render_job(job_id)
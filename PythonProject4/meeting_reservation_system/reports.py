@@ -0,0 +1,467 @@
+"""
+Выгрузка отчёта по бронированиям.
+
+Строки читаются одним запросом с JOIN комнаты и пользователя через
+серверный курсор (values_list().iterator()), так что в памяти одновременно
+только текущая порция строк. Excel пишется книгой openpyxl в режиме
+write_only: строки сразу уходят во временный файл на диске, а не копятся
+в дереве ячеек.
+
+Строки отчёта (страница, Excel, PDF) кэшируются по фильтрам — см.
+report_cache; большие выборки (больше REPORT_CACHE_MAX_ROWS) идут потоком
+мимо кэша.
+
+Для аналитиков есть выгрузки «сырых» данных — CSV и Parquet — с
+колонками комнаты, офиса, пользователя и вычисленной стоимостью. Обе
+отдаются потоком: CSV — порциями строк по мере чтения курсора, Parquet —
+группами строк (row group), каждая уходит клиенту сразу после записи.
+Parquet требует необязательного пакета pyarrow.
+
+Файлы отчётов формируют рендереры — классы из настройки REPORT_RENDERERS
+(формат → путь к классу), так что PDF-движок можно заменить без правок кода.
+"""
+import csv
+import io
+import json
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db.models import Max
+from django.db.models.functions import Length
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.module_loading import import_string
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter
+
+from . import report_cache
+from .models import Booking
+from .occupancy import booking_price
+
+
+REPORT_HEADERS = ['Дата', 'Комната', 'Пользователь', 'Начало', 'Конец', 'Статус']
+
+REPORT_FIELDS = ('start_time', 'end_time', 'room__name', 'user__username', 'status')
+
+# Сколько строк серверный курсор отдаёт за один запрос к БД
+ITERATOR_CHUNK_SIZE = 2000
+
+# Страница отчёта: строк на странице и порог точного подсчёта
+REPORT_PAGE_SIZE = 50
+EXACT_COUNT_LIMIT = 10000
+
+# Сортировки страницы отчёта. Комната и пользователь сортируются по имени
+# (пользователь — фамилия, имя, логин): строки страницы и так читаются с
+# JOIN, а выборка уже ограничена фильтрами, так что сортировка идёт по ней
+REPORT_SORTS = {
+    'date': ('start_time', 'id'),
+    'room': ('room__name', 'start_time', 'id'),
+    'user': ('user__last_name', 'user__first_name', 'user__username', 'start_time', 'id'),
+    'status': ('status', 'start_time', 'id'),
+}
+
+# Выборки больше этого в кэш не кладём — они и так идут потоком
+REPORT_CACHE_MAX_ROWS = 20000
+
+EXCEL_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Выгрузка данных: колонки и поля запроса (стоимость считается из custom_price и цены комнаты)
+DATA_COLUMNS = [
+    'id', 'start_time', 'end_time', 'status', 'participants_count',
+    'room_id', 'room', 'room_category', 'office', 'user_id', 'username', 'price',
+]
+DATA_FIELDS = (
+    'id', 'start_time', 'end_time', 'status', 'participants_count',
+    'room_id', 'room__name', 'room__category', 'room__office__name', 'user_id', 'user__username',
+    'custom_price', 'room__price_per_hour',
+)
+
+# Строк в одной группе Parquet-файла: крупные группы лучше сжимаются и быстрее читаются
+PARQUET_ROW_GROUP_SIZE = 50000
+
+# Параметры запроса, которые влияют на содержимое отчёта
+REPORT_FILTERS = ('start_date', 'end_date', 'room', 'status')
+
+DEFAULT_RENDERERS = {
+    'pdf': 'meeting_reservation_system.reports.PdfkitReportRenderer',
+    'xlsx': 'meeting_reservation_system.reports.ExcelReportRenderer',
+}
+
+
+def report_params(query):
+    """Непустые фильтры отчёта из QueryDict/словаря"""
+    return {name: query[name] for name in REPORT_FILTERS if query.get(name)}
+
+
+def local_midnight(day):
+    """Начало местного дня ``day`` (часовой пояс проекта) как aware-datetime"""
+    return timezone.make_aware(datetime.combine(day, time.min), timezone.get_current_timezone())
+
+
+def parse_report_date(value):
+    """Дата фильтра YYYY-MM-DD; пустая или некорректная — None"""
+    try:
+        return parse_date(value) if value else None
+    except ValueError:
+        return None
+
+
+def filter_bookings(params):
+    """
+    Брони по фильтрам отчёта (даты — местные, в формате YYYY-MM-DD).
+
+    Даты превращаются в полуинтервалы по самим столбцам
+    (start_time >= начало start_date, end_time < начало дня после
+    end_date), а не в start_time::date — иначе индексы по start_time не
+    работают. Верхняя граница дублируется на start_time (бронь кончается
+    позже, чем начинается), чтобы и она сужала диапазон индекса.
+    """
+    bookings = Booking.objects.all()
+    start_date = parse_report_date(params.get('start_date'))
+    end_date = parse_report_date(params.get('end_date'))
+    room_id = params.get('room')
+    status = params.get('status')
+
+    if start_date:
+        bookings = bookings.filter(start_time__gte=local_midnight(start_date))
+    if end_date:
+        day_after = local_midnight(end_date + timedelta(days=1))
+        bookings = bookings.filter(start_time__lt=day_after, end_time__lt=day_after)
+    if room_id:
+        bookings = bookings.filter(room_id=room_id)
+    if status:
+        bookings = bookings.filter(status=status)
+    return bookings
+
+
+def format_rows(rows):
+    """
+    Строки отчёта из кортежей REPORT_FIELDS.
+
+    Кортеж — колонки REPORT_HEADERS и последним код статуса (для оформления).
+    """
+    statuses = {key: label.strip() for key, label in Booking.STATUS_CHOICES}
+    tz = timezone.get_current_timezone()
+    for start, end, room, username, status in rows:
+        start, end = start.astimezone(tz), end.astimezone(tz)
+        yield (
+            start.strftime('%d.%m.%Y'),
+            room,
+            username,
+            start.strftime('%H:%M'),
+            end.strftime('%H:%M'),
+            statuses.get(status, status),
+            status,
+        )
+
+
+def report_rows(bookings):
+    """Все строки отчёта по одной, без загрузки моделей"""
+    return format_rows(
+        bookings
+        .order_by('start_time', 'id')
+        .values_list(*REPORT_FIELDS)
+        .iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+    )
+
+
+def sort_ordering(sort):
+    """Поля ORDER BY для сортировки вида 'room' или '-room'; неизвестная — по дате"""
+    descending = sort.startswith('-')
+    fields = REPORT_SORTS.get(sort.lstrip('-'), REPORT_SORTS['date'])
+    return [f'-{field}' if descending else field for field in fields]
+
+
+def estimated_count(queryset):
+    """Оценка числа строк планировщиком PostgreSQL (EXPLAIN, без выполнения запроса)"""
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def count_bookings(bookings):
+    """
+    Число броней: точное до EXACT_COUNT_LIMIT, дальше — оценка.
+
+    Возвращает (число, точное ли). Точный подсчёт ограничен LIMIT, так что
+    за год данных COUNT не сканирует всю выборку.
+    """
+    count = bookings.order_by()[:EXACT_COUNT_LIMIT + 1].count()
+    if count <= EXACT_COUNT_LIMIT:
+        return count, True
+    return max(estimated_count(bookings), count), False
+
+
+def _cache_rows(rows, key):
+    """Отдать строки дальше и, если их не больше REPORT_CACHE_MAX_ROWS, сохранить в кэш"""
+    kept = []
+    for row in rows:
+        if kept is not None:
+            kept.append(row)
+            if len(kept) > REPORT_CACHE_MAX_ROWS:
+                kept = None
+        yield row
+    if kept is not None:
+        report_cache.store(key, kept)
+
+
+def _cache_key(kind, params, extra=None):
+    """Ключ кэша для нормализованных фильтров с версиями покрытых дней"""
+    room = params.get('room')
+    keys = report_cache.version_keys(
+        parse_report_date(params.get('start_date')),
+        parse_report_date(params.get('end_date')),
+        int(room) if room and room.isdigit() else room,
+    )
+    return report_cache.cache_key(kind, dict(params, **(extra or {})), keys)
+
+
+def report_data(params, widths=False):
+    """
+    Строки отчёта по фильтрам и (если ``widths``) ширины колонок Excel.
+
+    Из кэша — готовый список; иначе генератор по БД, который по
+    исчерпании кладёт результат в кэш.
+    """
+    params = report_params(params)
+    key = _cache_key('rows', params)
+    rows = report_cache.load(key)
+    if rows is not None:
+        return rows, widths_from_rows(rows) if widths else None
+
+    bookings = filter_bookings(params)
+    return _cache_rows(report_rows(bookings), key), column_widths(bookings) if widths else None
+
+
+def report_page_data(params, sort='date', page=1, page_size=REPORT_PAGE_SIZE):
+    """
+    Одна страница отчёта: строки (один запрос с JOIN) и общее число.
+
+    Возвращает словарь rows, page, count, exact, num_pages, has_next.
+    Страница и число кэшируются так же, как строки отчёта.
+    """
+    params = report_params(params)
+    ordering = sort_ordering(sort)
+
+    count_key = _cache_key('count', params)
+    counted = report_cache.load(count_key)
+    if counted is None:
+        counted = count_bookings(filter_bookings(params))
+        report_cache.store(count_key, counted)
+    count, exact = counted
+
+    num_pages = max(1, -(-count // page_size))
+    page = min(max(page, 1), num_pages) if exact else max(page, 1)
+
+    page_key = _cache_key('page', params, {'ordering': ordering, 'page': page, 'size': page_size})
+    rows = report_cache.load(page_key)
+    if rows is None:
+        offset = (page - 1) * page_size
+        rows = list(format_rows(
+            filter_bookings(params)
+            .order_by(*ordering)
+            .values_list(*REPORT_FIELDS)[offset:offset + page_size]
+        ))
+        report_cache.store(page_key, rows)
+
+    return {
+        'rows': rows,
+        'page': page,
+        'count': count,
+        'exact': exact,
+        'num_pages': num_pages,
+        # Для оценочного числа страниц идём дальше, пока страницы полные
+        'has_next': page < num_pages if exact else len(rows) == page_size,
+    }
+
+
+def data_rows(bookings):
+    """Строки выгрузки данных (как в DATA_COLUMNS); время — в часовом поясе проекта"""
+    tz = timezone.get_current_timezone()
+    rows = (
+        bookings
+        .order_by('start_time', 'id')
+        .values_list(*DATA_FIELDS)
+        .iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+    )
+    for *row, custom_price, price_per_hour in rows:
+        start, end = row[1], row[2]
+        row[1], row[2] = start.astimezone(tz), end.astimezone(tz)
+        row.append(booking_price(start, end, custom_price, price_per_hour))
+        yield row
+
+
+def csv_chunks(bookings, batch_size=ITERATOR_CHUNK_SIZE):
+    """CSV выгрузки данных порциями по ``batch_size`` строк — для StreamingHttpResponse"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(DATA_COLUMNS)
+    for index, row in enumerate(data_rows(bookings), 1):
+        writer.writerow(row)
+        if index % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Файл «только на запись»: накапливает байты, пока их не заберёт генератор"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def parquet_chunks(bookings, row_group_size=PARQUET_ROW_GROUP_SIZE):
+    """
+    Parquet выгрузки данных по группам строк — для StreamingHttpResponse.
+
+    В памяти не больше одной группы; ImportError, если pyarrow не установлен
+    (проверяется при первом next()).
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    timestamp = pa.timestamp('us', tz=settings.TIME_ZONE)
+    schema = pa.schema([
+        ('id', pa.int64()),
+        ('start_time', timestamp),
+        ('end_time', timestamp),
+        ('status', pa.string()),
+        ('participants_count', pa.int32()),
+        ('room_id', pa.int64()),
+        ('room', pa.string()),
+        ('room_category', pa.string()),
+        ('office', pa.string()),
+        ('user_id', pa.int64()),
+        ('username', pa.string()),
+        ('price', pa.decimal128(12, 2)),
+    ])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression='snappy')
+
+    def write(rows):
+        columns = list(zip(*rows))
+        writer.write_table(pa.Table.from_arrays(
+            [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+            schema=schema,
+        ))
+
+    rows = []
+    for row in data_rows(bookings):
+        rows.append(row)
+        if len(rows) == row_group_size:
+            write(rows)
+            rows = []
+            yield sink.drain()
+    if rows:
+        write(rows)
+    writer.close()
+    yield sink.drain()
+
+
+def column_widths(bookings):
+    """
+    Ширина колонок по самому длинному значению.
+
+    В write_only-книге ширины записываются перед строками, поэтому длины
+    имён комнат и пользователей берутся одним агрегатом, а у даты, времени
+    и статуса они и так известны.
+    """
+    lengths = bookings.order_by().aggregate(
+        room=Max(Length('room__name')),
+        user=Max(Length('user__username')),
+    )
+    status = max(len(label.strip()) for key, label in Booking.STATUS_CHOICES)
+    data = [len('00.00.0000'), lengths['room'] or 0, lengths['user'] or 0, len('00:00'), len('00:00'), status]
+    return [max(len(header), length) + 2 for header, length in zip(REPORT_HEADERS, data)]
+
+
+def widths_from_rows(rows):
+    """Ширины колонок по уже прочитанным строкам (из кэша)"""
+    lengths = [len(header) for header in REPORT_HEADERS]
+    for row in rows:
+        for index, value in enumerate(row[:len(REPORT_HEADERS)]):
+            lengths[index] = max(lengths[index], len(value))
+    return [length + 2 for length in lengths]
+
+
+def write_excel(params, target):
+    """Записать отчёт по фильтрам в xlsx (путь или файловый объект); память не зависит от числа строк"""
+    rows, widths = report_data(params, widths=True)
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Бронирования')
+    for index, width in enumerate(widths, 1):
+        sheet.column_dimensions[get_column_letter(index)].width = width
+
+    bold = Font(bold=True)
+    header = []
+    for title in REPORT_HEADERS:
+        cell = WriteOnlyCell(sheet, value=title)
+        cell.font = bold
+        header.append(cell)
+    sheet.append(header)
+
+    for row in rows:
+        sheet.append(row[:len(REPORT_HEADERS)])
+    workbook.save(target)
+
+
+class BaseReportRenderer:
+    """Рендерер отчёта: пишет файл по пути ``path`` для фильтров ``params``"""
+    extension = ''
+    content_type = 'application/octet-stream'
+
+    def render(self, params, path):
+        raise NotImplementedError
+
+
+class ExcelReportRenderer(BaseReportRenderer):
+    extension = 'xlsx'
+    content_type = EXCEL_CONTENT_TYPE
+
+    def render(self, params, path):
+        write_excel(params, path)
+
+
+class PdfkitReportRenderer(BaseReportRenderer):
+    """
+    PDF через wkhtmltopdf (пакет pdfkit).
+
+    Путь к бинарнику — настройка WKHTMLTOPDF_PATH; пустой — искать в PATH.
+    """
+    extension = 'pdf'
+    content_type = 'application/pdf'
+
+    def render(self, params, path):
+        import pdfkit
+
+        rows, widths = report_data(params)
+        html = render_to_string('report_pdf.html', {'rows': rows})
+        config = pdfkit.configuration(wkhtmltopdf=getattr(settings, 'WKHTMLTOPDF_PATH', ''))
+        pdfkit.from_string(html, path, configuration=config)
+
+
+def get_renderer(fmt):
+    """Рендерер формата из настройки REPORT_RENDERERS; KeyError, если формат неизвестен"""
+    renderers = getattr(settings, 'REPORT_RENDERERS', DEFAULT_RENDERERS)
+    return import_string(renderers[fmt])()
@@ -0,0 +1,233 @@
+"""
+Сводки выручки и загрузки по комнатам, офисам и дням (BookingRollup).
+
+Любое изменение брони проходит через occupancy.bookings_changed, который
+в той же транзакции ставит отметку RollupDirtyDay на (комнату, день).
+Команда refresh_rollups забирает отметки пачками и пересчитывает только
+эти дни одним GROUP BY; стоимость брони считается в SQL тем же правилом,
+что и Booking.total_price. Отчёты читают только BookingRollup, так что
+графики за годы не сканируют таблицу броней.
+
+Бронь целиком относится ко дню своего начала (местное время).
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import (
+    Case, Count, DecimalField, F, Func, IntegerField, Q, Sum, Value, When,
+)
+from django.db.models.functions import (
+    Cast, Coalesce, Floor, TruncDate, TruncDay, TruncMonth, TruncYear,
+)
+from django.utils import timezone
+
+from .models import Booking, BookingRollup, RollupDirtyDay
+from .occupancy import OCCUPANCY_STATUSES, REVENUE_STATUSES
+
+
+DEFAULT_BATCH_SIZE = 500
+
+ROLLUP_FIELDS = [
+    'office', 'pending_count', 'confirmed_count', 'cancelled_count', 'completed_count',
+    'booked_minutes', 'revenue', 'updated_at',
+]
+
+PERIODS = {
+    'day': TruncDay,
+    'month': TruncMonth,
+    'year': TruncYear,
+}
+
+
+class Epoch(Func):
+    """EXTRACT(EPOCH FROM интервал) — длительность в секундах"""
+    template = 'EXTRACT(EPOCH FROM %(expressions)s)'
+    output_field = DecimalField()
+
+
+def booking_price_expression():
+    """SQL-версия Booking.total_price: custom_price или полные часы × цена комнаты"""
+    hours = Floor(Epoch(F('end_time') - F('start_time')) / 3600)
+    return Case(
+        When(Q(custom_price__isnull=False) & ~Q(custom_price=0), then=F('custom_price')),
+        default=hours * F('room__price_per_hour'),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
+
+
+def mark_dirty(pairs):
+    """
+    Отметить (room_id, day) для пересчёта.
+
+    ON CONFLICT DO UPDATE (а не DO NOTHING) ждёт, пока идущий пересчёт
+    снимет свою блокировку с отметки, — изменение не потеряется, даже если
+    пересчёт уже прочитал брони.
+    """
+    now = timezone.now()
+    RollupDirtyDay.objects.bulk_create(
+        [RollupDirtyDay(room_id=room_id, day=day, marked_at=now) for room_id, day in sorted(pairs)],
+        update_conflicts=True,
+        unique_fields=['room', 'day'],
+        update_fields=['marked_at'],
+    )
+
+
+def aggregate_rollups(bookings):
+    """
+    Агрегаты выборки ``bookings`` по (комнате, дню) — один GROUP BY.
+
+    Выборка передаётся снаружи, чтобы той же формулой пользовалась
+    миграция заполнения (с историческими моделями).
+    """
+    tz = timezone.get_current_timezone()
+    minutes = Cast(Floor(Epoch(F('end_time') - F('start_time')) / 60), IntegerField())
+    return (
+        bookings
+        .annotate(day=TruncDate('start_time', tzinfo=tz))
+        .values('room_id', 'room__office_id', 'day')
+        .annotate(
+            pending_count=Count('id', filter=Q(status='pending')),
+            confirmed_count=Count('id', filter=Q(status='confirmed')),
+            cancelled_count=Count('id', filter=Q(status='cancelled')),
+            completed_count=Count('id', filter=Q(status='completed')),
+            booked_minutes=Coalesce(
+                Sum(minutes, filter=Q(status__in=OCCUPANCY_STATUSES)), Value(0), output_field=IntegerField(),
+            ),
+            revenue=Coalesce(
+                Sum(booking_price_expression(), filter=Q(status__in=REVENUE_STATUSES)),
+                Value(Decimal('0')), output_field=DecimalField(max_digits=14, decimal_places=2),
+            ),
+        )
+        .order_by()
+    )
+
+
+def rollup_from_row(row, model=BookingRollup):
+    """Строка aggregate_rollups → несохранённый BookingRollup"""
+    return model(
+        room_id=row['room_id'],
+        office_id=row['room__office_id'],
+        day=row['day'],
+        pending_count=row['pending_count'],
+        confirmed_count=row['confirmed_count'],
+        cancelled_count=row['cancelled_count'],
+        completed_count=row['completed_count'],
+        booked_minutes=row['booked_minutes'],
+        revenue=row['revenue'],
+    )
+
+
+def compute_rollups(pairs):
+    """Сводки для пар (room_id, day) по текущим броням — один агрегирующий запрос"""
+    tz = timezone.get_current_timezone()
+    room_ids = sorted({room_id for room_id, day in pairs})
+    first_day = min(day for room_id, day in pairs)
+    last_day = max(day for room_id, day in pairs)
+    window_start = timezone.make_aware(datetime.combine(first_day, time.min), tz)
+    window_end = timezone.make_aware(datetime.combine(last_day + timedelta(days=1), time.min), tz)
+
+    rows = aggregate_rollups(
+        Booking.objects.filter(room_id__in=room_ids, start_time__gte=window_start, start_time__lt=window_end)
+    )
+    return {
+        (row['room_id'], row['day']): rollup_from_row(row)
+        for row in rows
+        if (row['room_id'], row['day']) in pairs
+    }
+
+
+def refresh_batch(batch_size=DEFAULT_BATCH_SIZE):
+    """Пересчитать одну пачку отмеченных дней; вернуть число обработанных отметок"""
+    with transaction.atomic():
+        marks = list(
+            RollupDirtyDay.objects
+            .order_by('marked_at')
+            .select_for_update(skip_locked=True)
+            .values_list('id', 'room_id', 'day')[:batch_size]
+        )
+        if not marks:
+            return 0
+        pairs = {(room_id, day) for mark_id, room_id, day in marks}
+        computed = compute_rollups(pairs)
+
+        BookingRollup.objects.bulk_create(
+            computed.values(),
+            update_conflicts=True,
+            unique_fields=['room', 'day'],
+            update_fields=ROLLUP_FIELDS,
+        )
+        # Дни, где броней не осталось
+        empty = pairs - computed.keys()
+        if empty:
+            stale = Q()
+            for room_id, day in empty:
+                stale |= Q(room_id=room_id, day=day)
+            BookingRollup.objects.filter(stale).delete()
+        RollupDirtyDay.objects.filter(pk__in=[mark_id for mark_id, room_id, day in marks]).delete()
+    return len(marks)
+
+
+def refresh_rollups(batch_size=DEFAULT_BATCH_SIZE):
+    """Разобрать все отметки; вернуть число пересчитанных (комната, день)"""
+    total = 0
+    while True:
+        done = refresh_batch(batch_size)
+        total += done
+        if done < batch_size:
+            return total
+
+
+def mark_all_dirty():
+    """Отметить все дни с бронями (для полной пересборки); вернуть число отметок"""
+    tz = timezone.get_current_timezone()
+    pairs = set(
+        Booking.objects
+        .annotate(day=TruncDate('start_time', tzinfo=tz))
+        .values_list('room_id', 'day')
+        .distinct()
+        .order_by()
+    )
+    pairs |= set(BookingRollup.objects.values_list('room_id', 'day'))
+    pairs = sorted(pairs)
+    for chunk in range(0, len(pairs), DEFAULT_BATCH_SIZE):
+        mark_dirty(pairs[chunk:chunk + DEFAULT_BATCH_SIZE])
+    return len(pairs)
+
+
+def year_earlier(day):
+    """Тот же день годом раньше (29 февраля → 28 февраля)"""
+    try:
+        return day.replace(year=day.year - 1)
+    except ValueError:
+        return day.replace(year=day.year - 1, day=28)
+
+
+def rollup_series(first_day, last_day, period='month', office_id=None, room_id=None, by_office=False):
+    """
+    Ряд сводок за период из BookingRollup.
+
+    ``period`` — day/month/year; при ``by_office`` ряд разбит по офисам.
+    """
+    rollups = BookingRollup.objects.filter(day__gte=first_day, day__lte=last_day)
+    if office_id:
+        rollups = rollups.filter(office_id=office_id)
+    if room_id:
+        rollups = rollups.filter(room_id=room_id)
+
+    group = ['period', 'office_id', 'office__name'] if by_office else ['period']
+    return list(
+        rollups
+        .annotate(period=PERIODS[period]('day'))
+        .values(*group)
+        .annotate(
+            bookings=Sum(F('pending_count') + F('confirmed_count') + F('cancelled_count') + F('completed_count')),
+            pending=Sum('pending_count'),
+            confirmed=Sum('confirmed_count'),
+            cancelled=Sum('cancelled_count'),
+            completed=Sum('completed_count'),
+            booked_minutes=Sum('booked_minutes'),
+            revenue=Sum('revenue'),
+        )
+        .order_by(*group)
+    )
@@ -1,3 +1,598 @@
-from django.test import TestCase
+import json
+import threading
+from datetime import date, datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.db import IntegrityError, connection, transaction
+from django.test import Client, TestCase, TransactionTestCase
+from django.utils import timezone
+
+from .analytics import load_intervals
+from .availability import find_next_slots, is_overlap_error
+from .holds import held_intervals, hold_slot
+from .lifecycle import run_booking_lifecycle
+from .models import Booking, BookingRollup, OutboxEmail, Room, SlotHold, User, WaitlistEntry
+from .occupancy import bookings_changed
+from .pagination import keyset_page
+from .outbox import MAX_ATTEMPTS, backoff, deliver_batch, enqueue_mail
+from .recurrence import create_recurring_bookings, expand_occurrences
+from .reports import filter_bookings, report_page_data
+from .waitlist import join_waitlist, promote_waitlist
+from .rollups import refresh_rollups
+
+
+class ReportFilterTests(TestCase):
+    """Фильтры отчёта: границы местных дат и работа по индексу"""
+
+    def setUp(self):
+        self.room = Room.objects.create(name='Переговорная', location='2 этаж', capacity=6, price_per_hour=500)
+        self.user = User.objects.create_user('reporter', password='pass')
+
+    def book(self, start, hours=1):
+        return Booking.objects.create(
+            user=self.user, room=self.room, start_time=start, end_time=start + timedelta(hours=hours),
+        )
+
+    def local(self, *args):
+        return timezone.make_aware(datetime(*args), timezone.get_current_timezone())
+
+    def plan(self, params):
+        # На пустой таблице планировщик всегда выберет seq scan — запрещаем его,
+        # чтобы увидеть, может ли условие вообще пойти по индексу
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        return filter_bookings(params).explain()
+
+    def test_local_date_bounds(self):
+        inside_first = self.book(self.local(2025, 3, 1, 0, 0))
+        inside_last = self.book(self.local(2025, 3, 31, 22, 0))
+        self.book(self.local(2025, 2, 28, 23, 0))  # начинается накануне
+        self.book(self.local(2025, 3, 31, 23, 30))  # заканчивается уже 1 апреля
+
+        found = filter_bookings({'start_date': '2025-03-01', 'end_date': '2025-03-31'})
+        self.assertEqual(set(found), {inside_first, inside_last})
+
+    def test_bad_date_is_ignored(self):
+        self.book(self.local(2025, 3, 1, 10, 0))
+        self.assertEqual(filter_bookings({'start_date': '2025-02-30'}).count(), 1)
+
+    def test_date_range_uses_start_time_index(self):
+        # Обычно это booking_start_room_status_idx, но при другой статистике
+        # планировщик вправе взять индекс по end_time — важен диапазон в Index Cond
+        plan = self.plan({'start_date': '2025-03-01', 'end_date': '2025-03-31'})
+        self.assertRegex(plan, r'Index Cond: .*(start|end)_time <')
+        self.assertNotIn('Seq Scan', plan)
+
+    def test_all_filters_keep_index_range(self):
+        # Какой из индексов выбрать — дело планировщика (зависит от статистики);
+        # важно, что время сравнивается по голому столбцу, без приведения к дате
+        params = {
+            'start_date': '2025-03-01', 'end_date': '2025-03-31',
+            'room': str(self.room.id), 'status': 'confirmed',
+        }
+        sql = str(filter_bookings(params).query)
+        self.assertRegex(sql, r'"start_time" >= ')
+        self.assertRegex(sql, r'"start_time" < ')
+        self.assertNotIn('::date', sql)
+        self.assertNotIn('AT TIME ZONE', sql)
+        self.assertNotIn('Seq Scan', self.plan(params))
+
+
+    def test_page_sorts_by_names(self):
+        zeta = Room.objects.create(name='Б-комната', location='3 этаж', capacity=6, price_per_hour=500)
+        alpha = Room.objects.create(name='А-комната', location='3 этаж', capacity=6, price_per_hour=500)
+        ivanov = User.objects.create_user('zz', password='pass', last_name='Иванов', first_name='Пётр')
+        abramov = User.objects.create_user('yy', password='pass', last_name='Абрамов', first_name='Олег')
+        # id идут в обратном порядке имён
+        Booking.objects.create(user=ivanov, room=zeta, start_time=self.local(2025, 3, 3, 10),
+                               end_time=self.local(2025, 3, 3, 11))
+        Booking.objects.create(user=abramov, room=alpha, start_time=self.local(2025, 3, 4, 10),
+                               end_time=self.local(2025, 3, 4, 11))
+
+        rooms = [row[1] for row in report_page_data({}, 'room')['rows']]
+        self.assertEqual(rooms, ['А-комната', 'Б-комната'])
+        users = [row[2] for row in report_page_data({}, '-user')['rows']]
+        self.assertEqual(users, ['zz', 'yy'])
+
+class LifecycleRollupTests(TestCase):
+    """Автоматические переходы статусов попадают в сводки BookingRollup"""
+
+    def test_lifecycle_updates_rollup_counts(self):
+        room = Room.objects.create(name='Переговорная', location='2 этаж', capacity=6, price_per_hour=500)
+        user = User.objects.create_user('owner', password='pass')
+        day = timezone.localdate() - timedelta(days=2)
+        noon = timezone.make_aware(datetime.combine(day, datetime.min.time()).replace(hour=12))
+        Booking.objects.bulk_create([
+            Booking(user=user, room=room, start_time=noon, end_time=noon + timedelta(hours=1), status='confirmed'),
+            Booking(user=user, room=room, start_time=noon + timedelta(hours=2),
+                    end_time=noon + timedelta(hours=3), status='confirmed'),
+            # Неподтверждённая бронь — днём раньше, чтобы её отмена не задела день завершённых
+            Booking(user=user, room=room, start_time=noon - timedelta(days=1),
+                    end_time=noon - timedelta(days=1, hours=-1), status='pending'),
+        ])
+        with self.captureOnCommitCallbacks(execute=True):
+            bookings_changed([(room.id, noon - timedelta(days=1), noon + timedelta(hours=3))])
+        refresh_rollups()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(run_booking_lifecycle(), {'completed': 2, 'expired': 1})
+        refresh_rollups()
+
+        completed = BookingRollup.objects.get(room=room, day=day)
+        self.assertEqual((completed.confirmed_count, completed.completed_count), (0, 2))
+        expired = BookingRollup.objects.get(room=room, day=day - timedelta(days=1))
+        self.assertEqual((expired.pending_count, expired.cancelled_count), (0, 1))
+
+
+class NextSlotsTests(TestCase):
+    """Поиск ближайших свободных окон"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('seeker', password='pass')
+        self.small = Room.objects.create(name='Малая', location='1 этаж', capacity=4, price_per_hour=300)
+        self.large = Room.objects.create(name='Большая', location='1 этаж', capacity=12, price_per_hour=900)
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def local(self, *args):
+        return timezone.make_aware(datetime(*args), timezone.get_current_timezone())
+
+    def test_skips_busy_intervals(self):
+        Booking.objects.create(
+            user=self.user, room=self.small, start_time=self.local(2030, 5, 10, 9), end_time=self.local(2030, 5, 10, 11),
+        )
+        Booking.objects.create(
+            user=self.user, room=self.large, start_time=self.local(2030, 5, 10, 8), end_time=self.local(2030, 5, 10, 13),
+        )
+        slots, complete = find_next_slots(
+            [self.small.id, self.large.id], self.local(2030, 5, 10, 8, 10), timedelta(hours=1), limit=2,
+        )
+        self.assertTrue(complete)
+        self.assertEqual(slots, [
+            (self.local(2030, 5, 10, 11), self.local(2030, 5, 10, 12), self.small.id),
+            (self.local(2030, 5, 10, 13), self.local(2030, 5, 10, 14), self.large.id),
+        ])
+
+    def test_rejects_bad_parameters(self):
+        for query in ['participants=много', 'duration=два', 'duration=0', 'duration=-1', 'office=центр']:
+            response = self.client.get(f'/api/next-slots/?{query}')
+            self.assertEqual(response.status_code, 400, query)
+
+    def test_filters_by_capacity(self):
+        slots = self.client.get('/api/next-slots/?participants=10&limit=3').json()['slots']
+        self.assertEqual({slot['room_id'] for slot in slots}, {self.large.id})
+
+
+class RecurringBookingTests(TestCase):
+    """Серии броней: пересечения, чужие удержания и гонки с другими запросами"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('series', password='pass')
+        self.other = User.objects.create_user('other', password='pass')
+        self.room = Room.objects.create(name='Переговорная', location='3 этаж', capacity=8, price_per_hour=500)
+        self.start = timezone.make_aware(datetime(2030, 5, 6, 10), timezone.get_current_timezone())
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def post_series(self, **fields):
+        data = {
+            'room_id': self.room.id, 'selected_date': '2030-05-06', 'start_time': '10:00',
+            'duration': '1', 'frequency': 'daily', 'count': '3',
+        }
+        data.update(fields)
+        return self.client.post('/api/create-recurring-booking/', data)
+
+    def test_self_overlapping_series_is_rejected(self):
+        with self.assertRaises(ValueError):
+            expand_occurrences(self.start, timedelta(hours=25), 'daily', count=3)
+        self.assertEqual(self.post_series(duration='25').status_code, 400)
+        self.assertFalse(Booking.objects.exists())
+
+    def test_conflicts_and_holds_are_skipped(self):
+        Booking.objects.create(
+            user=self.other, room=self.room, start_time=self.start, end_time=self.start + timedelta(hours=1),
+        )
+        second = self.start + timedelta(days=1)
+        self.assertIsNotNone(hold_slot(self.room.id, self.other.id, second, second + timedelta(hours=1)))
+
+        occurrences = expand_occurrences(self.start, timedelta(hours=1), 'daily', count=3)
+        created, report = create_recurring_bookings(self.user, self.room, occurrences)
+
+        self.assertEqual([item['status'] for item in report], ['conflict', 'held', 'created'])
+        self.assertEqual([booking.start_time for booking in created], [self.start + timedelta(days=2)])
+
+    def test_persistent_overlap_returns_error(self):
+        Booking.objects.create(
+            user=self.other, room=self.room, start_time=self.start, end_time=self.start + timedelta(hours=1),
+        )
+        # Занятость «не видна» проверке — каждая попытка упирается в booking_no_overlap,
+        # как при параллельных запросах, раз за разом занимающих слот
+        with mock.patch('meeting_reservation_system.recurrence.overlapping_bookings',
+                        return_value=Booking.objects.none()):
+            response = self.post_series()
+        self.assertFalse(response.json()['success'])
+        self.assertEqual(Booking.objects.filter(user=self.user).count(), 0)
+
+
+class WaitlistTests(TestCase):
+    """Лист ожидания: проверки заявки и продвижение по очереди"""
+
+    def setUp(self):
+        self.owner = User.objects.create_user('owner', password='pass')
+        self.first = User.objects.create_user('first', password='pass')
+        self.second = User.objects.create_user('second', password='pass')
+        self.manager = User.objects.create_user('manager', password='pass', role='manager')
+        self.room = Room.objects.create(name='Переговорная', location='4 этаж', capacity=6, price_per_hour=500)
+        self.start = timezone.make_aware(datetime(2030, 5, 6, 10), timezone.get_current_timezone())
+        self.end = self.start + timedelta(hours=1)
+        self.booking = Booking.objects.create(
+            user=self.owner, room=self.room, start_time=self.start, end_time=self.end, status='confirmed',
+        )
+
+    def test_join_checks(self):
+        join_waitlist(self.first, self.room, self.start, self.end)
+        for start, end in [
+            (self.start, self.end),  # повторная заявка
+            (self.end + timedelta(hours=1), self.end + timedelta(hours=2)),  # время свободно
+            (self.end, self.start),  # конец раньше начала
+            (timezone.now() - timedelta(hours=2), timezone.now() - timedelta(hours=1)),  # в прошлом
+        ]:
+            with self.assertRaises(ValueError):
+                join_waitlist(self.first, self.room, start, end)
+        self.assertEqual(WaitlistEntry.objects.count(), 1)
+
+    def test_booking_form_fallback_rejects_duplicate(self):
+        client = Client()
+        client.force_login(self.first)
+        form = {
+            'room_id': self.room.id, 'selected_date': '2030-05-06', 'start_time': '10:00',
+            'duration': '1', 'comment': '', 'join_waitlist': '1',
+        }
+        client.post('/api/create-booking/', form)
+        client.post('/api/create-booking/', form)
+        self.assertEqual(WaitlistEntry.objects.filter(user=self.first).count(), 1)
+
+    def test_release_promotes_first_in_queue(self):
+        first = join_waitlist(self.first, self.room, self.start, self.end)
+        second = join_waitlist(self.second, self.room, self.start, self.end)
+
+        client = Client()
+        client.force_login(self.manager)
+        with self.captureOnCommitCallbacks(execute=True):
+            client.post(
+                f'/api/update-booking-status/{self.booking.id}/', '{"status": "cancelled"}',
+                content_type='application/json',
+            )
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.status, 'promoted')
+        self.assertEqual(first.booking.user, self.first)
+        self.assertEqual(second.status, 'waiting')
+
+
+class WaitlistLockingTests(TransactionTestCase):
+    """Заявку, заблокированную другим обработчиком, очередь не перепрыгивает"""
+
+    def test_locked_head_is_not_skipped(self):
+        room = Room.objects.create(name='Переговорная', location='4 этаж', capacity=6, price_per_hour=500)
+        owner = User.objects.create_user('owner', password='pass')
+        start = timezone.make_aware(datetime(2030, 5, 6, 10), timezone.get_current_timezone())
+        end = start + timedelta(hours=1)
+        booking = Booking.objects.create(user=owner, room=room, start_time=start, end_time=end, status='confirmed')
+        head = join_waitlist(User.objects.create_user('first', password='pass'), room, start, end)
+        later = join_waitlist(User.objects.create_user('second', password='pass'), room, start, end)
+        Booking.objects.filter(pk=booking.pk).update(status='cancelled')
+
+        locked, release = threading.Event(), threading.Event()
+
+        def hold_head():
+            try:
+                with transaction.atomic():
+                    WaitlistEntry.objects.select_for_update().get(pk=head.pk)
+                    locked.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        worker = threading.Thread(target=hold_head)
+        worker.start()
+        try:
+            self.assertTrue(locked.wait(10))
+            self.assertEqual(promote_waitlist(room.id, start, end), 0)
+        finally:
+            release.set()
+            worker.join()
+
+        later.refresh_from_db()
+        self.assertEqual(later.status, 'waiting')
+        self.assertEqual(promote_waitlist(room.id, start, end), 1)
+        head.refresh_from_db()
+        self.assertEqual(head.status, 'promoted')
+
+
+class OutboxRetryTests(TestCase):
+    """Исходящая очередь: повтор с экспоненциальной задержкой и dead letter"""
+
+    def setUp(self):
+        self.row = enqueue_mail('Тема', 'Текст', ['user@example.com'])[0]
+
+    def test_backoff_grows_and_is_capped(self):
+        self.assertEqual(backoff(1), timedelta(seconds=30))
+        self.assertEqual(backoff(2), timedelta(seconds=60))
+        self.assertEqual(backoff(3), timedelta(seconds=120))
+        self.assertEqual(backoff(20), timedelta(hours=1))
+
+    def test_failed_message_is_retried_later(self):
+        before = timezone.now()
+        with mock.patch('meeting_reservation_system.outbox.send_batch', side_effect=OSError('SMTP недоступен')):
+            self.assertEqual(deliver_batch(), (1, 0, 0, None))
+
+        self.row.refresh_from_db()
+        self.assertEqual(self.row.status, 'pending')
+        self.assertEqual(self.row.attempts, 1)
+        self.assertIn('SMTP недоступен', self.row.last_error)
+        self.assertGreaterEqual(self.row.next_attempt_at, before + backoff(1))
+        # Пока задержка не прошла, письмо не берётся снова
+        self.assertEqual(deliver_batch()[0], 0)
+
+    def test_single_failure_does_not_fail_batch(self):
+        other = enqueue_mail('Тема', 'Текст', ['other@example.com'])[0]
+        with mock.patch('meeting_reservation_system.outbox.send_batch',
+                        return_value=(None, [(0, OSError('отказ'))])):
+            self.assertEqual(deliver_batch()[:3], (2, 1, 0))
+
+        self.row.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.row.status, 'pending')
+        self.assertEqual(other.status, 'sent')
+        self.assertEqual(other.attempts, 1)
+
+    def test_dead_after_max_attempts(self):
+        OutboxEmail.objects.filter(pk=self.row.pk).update(attempts=MAX_ATTEMPTS - 1)
+        with mock.patch('meeting_reservation_system.outbox.send_batch', side_effect=OSError('отказ')):
+            self.assertEqual(deliver_batch()[:3], (1, 0, 1))
+
+        self.row.refresh_from_db()
+        self.assertEqual(self.row.status, 'dead')
+        self.assertEqual(self.row.attempts, MAX_ATTEMPTS)
+
+    def test_sent_through_mail_backend(self):
+        self.assertEqual(deliver_batch()[:3], (1, 1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.row.refresh_from_db()
+        self.assertEqual(self.row.status, 'sent')
+        self.assertIsNotNone(self.row.sent_at)
+
+
+class SlotHoldTests(TestCase):
+    """Удержание слота: занятое и чужое время не удерживается, чужое удержание блокирует бронь"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('user', password='pass')
+        self.other = User.objects.create_user('other', password='pass')
+        self.room = Room.objects.create(name='Переговорная', location='4 этаж', capacity=6, price_per_hour=500)
+        self.start = timezone.make_aware(datetime(2030, 5, 6, 10), timezone.get_current_timezone())
+        self.end = self.start + timedelta(hours=1)
+        self.form = {
+            'room_id': self.room.id, 'selected_date': '2030-05-06', 'start_time': '10:00',
+            'duration': '1', 'comment': '',
+        }
+
+    def test_booked_slot_is_not_held(self):
+        Booking.objects.create(user=self.other, room=self.room, start_time=self.start, end_time=self.end)
+        self.assertIsNone(hold_slot(self.room.id, self.user.id, self.start, self.end))
+
+    def test_slot_held_by_other_user_is_refused(self):
+        self.assertIsNotNone(hold_slot(self.room.id, self.other.id, self.start, self.end))
+        self.assertIsNone(hold_slot(self.room.id, self.user.id, self.start + timedelta(minutes=30), self.end))
+        self.assertEqual(held_intervals(self.room.id, self.start, self.end, exclude_user_id=self.user.id),
+                         [(self.start, self.end)])
+
+    def test_other_users_hold_blocks_booking(self):
+        hold_slot(self.room.id, self.other.id, self.start, self.end)
+        client = Client()
+        client.force_login(self.user)
+        client.post('/api/create-booking/', self.form)
+        self.assertFalse(Booking.objects.exists())
+
+    def test_own_hold_turns_into_booking(self):
+        hold = hold_slot(self.room.id, self.user.id, self.start, self.end)
+        client = Client()
+        client.force_login(self.user)
+        client.post('/api/create-booking/', {**self.form, 'hold_token': hold.token})
+        self.assertEqual(Booking.objects.get().user, self.user)
+        self.assertFalse(SlotHold.objects.exists())
+
+
+class BulkStatusTests(TestCase):
+    """Массовая смена статуса: пересечение даёт ошибку по своему id, остальные применяются"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('user', password='pass')
+        self.manager = User.objects.create_user('manager', password='pass', role='manager')
+        self.room = Room.objects.create(name='Переговорная', location='4 этаж', capacity=6, price_per_hour=500)
+        start = timezone.make_aware(datetime(2030, 5, 6, 10), timezone.get_current_timezone())
+        self.cancelled = Booking.objects.create(
+            user=self.user, room=self.room, start_time=start, end_time=start + timedelta(hours=1), status='cancelled',
+        )
+        self.active = Booking.objects.create(
+            user=self.user, room=self.room, start_time=start, end_time=start + timedelta(hours=1), status='pending',
+        )
+        self.client = Client()
+        self.client.force_login(self.manager)
+
+    def post(self, updates):
+        return self.client.post(
+            '/api/bulk-update-booking-status/', json.dumps({'updates': updates}), content_type='application/json',
+        ).json()
+
+    def test_overlap_fails_only_its_item(self):
+        response = self.post([
+            {'id': self.cancelled.id, 'status': 'confirmed'},
+            {'id': self.active.id, 'status': 'confirmed'},
+            {'id': 0, 'status': 'confirmed'},
+        ])
+        self.assertEqual(response['updated'], 1)
+        self.assertEqual([result['success'] for result in response['results']], [False, True, False])
+        self.cancelled.refresh_from_db()
+        self.active.refresh_from_db()
+        self.assertEqual(self.cancelled.status, 'cancelled')
+        self.assertEqual(self.active.status, 'confirmed')
+
+    def test_invalid_status_is_reported(self):
+        response = self.post([{'id': self.active.id, 'status': 'unknown'}])
+        self.assertEqual(response['updated'], 0)
+        self.assertFalse(response['results'][0]['success'])
+        self.active.refresh_from_db()
+        self.assertEqual(self.active.status, 'pending')
+
+    def test_requires_manager(self):
+        client = Client()
+        client.force_login(self.user)
+        response = client.post(
+            '/api/bulk-update-booking-status/', json.dumps({'updates': [{'id': self.active.id, 'status': 'cancelled'}]}),
+            content_type='application/json',
+        ).json()
+        self.assertFalse(response['success'])
+        self.active.refresh_from_db()
+        self.assertEqual(self.active.status, 'pending')
+
+
+class BookingOverlapTests(TestCase):
+    """Пересечение активных броней отвергается ограничением booking_no_overlap"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('user', password='pass')
+        self.manager = User.objects.create_user('manager', password='pass', role='manager')
+        self.room = Room.objects.create(name='Переговорная', location='4 этаж', capacity=6, price_per_hour=500)
+        self.start = timezone.make_aware(datetime(2030, 5, 6, 10), timezone.get_current_timezone())
+        self.booking = Booking.objects.create(
+            user=self.manager, room=self.room, start_time=self.start, end_time=self.start + timedelta(hours=2),
+            status='confirmed',
+        )
+
+    def test_overlapping_insert_is_rejected(self):
+        with self.assertRaises(IntegrityError) as raised, transaction.atomic():
+            Booking.objects.create(
+                user=self.user, room=self.room, start_time=self.start + timedelta(hours=1),
+                end_time=self.start + timedelta(hours=3),
+            )
+        self.assertTrue(is_overlap_error(raised.exception))
+        # Соседняя бронь встык и отменённая бронь на то же время допустимы
+        Booking.objects.create(
+            user=self.user, room=self.room, start_time=self.start + timedelta(hours=2),
+            end_time=self.start + timedelta(hours=3),
+        )
+        Booking.objects.create(
+            user=self.user, room=self.room, start_time=self.start, end_time=self.start + timedelta(hours=1),
+            status='cancelled',
+        )
+
+    def test_create_booking_on_taken_time(self):
+        client = Client()
+        client.force_login(self.user)
+        client.post('/api/create-booking/', {
+            'room_id': self.room.id, 'selected_date': '2030-05-06', 'start_time': '11:00',
+            'duration': '1', 'comment': '',
+        })
+        self.assertFalse(Booking.objects.filter(user=self.user).exists())
+
+    def test_reactivation_on_taken_time(self):
+        cancelled = Booking.objects.create(
+            user=self.user, room=self.room, start_time=self.start, end_time=self.start + timedelta(hours=1),
+            status='cancelled',
+        )
+        client = Client()
+        client.force_login(self.manager)
+        response = client.post(
+            f'/api/update-booking-status/{cancelled.id}/', '{"status": "confirmed"}',
+            content_type='application/json',
+        ).json()
+        self.assertFalse(response['success'])
+        cancelled.refresh_from_db()
+        self.assertEqual(cancelled.status, 'cancelled')
+
+
+class KeysetPaginationTests(TestCase):
+    """Keyset-пагинация: страницы без пропусков и повторов при одинаковом ключе"""
+
+    def setUp(self):
+        user = User.objects.create_user('user', password='pass')
+        room = Room.objects.create(name='Переговорная', location='4 этаж', capacity=6, price_per_hour=500)
+        start = timezone.make_aware(datetime(2030, 5, 6, 8), timezone.get_current_timezone())
+        Booking.objects.bulk_create([
+            Booking(user=user, room=room, start_time=start + timedelta(hours=i),
+                    end_time=start + timedelta(hours=i + 1))
+            for i in range(7)
+        ])
+        # Половина броней с одинаковым created_at — порядок решает id
+        created = timezone.now()
+        Booking.objects.filter(id__in=list(Booking.objects.values_list('id', flat=True)[:4])).update(
+            created_at=created,
+        )
+
+    def test_pages_cover_all_rows_once(self):
+        for descending in (True, False):
+            seen, cursor = [], None
+            while True:
+                rows, cursor = keyset_page(Booking.objects.all(), cursor, page_size=3, descending=descending)
+                seen.extend(row.id for row in rows)
+                if cursor is None:
+                    break
+            ordering = ['-created_at', '-id'] if descending else ['created_at', 'id']
+            self.assertEqual(seen, list(Booking.objects.order_by(*ordering).values_list('id', flat=True)))
+
+    def test_garbage_cursor(self):
+        with self.assertRaises(ValueError):
+            keyset_page(Booking.objects.all(), 'мусор')
+
+
+class DeleteBookingTests(TestCase):
+    """Удаление брони: событие несёт id удалённой брони, время уходит листу ожидания"""
+
+    def setUp(self):
+        self.owner = User.objects.create_user('owner', password='pass')
+        self.waiting = User.objects.create_user('waiting', password='pass')
+        self.manager = User.objects.create_user('manager', password='pass', role='manager')
+        self.room = Room.objects.create(name='Переговорная', location='4 этаж', capacity=6, price_per_hour=500)
+        self.start = timezone.make_aware(datetime(2030, 5, 6, 10), timezone.get_current_timezone())
+        self.end = self.start + timedelta(hours=1)
+        self.booking = Booking.objects.create(
+            user=self.owner, room=self.room, start_time=self.start, end_time=self.end, status='confirmed',
+        )
+
+    def test_delete_publishes_id_and_promotes_waitlist(self):
+        entry = join_waitlist(self.waiting, self.room, self.start, self.end)
+        client = Client()
+        client.force_login(self.manager)
+        with mock.patch('meeting_reservation_system.events.publish') as publish, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = client.post(f'/api/delete-booking/{self.booking.id}/')
+        self.assertTrue(response.json()['success'])
+
+        deleted = [call.args for call in publish.call_args_list if call.args[1] == 'booking_deleted']
+        self.assertTrue(deleted)
+        for channels, event_type, data in deleted:
+            self.assertEqual(data['ids'], [self.booking.id])
+        self.assertFalse(Booking.objects.filter(id=self.booking.id).exists())
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, 'promoted')
+
+
+class AnalyticsIntervalsTests(TestCase):
+    """Интервалы для аналитики: берутся все брони, пересекающие период, любой длины"""
+
+    def test_long_booking_started_before_period(self):
+        user = User.objects.create_user('user', password='pass')
+        room = Room.objects.create(name='Переговорная', location='4 этаж', capacity=6, price_per_hour=500)
+        tz = timezone.get_current_timezone()
+        start = timezone.make_aware(datetime(2025, 3, 1, 9), tz)
+        Booking.objects.create(user=user, room=room, start_time=start, end_time=start + timedelta(days=5),
+                               status='confirmed')
+        Booking.objects.create(user=user, room=room, start_time=start - timedelta(days=2),
+                               end_time=start - timedelta(days=1), status='confirmed')
+
+        intervals = load_intervals(date(2025, 3, 4), date(2025, 3, 4), [room.id])
+        self.assertEqual(len(intervals), 1)
@@ -1,4 +1,4 @@
-from django.shortcuts import render, redirect
+from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import login, authenticate, logout  # ← Добавил logout
 from django.contrib import messages
@@ -8,162 +8,256 @@ from django.core.files.storage import FileSystemStorage
 from django.utils import timezone
 from .models import Room, User, EmailConfirmation, Booking, Office
 from django.http import JsonResponse
+from django.db import IntegrityError, transaction
 from datetime import datetime, timedelta
-from .models import SupportTicket, TicketResponse
+from .models import SupportTicket, TicketResponse, ReportJob
+from .recurrence import expand_occurrences, create_recurring_bookings
+from .availability import (
+    room_day_availability, format_time, is_overlap_error, free_rooms, parse_window,
+    slot_labels, find_next_slots, day_bounds, SEARCH_HORIZON_DAYS, BUSY_STATUSES,
+    SLOT_GRANULARITIES, DEFAULT_GRANULARITY,
+)
+from .holds import get_hold_store, hold_slot, held_intervals
+from .occupancy import booking_changed, occupancy_matrix
+from .waitlist import join_waitlist, booking_released
+from .pagination import keyset_page
+from .bulk_status import apply_status_updates, MAX_BULK_UPDATES
+from .reminders import schedule_reminders
+from .reports import (
+    filter_bookings, get_renderer, report_page_data, report_params, write_excel, csv_chunks, parquet_chunks,
+    EXCEL_CONTENT_TYPE,
+)
+from .report_jobs import request_report
+from .rollups import rollup_series, year_earlier, PERIODS as ROLLUP_PERIODS
+from .analytics import occupancy_analytics, parse_options as parse_analytics_options, write_analytics_excel
+from .events import (
+    bookings_created, booking_status_changed, booking_deleted, ticket_response_added,
+    channels_for, get_event_broker, format_sse,
+)
+import itertools
 import json
 from decimal import Decimal
-from django.http import HttpResponse
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.core.handlers.asgi import ASGIRequest
+from django.template.loader import render_to_string
 from django.utils.dateparse import parse_date
 from django.conf import settings
-import pandas as pd
-import io
-import pdfkit
-from django.utils.timezone import localtime  # вверху файла, если ещё не импортировано
-from openpyxl import load_workbook
+import tempfile
 
+STATUS_CHOICES = dict(Booking.STATUS_CHOICES)
 
-# Настройка пути к wkhtmltopdf
-PDFKIT_CONFIG = pdfkit.configuration(
-    wkhtmltopdf=r"C:\Program Files\wkhtmltopdf\bin\wkhtmltopdf.exe"
-)
+# Размер страницы поиска свободных комнат
+ROOMS_PAGE_SIZE = 20
+ROOMS_PAGE_SIZE_MAX = 100
 
-STATUS_CHOICES = dict(Booking.STATUS_CHOICES)
+# Ограничения календарной карты занятости
+MATRIX_MAX_DAYS = 62
+MATRIX_MAX_ROOMS = 200
+
+# Сколько ближайших окон можно запросить за раз
+NEXT_SLOTS_MAX = 20
+
+# Порция карточек в панели менеджера (бесконечная прокрутка)
+MANAGER_PAGE_SIZE = 30
+
+# Как часто слать комментарий-пинг в поток событий, чтобы прокси не рвали соединение
+EVENT_HEARTBEAT = 15  # секунды
 
 # Вынесем фильтрацию в отдельную функцию
 def get_filtered_bookings(request):
-    bookings = Booking.objects.all()
-    start_date = request.GET.get('start_date')
-    end_date = request.GET.get('end_date')
-    room_id = request.GET.get('room')
-    status = request.GET.get('status')
-
-    if start_date:
-        bookings = bookings.filter(start_time__date__gte=parse_date(start_date))
-    if end_date:
-        bookings = bookings.filter(end_time__date__lte=parse_date(end_date))
-    if room_id:
-        bookings = bookings.filter(room_id=room_id)
-    if status:
-        bookings = bookings.filter(status=status)
-    return bookings
+    return filter_bookings(request.GET)
 
 # Страница отчёта
 def report_page(request):
-    rooms = Room.objects.all()
-    # Добавляем строковое представление id, чтобы шаблон не ругался
-    for r in rooms:
-        r.id_str = str(r.id)
+    rooms = Room.objects.only('id', 'name').order_by('name')
+    sort = request.GET.get('sort', 'date')
+    try:
+        page = int(request.GET.get('page', 1))
+    except ValueError:
+        page = 1
 
-    bookings = get_filtered_bookings(request)
-    return render(request, 'report_page.html', {
-        'bookings': bookings,
+    # Одна страница строк (из кэша по фильтрам, если эти дни не менялись)
+    report = report_page_data(request.GET, sort, page)
+    context = {
+        'report': report,
+        'rows': report['rows'],
+        'sort': sort,
         'rooms': rooms,
         'statuses': STATUS_CHOICES,
         'request': request,
+    }
+    if request.user.is_authenticated and request.user.role in ['admin', 'manager']:
+        # Выручка и загрузка по офисам — только из сводок, без сканирования броней
+        first_day, last_day = rollup_range(request.GET)
+        context['office_summary'] = rollup_series(first_day, last_day, period='year', by_office=True)
+        context['summary_range'] = (first_day, last_day)
+    return render(request, 'report_page.html', context)
+
+
+def rollup_range(params):
+    """Период сводок из start_date/end_date; по умолчанию — с начала года по сегодня"""
+    today = timezone.localdate()
+    first_day = parse_date(params.get('start_date') or '') or today.replace(month=1, day=1)
+    last_day = parse_date(params.get('end_date') or '') or today
+    return first_day, last_day
+
+
+def rollup_row_json(row):
+    data = {
+        'period': row['period'].isoformat(),
+        'bookings': row['bookings'],
+        'pending': row['pending'],
+        'confirmed': row['confirmed'],
+        'cancelled': row['cancelled'],
+        'completed': row['completed'],
+        'booked_hours': round(row['booked_minutes'] / 60, 2),
+        'revenue': str(row['revenue']),
+    }
+    if 'office_id' in row:
+        data['office_id'] = row['office_id']
+        data['office'] = row['office__name'] or 'Без офиса'
+    return data
+
+
+@login_required
+def rollup_stats_api(request):
+    """
+    Выручка и загрузка из сводок BookingRollup (для графиков).
+
+    GET: start_date, end_date, period (day/month/year), office, room,
+    by_office=1. В previous — тот же период годом раньше (сравнение год к году).
+    """
+    if request.user.role not in ['admin', 'manager']:
+        return JsonResponse({'success': False, 'error': 'Доступ запрещен'})
+
+    period = request.GET.get('period', 'month')
+    if period not in ROLLUP_PERIODS:
+        return JsonResponse({'success': False, 'error': 'Неизвестный период'})
+    try:
+        first_day, last_day = rollup_range(request.GET)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Неверный формат даты'})
+    if first_day > last_day:
+        return JsonResponse({'success': False, 'error': 'Начало периода позже конца'})
+
+    options = {
+        'period': period,
+        'office_id': request.GET.get('office') or None,
+        'room_id': request.GET.get('room') or None,
+        'by_office': request.GET.get('by_office') == '1',
+    }
+    return JsonResponse({
+        'success': True,
+        'start_date': first_day.isoformat(),
+        'end_date': last_day.isoformat(),
+        'rows': [rollup_row_json(row) for row in rollup_series(first_day, last_day, **options)],
+        'previous': [
+            rollup_row_json(row)
+            for row in rollup_series(year_earlier(first_day), year_earlier(last_day), **options)
+        ],
     })
 
-# --- Экспорт в Excel ---
-def export_excel(request):
-    bookings = get_filtered_bookings(request)
-
-    data = []
-    for b in bookings:
-        start_time = b.start_time.astimezone(None)
-        end_time = b.end_time.astimezone(None)
-        data.append({
-            "Дата": b.start_time.astimezone(timezone.get_default_timezone()).strftime("%d.%m.%Y"),
-            'Комната': b.room.name,
-            'Пользователь': b.user.username,
-            'Начало': start_time.strftime('%H:%M'),
-            'Конец': end_time.strftime('%H:%M'),
-            'Статус': b.get_status_display(),
-        })
 
-    df = pd.DataFrame(data)
-    buffer = io.BytesIO()
+@login_required
+def occupancy_analytics_api(request):
+    """
+    Тепловые карты «час × день недели», пиковая занятость и перцентили
+    загрузки по офисам или категориям комнат.
+
+    GET: start_date, end_date, group_by (office/category), office, category.
+    """
+    if request.user.role not in ['admin', 'manager']:
+        return JsonResponse({'success': False, 'error': 'Доступ запрещен'})
+    try:
+        options = parse_analytics_options(request.GET)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)})
+    return JsonResponse({'success': True, **occupancy_analytics(**options)})
 
-    # Создаем Excel файл
-    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Бронирования')
 
-    # Настройка ширины колонок по содержимому
+@login_required
+def export_analytics(request):
+    """Аналитика загрузки в Excel: сводка и лист «Загрузка по часам»"""
+    if request.user.role not in ['admin', 'manager']:
+        return JsonResponse({'success': False, 'error': 'Доступ запрещен'})
+    try:
+        options = parse_analytics_options(request.GET)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)})
+    buffer = tempfile.TemporaryFile()
+    write_analytics_excel(occupancy_analytics(**options), buffer)
     buffer.seek(0)
-    wb = load_workbook(buffer)
-    ws = wb.active
+    return FileResponse(buffer, as_attachment=True, filename='occupancy.xlsx', content_type=EXCEL_CONTENT_TYPE)
 
-    for column_cells in ws.columns:
-        max_length = 0
-        column = column_cells[0].column_letter  # Получаем букву колонки
-        for cell in column_cells:
-            try:
-                cell_length = len(str(cell.value))
-                if cell_length > max_length:
-                    max_length = cell_length
-            except:
-                pass
-        adjusted_width = max_length + 2  # добавляем немного отступа
-        ws.column_dimensions[column].width = adjusted_width
-
-    buffer2 = io.BytesIO()
-    wb.save(buffer2)
-    buffer2.seek(0)
-
-    response = HttpResponse(
-        buffer2,
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    response['Content-Disposition'] = 'attachment; filename=bookings.xlsx'
+# --- Экспорт в Excel ---
+def export_excel(request):
+    # Книга собирается во временном файле и отдаётся потоком — память не растёт с числом строк
+    buffer = tempfile.TemporaryFile()
+    write_excel(request.GET, buffer)
+    buffer.seek(0)
+    return FileResponse(buffer, as_attachment=True, filename='bookings.xlsx', content_type=EXCEL_CONTENT_TYPE)
+
+# --- Выгрузка данных для аналитиков (CSV / Parquet, потоком) ---
+def export_csv(request):
+    response = StreamingHttpResponse(csv_chunks(get_filtered_bookings(request)), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = 'attachment; filename="bookings.csv"'
     return response
 
-# --- Экспорт в PDF ---
-def export_pdf(request):
-    bookings = get_filtered_bookings(request)
-
-    # Создаем HTML с корректной кодировкой и шрифтами
-    html_content = """
-    <!DOCTYPE html>
-    <html lang="ru">
-    <head>
-    <meta charset="UTF-8">
-    <style>
-        body { font-family: "Arial", "Times New Roman", sans-serif; font-size: 12px; }
-        table { border-collapse: collapse; width: 100%; }
-        th, td { border: 1px solid #000; padding: 5px; text-align: left; }
-        th { background-color: #f2f2f2; }
-    </style>
-    </head>
-    <body>
-    <h1>Отчёт по бронированиям</h1>
-    <table>
-    <tr>
-        <th>Дата</th>
-        <th>Комната</th>
-        <th>Пользователь</th>
-        <th>Начало</th>
-        <th>Конец</th>
-        <th>Статус</th>
-    </tr>
-    """
 
-    for b in bookings:
-        start_local = localtime(b.start_time).strftime('%H:%M')
-        end_local = localtime(b.end_time).strftime('%H:%M')
-        html_content += (f"<tr>"
-                         f"<td>{b.start_time.strftime('%d.%m.%Y')}</td>"
-                         f"<td>{b.room.name}</td>"
-                         f"<td>{b.user.username}</td>"
-                         f"<td>{start_local}</td>"
-                         f"<td>{end_local}</td>"
-                         f"<td>{b.get_status_display()}</td></tr>")
+def export_parquet(request):
+    chunks = parquet_chunks(get_filtered_bookings(request))
+    try:
+        first = next(chunks)
+    except ImportError:
+        return JsonResponse({'success': False, 'error': 'Выгрузка в Parquet недоступна: не установлен pyarrow'})
+    response = StreamingHttpResponse(itertools.chain([first], chunks), content_type='application/vnd.apache.parquet')
+    response['Content-Disposition'] = 'attachment; filename="bookings.parquet"'
+    return response
 
-    html_content += "</table></body></html>"
+# --- Экспорт в PDF (фоновая задача) ---
+def report_job_json(job):
+    data = {
+        'id': job.id,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'status_url': reverse('report_job_status', args=[job.id]),
+    }
+    if job.status == 'done':
+        data['download_url'] = reverse('download_report', args=[job.id])
+    if job.status == 'failed':
+        data['error'] = job.error
+    return data
 
-    # Генерация PDF через pdfkit с конфигурацией
-    pdf_file = pdfkit.from_string(html_content, False, configuration=PDFKIT_CONFIG)
 
-    response = HttpResponse(pdf_file, content_type='application/pdf')
-    response['Content-Disposition'] = 'attachment; filename="bookings.pdf"'
-    return response
+def export_pdf(request):
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Метод не разрешен'})
+
+    fmt = request.POST.get('format', 'pdf')
+    try:
+        job = request_report(fmt, report_params(request.GET), request.user)
+    except KeyError:
+        return JsonResponse({'success': False, 'error': 'Неизвестный формат отчёта'})
+    return JsonResponse({'success': True, 'job': report_job_json(job)})
+
+
+def report_job_status(request, job_id):
+    job = ReportJob.objects.filter(pk=job_id).first()
+    if not job:
+        return JsonResponse({'success': False, 'error': 'Отчёт не найден'})
+    return JsonResponse({'success': True, 'job': report_job_json(job)})
+
+
+def download_report(request, job_id):
+    job = get_object_or_404(ReportJob, pk=job_id, status='done')
+    if not job.file or job.expires_at <= timezone.now():
+        raise Http404('Файл отчёта устарел')
+    renderer = get_renderer(job.format)
+    return FileResponse(
+        job.file.open('rb'), as_attachment=True,
+        filename=f'bookings.{renderer.extension}', content_type=renderer.content_type,
+    )
 
 @login_required
 def ticket_response_form(request, ticket_id):
@@ -233,7 +327,7 @@ def ticket_detail(request, ticket_id):
                     messages.error(request, '❌ Тикет закрыт! Новые ответы невозможны.')
                     return redirect('support')
 
-                TicketResponse.objects.create(
+                response = TicketResponse.objects.create(
                     ticket=ticket,
                     user=request.user,
                     message=response_text
@@ -244,6 +338,7 @@ def ticket_detail(request, ticket_id):
                     ticket.status = 'in_progress'
                 ticket.last_activity = timezone.now()
                 ticket.save()
+                ticket_response_added(response)
 
                 messages.success(request, '✅ Ответ отправлен!')
 
@@ -314,6 +409,37 @@ def delete_ticket(request, ticket_id):
     except SupportTicket.DoesNotExist:
         return JsonResponse({'success': False, 'error': 'Тикет не найден'})
 
+@login_required
+async def event_stream(request):
+    """
+    Поток событий (Server-Sent Events) для текущего пользователя.
+
+    Работает только под ASGI (bron.asgi): соединение держится открытым,
+    события приходят из брокера по мере публикации.
+    """
+    if not isinstance(request, ASGIRequest):
+        # Под WSGI бесконечный поток занял бы рабочий поток навсегда;
+        # 204 говорит EventSource не переподключаться
+        return HttpResponse(status=204)
+
+    user = await request.auser()
+    subscription = get_event_broker().subscribe(channels_for(user))
+
+    async def stream():
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                event = await subscription.get(timeout=EVENT_HEARTBEAT)
+                yield format_sse(event) if event else ': ping\n\n'
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @login_required
 def check_ticket_status(request, ticket_id):
     """Проверка статуса тикета для AJAX"""
@@ -608,6 +734,27 @@ def admin_panel(request):
     return render(request, 'admin_panel.html', {'users': users})
 
 
+def manager_bookings(request):
+    """
+    Брони для панели менеджера с фильтрами из GET: status, room, category.
+
+    Фильтры применяются в SQL; комната и пользователь подтягиваются
+    JOIN-ом, чтобы карточки не делали по два запроса на бронь.
+    """
+    bookings = Booking.objects.select_related('room', 'user')
+    status = request.GET.get('status')
+    room_id = request.GET.get('room')
+    category = request.GET.get('category')
+
+    if status in STATUS_CHOICES:
+        bookings = bookings.filter(status=status)
+    if room_id and room_id.isdigit():
+        bookings = bookings.filter(room_id=room_id)
+    if category:
+        bookings = bookings.filter(room__category=category)
+    return bookings
+
+
 @login_required
 def manager_panel(request):
     """Менеджерская панель для подтверждения бронирований"""
@@ -615,25 +762,41 @@ def manager_panel(request):
         messages.error(request, '❌ Доступ запрещен!')
         return redirect('home')
 
-    bookings = Booking.objects.all().order_by('-created_at')
-    rooms = Room.objects.all()
-
-    from django.utils.timezone import get_current_timezone
+    # Первая порция рендерится сразу, остальные — через manager_bookings_api
+    bookings, next_cursor = keyset_page(manager_bookings(request), page_size=MANAGER_PAGE_SIZE)
+    rooms = Room.objects.only('id', 'name').order_by('name')
 
-    for booking in bookings:
-        tz = get_current_timezone()
-        local_start = booking.start_time.astimezone(tz)
-        local_end = booking.end_time.astimezone(tz)
+    return render(request, 'manager_panel.html', {
+        'bookings': bookings,
+        'rooms': rooms,
+        'next_cursor': next_cursor,
+        'selected_status': request.GET.get('status', ''),
+        'selected_room': request.GET.get('room', ''),
+        'selected_category': request.GET.get('category', ''),
+    })
 
-        # Сохраняем как строки чтобы избежать конвертации в шаблоне
-        booking.date_display = local_start.strftime("%d.%m.%Y")
-        booking.time_display = f"{local_start.strftime('%H:%M')} - {local_end.strftime('%H:%M')}"
 
-        # ★★★ НЕ присваиваем duration_hours и total_price - они теперь свойства ★★★
+@login_required
+def manager_bookings_api(request):
+    """Следующая порция карточек панели менеджера по курсору (JSON)"""
+    if request.user.role not in ['manager', 'admin']:
+        return JsonResponse({'success': False, 'error': 'Доступ запрещен'})
 
-    return render(request, 'manager_panel.html', {
-        'bookings': bookings,
-        'rooms': rooms
+    try:
+        bookings, next_cursor = keyset_page(
+            manager_bookings(request),
+            cursor=request.GET.get('cursor'),
+            page_size=MANAGER_PAGE_SIZE,
+        )
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)})
+
+    html = render_to_string('manager_booking_cards.html', {'bookings': bookings}, request=request)
+    return JsonResponse({
+        'success': True,
+        'html': html,
+        'count': len(bookings),
+        'next_cursor': next_cursor,
     })
 
 
@@ -644,8 +807,15 @@ def delete_booking(request, booking_id):
         return JsonResponse({'success': False, 'error': 'Доступ запрещен'})
 
     try:
-        booking = Booking.objects.get(id=booking_id)
-        booking.delete()
+        with transaction.atomic():
+            booking = Booking.objects.get(id=booking_id)
+            booking.delete()
+            booking_changed(booking)
+            booking_deleted(booking, booking_id)
+
+            # Освободившееся время отдаём первому в листе ожидания
+            if booking.status in BUSY_STATUSES:
+                booking_released(booking)
 
         messages.success(request, '✅ Бронирование успешно удалено!')
         return JsonResponse({'success': True})
@@ -675,15 +845,32 @@ def update_booking_status(request, booking_id):
             booking.manager_comment = manager_comment
 
         # Меняем статус
+        previous_status = booking.status
         if new_status in dict(Booking.STATUS_CHOICES):
             booking.status = new_status
+        schedule_reminders(booking)
 
-        booking.save()
-
-        # Если подтверждено — отправляем письмо с ПРАВИЛЬНОЙ ценой
-        if new_status == "confirmed":
-            from .email_booking import send_booking_confirmation
-            send_booking_confirmation(booking)
+        # Бронь и письмо о ней сохраняются вместе: SMTP из запроса не вызывается
+        try:
+            with transaction.atomic():
+                booking.save()
+                booking_changed(booking)
+                if booking.status != previous_status:
+                    booking_status_changed(booking)
+
+                # Отмена активной брони продвигает лист ожидания
+                if previous_status in BUSY_STATUSES and booking.status not in BUSY_STATUSES:
+                    booking_released(booking)
+
+                # Если подтверждено — ставим в очередь письмо с ПРАВИЛЬНОЙ ценой
+                if new_status == "confirmed":
+                    from .email_booking import send_booking_confirmation
+                    send_booking_confirmation(booking)
+        except IntegrityError as e:
+            # Возврат отменённой брони в работу, а её время уже заняли
+            if not is_overlap_error(e):
+                raise
+            return JsonResponse({'success': False, 'error': 'Комната уже занята в это время'})
 
         return JsonResponse({'success': True})
 
@@ -691,6 +878,37 @@ def update_booking_status(request, booking_id):
         return JsonResponse({'success': False, 'error': 'Бронь не найдена'})
 
 
+@login_required
+def bulk_update_booking_status(request):
+    """
+    Массовая смена статуса/цены/комментария.
+
+    Тело: {"updates": [{"id": 1, "status": "confirmed", "total_price": "1500",
+    "manager_comment": "..."}, ...]}. Ответ содержит результат по каждому id.
+    """
+    if request.user.role not in ['admin', 'manager']:
+        return JsonResponse({'success': False, 'error': 'Нет доступа'})
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Неверный метод запроса'})
+
+    try:
+        updates = json.loads(request.body).get('updates')
+    except (ValueError, AttributeError):
+        return JsonResponse({'success': False, 'error': 'Некорректный JSON'})
+
+    if not isinstance(updates, list) or not updates:
+        return JsonResponse({'success': False, 'error': 'Не переданы изменения'})
+    if len(updates) > MAX_BULK_UPDATES:
+        return JsonResponse({'success': False, 'error': f'Не более {MAX_BULK_UPDATES} броней за раз'})
+
+    results = apply_status_updates(updates)
+    return JsonResponse({
+        'success': True,
+        'updated': sum(1 for result in results if result['success']),
+        'results': results,
+    })
+
+
 @login_required
 def admin_user_profile(request, user_id):
     """Просмотр профиля пользователя для админа"""
@@ -836,32 +1054,50 @@ def verify_email(request):
 
 @login_required
 def get_available_rooms(request):
-    """AJAX: Получить доступные комнаты"""
+    """AJAX: Получить комнаты, свободные на выбранное время"""
     date = request.GET.get('date')
     start_time = request.GET.get('start_time')
     duration = request.GET.get('duration')
     participants = request.GET.get('participants')
+    office_id = request.GET.get('office')
+    category = request.GET.get('category')
+    amenities = request.GET.getlist('amenities')
 
-    # Здесь логика проверки доступности комнат
-    rooms = Room.objects.filter(is_active=True)
-
-    # Фильтрация по вместимости
-    if participants and int(participants) > 0:
-        rooms = rooms.filter(capacity__gte=int(participants))
-
-    # TODO: Проверка занятости по времени
-    available_rooms = []
-    for room in rooms:
-        available_rooms.append({
-            'id': room.id,
-            'name': room.name,
-            'capacity': room.capacity,
-            'location': room.location,
-            'price_per_hour': room.price_per_hour,
-            'amenities': room.amenities
-        })
+    try:
+        start_datetime, end_datetime = parse_window(date, start_time, duration)
+        participants = int(participants or 0)
+        page = max(int(request.GET.get('page', 1)), 1)
+        page_size = min(max(int(request.GET.get('page_size', ROOMS_PAGE_SIZE)), 1), ROOMS_PAGE_SIZE_MAX)
+    except (TypeError, ValueError):
+        return JsonResponse({'error': 'Укажите дату, время и длительность'}, status=400)
+
+    rooms = Room.objects.filter(is_active=True, status='active')
+
+    # Фильтрация по вместимости, офису, категории и удобствам
+    if participants > 0:
+        rooms = rooms.filter(capacity__gte=participants)
+    if office_id:
+        rooms = rooms.filter(office_id=office_id)
+    if category:
+        rooms = rooms.filter(category=category)
+    if amenities:
+        rooms = rooms.filter(amenities__contains=amenities)
+
+    # Проверка занятости по времени — NOT EXISTS в том же запросе.
+    # Берём на одну строку больше, чтобы узнать о следующей странице без COUNT
+    offset = (page - 1) * page_size
+    rows = list(
+        free_rooms(start_datetime, end_datetime, rooms)
+        .order_by('id')
+        .values('id', 'name', 'capacity', 'location', 'price_per_hour', 'amenities',
+                'category', 'office_id', 'office__name')[offset:offset + page_size + 1]
+    )
 
-    return JsonResponse({'rooms': available_rooms})
+    return JsonResponse({
+        'rooms': rows[:page_size],
+        'page': page,
+        'has_next': len(rows) > page_size,
+    })
 
 
 @login_required
@@ -877,6 +1113,7 @@ def create_booking(request):
             phone = request.POST.get('phone')
             email = request.POST.get('email')
             comment = request.POST.get('comment')
+            hold_token = request.POST.get('hold_token')
 
             print(
                 f"🔍 ДЕБАГ: Получены данные - комната:{room_id}, дата:{date_str}, время:{time_str}, длительность:{duration}")
@@ -899,28 +1136,46 @@ def create_booking(request):
                 messages.error(request, '❌ Нельзя бронировать в прошлом!')
                 return redirect('room_detail', room_id=room_id)
 
-            # Проверяем доступность комнаты
-            overlapping = Booking.objects.filter(
-                room=room,
-                start_time__lt=end_datetime,
-                end_time__gt=start_datetime,
-                status__in=['pending', 'confirmed']
-            ).exists()
-
-            if overlapping:
+            # Своё удержание слота превращается в бронь, чужое — блокирует слот
+            hold_store = get_hold_store()
+            hold = hold_store.get(hold_token) if hold_token else None
+            if not (hold and hold.user_id == request.user.id and hold.room_id == room.id
+                    and hold.start <= start_datetime and hold.end >= end_datetime):
+                hold = None
+                if held_intervals(room.id, start_datetime, end_datetime, exclude_user_id=request.user.id):
+                    messages.error(request, '❌ Это время сейчас удерживается другим пользователем!')
+                    return redirect('room_detail', room_id=room_id)
+
+            # Создаем бронирование. Пересечение с другими активными бронями
+            # запрещено ограничением booking_no_overlap в самой БД
+            try:
+                with transaction.atomic():
+                    booking = Booking.objects.create(
+                        user=request.user,
+                        room=room,
+                        start_time=start_datetime,
+                        end_time=end_datetime,
+                        description=comment,
+                        status='pending'
+                    )
+                    if hold:
+                        hold_store.release(hold.token)
+                    booking_changed(booking)
+                    bookings_created([booking])
+            except IntegrityError as e:
+                if not is_overlap_error(e):
+                    raise
+                if request.POST.get('join_waitlist'):
+                    try:
+                        join_waitlist(request.user, room, start_datetime, end_datetime, comment)
+                    except ValueError as e:
+                        messages.error(request, f'❌ {e}')
+                        return redirect('room_detail', room_id=room_id)
+                    messages.info(request, '⏳ Время занято — вы в листе ожидания. Мы напишем, если оно освободится.')
+                    return redirect('home')
                 messages.error(request, '❌ Комната уже занята в это время!')
                 return redirect('room_detail', room_id=room_id)
 
-            # Создаем бронирование
-            booking = Booking.objects.create(
-                user=request.user,
-                room=room,
-                start_time=start_datetime,
-                end_time=end_datetime,
-                description=comment,
-                status='pending'
-            )
-
             print(f"✅ БРОНИРОВАНИЕ СОЗДАНО УСПЕШНО!")
             print(f"   Сохранено в базе как: {booking.start_time}")
 
@@ -936,55 +1191,256 @@ def create_booking(request):
 
 
 @login_required
-def get_available_times(request, room_id):
-    """AJAX: Получить доступное время для комнаты на дату"""
-    date_str = request.GET.get('date')
+def hold_slot_api(request):
+    """AJAX: Удержать выбранный слот на время заполнения формы"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Неверный метод запроса'}, status=405)
 
     try:
-        room = Room.objects.get(id=room_id)
-        selected_date = datetime.strptime(date_str, "%Y-%m-%d").date()
+        room_id = int(request.POST.get('room_id'))
+        start_datetime, end_datetime = parse_window(
+            request.POST.get('selected_date'),
+            request.POST.get('start_time'),
+            request.POST.get('duration'),
+        )
+    except (TypeError, ValueError):
+        return JsonResponse({'success': False, 'error': 'Неверные параметры слота'}, status=400)
+
+    if start_datetime < timezone.now():
+        return JsonResponse({'success': False, 'error': 'Нельзя бронировать в прошлом!'})
+
+    hold = hold_slot(room_id, request.user.id, start_datetime, end_datetime)
+    if hold is None:
+        return JsonResponse({'success': False, 'error': 'Это время уже занято'})
+
+    return JsonResponse({'success': True, 'token': hold.token, 'expires_at': hold.expires_at})
+
+
+@login_required
+def release_hold_api(request):
+    """AJAX: Снять своё удержание слота"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Неверный метод запроса'}, status=405)
 
-        # Все возможные слоты времени
-        time_slots = []
-        for hour in range(9, 20):
-            time_slots.append(f"{hour:02d}:00")
+    hold_store = get_hold_store()
+    hold = hold_store.get(request.POST.get('token', ''))
+    if hold and hold.user_id == request.user.id:
+        hold_store.release(hold.token)
+    return JsonResponse({'success': True})
 
-        # Получаем бронирования
-        bookings = Booking.objects.filter(
-            room=room,
-            start_time__date=selected_date,
-            status__in=['pending', 'confirmed']
+
+@login_required
+def join_waitlist_api(request):
+    """AJAX: Встать в лист ожидания на занятое время"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Неверный метод запроса'}, status=405)
+
+    try:
+        room = Room.objects.get(id=request.POST.get('room_id'))
+        start_datetime, end_datetime = parse_window(
+            request.POST.get('selected_date'),
+            request.POST.get('start_time'),
+            request.POST.get('duration'),
         )
+    except Room.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'Комната не найдена'})
+    except (TypeError, ValueError):
+        return JsonResponse({'success': False, 'error': 'Неверные параметры слота'}, status=400)
 
-        # Конвертируем в локальное время
-        from django.utils.timezone import localtime
+    try:
+        entry = join_waitlist(request.user, room, start_datetime, end_datetime, request.POST.get('comment'))
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)})
+    return JsonResponse({'success': True, 'entry_id': entry.id})
 
-        # Создаем список занятого времени
-        booked_slots = []
-        for booking in bookings:
-            local_start = localtime(booking.start_time)
-            local_end = localtime(booking.end_time)
 
-            current_time = local_start
-            while current_time < local_end:
-                time_str = current_time.strftime("%H:%M")
-                booked_slots.append(time_str)
-                current_time += timedelta(hours=1)
+@login_required
+def create_recurring_booking(request):
+    """AJAX: Создать серию бронирований по правилу повторения"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Неверный метод запроса'}, status=405)
 
-        available_slots = [slot for slot in time_slots if slot not in booked_slots]
+    try:
+        room = Room.objects.get(id=request.POST.get('room_id'))
+        start_datetime, end_datetime = parse_window(
+            request.POST.get('selected_date'),
+            request.POST.get('start_time'),
+            request.POST.get('duration'),
+        )
+        frequency = request.POST.get('frequency', 'weekly')
+        interval = int(request.POST.get('interval') or 1)
+        count = int(request.POST['count']) if request.POST.get('count') else None
+        until = parse_date(request.POST['until']) if request.POST.get('until') else None
+
+        occurrences = expand_occurrences(
+            start_datetime, end_datetime - start_datetime, frequency, interval, count, until,
+        )
+    except Room.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'Комната не найдена'})
+    except (TypeError, ValueError) as e:
+        return JsonResponse({'success': False, 'error': f'Неверное правило повторения: {e}'}, status=400)
+
+    if not occurrences:
+        return JsonResponse({'success': False, 'error': 'Правило не дало ни одной даты'}, status=400)
+
+    try:
+        created, report = create_recurring_bookings(
+            request.user, room, occurrences, request.POST.get('comment') or '',
+        )
+    except IntegrityError as e:
+        # Параллельные запросы раз за разом занимали слоты серии
+        if not is_overlap_error(e):
+            raise
+        return JsonResponse({'success': False, 'error': 'Время серии занимают другие брони, попробуйте ещё раз'})
+
+    return JsonResponse({
+        'success': True,
+        'created': len(created),
+        'occurrences': [{
+            'date': timezone.localtime(item['start']).strftime('%Y-%m-%d'),
+            'start_time': format_time(item['start']),
+            'end_time': format_time(item['end']),
+            'status': item['status'],
+        } for item in report],
+    })
+
+
+@login_required
+def get_available_times(request, room_id):
+    """AJAX: Получить доступное время для комнаты на дату"""
+    date_str = request.GET.get('date')
+
+    try:
+        room = Room.objects.only('id').get(id=room_id)
+        selected_date = datetime.strptime(date_str, "%Y-%m-%d").date()
+
+        # Длина слота в минутах (15/30/60), по умолчанию час
+        granularity = int(request.GET.get('step', DEFAULT_GRANULARITY))
+        if granularity not in SLOT_GRANULARITIES:
+            return JsonResponse({'error': 'Недопустимая длина слота'}, status=400)
+
+        # Слоты, удерживаемые другими пользователями, тоже заняты
+        day_start, day_end = day_bounds(selected_date)
+        held = held_intervals(room.id, day_start, day_end, exclude_user_id=request.user.id)
+        availability = room_day_availability(room.id, selected_date, granularity, extra_busy=held)
 
         return JsonResponse({
-            'available_times': available_slots,
-            'booked_times': booked_slots
+            'step': granularity,
+            'available_times': [format_time(slot) for slot in availability['free_slots']],
+            'booked_times': [format_time(slot) for slot in availability['booked_slots']],
+            'free_intervals': [[format_time(s), format_time(e)] for s, e in availability['free']],
+            'busy_intervals': [[format_time(s), format_time(e)] for s, e in availability['busy']],
         })
 
     except Exception as e:
         print(f"❌ Ошибка в get_available_times: {str(e)}")
         return JsonResponse({'error': str(e)}, status=400)
 
-    except Exception as e:
-        print(f"❌ ОШИБКА в get_available_times: {str(e)}")
-        return JsonResponse({'error': str(e)}, status=400)
+@login_required
+def get_availability_matrix(request):
+    """AJAX: Карта занятости комнат (список или офис) за период — один запрос к RoomOccupancy"""
+    room_ids_param = request.GET.get('rooms')
+    office_id = request.GET.get('office')
+
+    try:
+        first_day = datetime.strptime(request.GET.get('start_date'), "%Y-%m-%d").date()
+        last_day = datetime.strptime(request.GET.get('end_date'), "%Y-%m-%d").date()
+        granularity = int(request.GET.get('step', DEFAULT_GRANULARITY))
+        room_ids = [int(x) for x in room_ids_param.split(',') if x] if room_ids_param else []
+    except (TypeError, ValueError):
+        return JsonResponse({'error': 'Укажите start_date и end_date в формате YYYY-MM-DD'}, status=400)
+
+    if granularity not in SLOT_GRANULARITIES:
+        return JsonResponse({'error': 'Недопустимая длина слота'}, status=400)
+    if last_day < first_day or (last_day - first_day).days >= MATRIX_MAX_DAYS:
+        return JsonResponse({'error': f'Период должен быть не длиннее {MATRIX_MAX_DAYS} дней'}, status=400)
+
+    rooms = Room.objects.filter(is_active=True)
+    if room_ids:
+        rooms = rooms.filter(id__in=room_ids)
+    elif office_id:
+        rooms = rooms.filter(office_id=office_id)
+    else:
+        return JsonResponse({'error': 'Укажите комнаты или офис'}, status=400)
+
+    room_ids = list(rooms.order_by('id').values_list('id', flat=True)[:MATRIX_MAX_ROOMS])
+    days, matrix = occupancy_matrix(room_ids, first_day, last_day, granularity)
+
+    # Бит i числа — слот slots[i], 1 = занято
+    return JsonResponse({
+        'step': granularity,
+        'slots': slot_labels(granularity),
+        'days': [day.isoformat() for day in days],
+        'rooms': {str(room_id): masks for room_id, masks in matrix.items()},
+    })
+
+
+@login_required
+def next_slots_page(request):
+    """Страница поиска ближайшего свободного времени"""
+    return render(request, 'next_slots.html', {
+        'offices': Office.objects.filter(is_active=True),
+        'categories': Room.CATEGORY_CHOICES,
+    })
+
+
+@login_required
+def find_next_slots_api(request):
+    """AJAX: Ближайшие свободные окна нужной длины по всем подходящим комнатам"""
+    office_id = request.GET.get('office')
+    category = request.GET.get('category')
+    start_from_str = request.GET.get('from')
+
+    try:
+        participants = int(request.GET.get('participants') or 0)
+        hours = int(request.GET.get('duration', 1))
+        if hours < 1:
+            raise ValueError('duration')
+        if office_id:
+            office_id = int(office_id)
+        duration = timedelta(hours=hours)
+        limit = min(max(int(request.GET.get('limit', 5)), 1), NEXT_SLOTS_MAX)
+        horizon = min(max(int(request.GET.get('days', SEARCH_HORIZON_DAYS)), 1), SEARCH_HORIZON_DAYS)
+        if start_from_str:
+            start_from = timezone.make_aware(
+                datetime.strptime(start_from_str, "%Y-%m-%dT%H:%M"), timezone.get_current_timezone()
+            )
+        else:
+            start_from = timezone.now()
+    except (TypeError, ValueError):
+        return JsonResponse({'error': 'Неверные параметры поиска'}, status=400)
+
+    # Не ищем в прошлом
+    start_from = max(start_from, timezone.now())
+
+    rooms = Room.objects.filter(is_active=True, status='active')
+    if participants > 0:
+        rooms = rooms.filter(capacity__gte=participants)
+    if office_id:
+        rooms = rooms.filter(office_id=office_id)
+    if category:
+        rooms = rooms.filter(category=category)
+
+    rooms_info = {
+        room['id']: room
+        for room in rooms.values('id', 'name', 'capacity', 'price_per_hour', 'office__name')
+    }
+    slots, complete = find_next_slots(list(rooms_info), start_from, duration, limit, horizon)
+
+    return JsonResponse({
+        'complete': complete,
+        'slots': [{
+            'room_id': room_id,
+            'room_name': rooms_info[room_id]['name'],
+            'office': rooms_info[room_id]['office__name'],
+            'capacity': rooms_info[room_id]['capacity'],
+            'price_per_hour': rooms_info[room_id]['price_per_hour'],
+            'date': timezone.localtime(start).strftime('%Y-%m-%d'),
+            'start_time': format_time(start),
+            'end_time': format_time(end),
+        } for start, end, room_id in slots],
+    })
+
 
 @login_required
 def update_avatar(request):
@@ -0,0 +1,172 @@
+"""
+Лист ожидания с автоматическим продвижением.
+
+Когда бронь отменяют или удаляют, первые по очереди заявки на пересекающийся
+интервал этой комнаты превращаются в брони «в ожидании». Очередь читается
+через SELECT ... FOR UPDATE SKIP LOCKED: параллельные отмены и несколько
+обработчиков разбирают разные заявки и не ждут друг друга, а ограничение
+booking_no_overlap гарантирует, что две заявки не займут одно время.
+Заявку, которую держит другой обработчик, не перепрыгиваем: более поздние
+заявки той же комнаты ждут следующего прохода — очередь остаётся FIFO.
+"""
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .availability import is_overlap_error, overlapping_bookings
+from .models import Booking, WaitlistEntry
+from .events import bookings_created
+from .occupancy import booking_changed
+
+
+DEFAULT_BATCH_SIZE = 100
+
+
+def join_waitlist(user, room, start, end, description=''):
+    """
+    Поставить пользователя в очередь на интервал.
+
+    Некорректная заявка — ValueError с текстом для пользователя: интервал
+    в прошлом или пустой, время свободно, либо пользователь уже ждёт его.
+    """
+    if start < timezone.now():
+        raise ValueError('Нельзя бронировать в прошлом!')
+    if end <= start:
+        raise ValueError('Время окончания должно быть позже начала')
+    # Очередь имеет смысл только на действительно занятое время
+    if not overlapping_bookings(start, end, [room.id]).exists():
+        raise ValueError('Это время свободно — его можно забронировать')
+    already_waiting = WaitlistEntry.objects.filter(
+        user=user, room=room, start_time=start, end_time=end, status='waiting',
+    ).exists()
+    if already_waiting:
+        raise ValueError('Вы уже в листе ожидания на это время')
+
+    return WaitlistEntry.objects.create(
+        user=user,
+        room=room,
+        start_time=start,
+        end_time=end,
+        description=description or '',
+    )
+
+
+def _promote(entry):
+    """
+    Попытаться превратить заявку в бронь (внутри транзакции вызывающего).
+
+    Возвращает бронь или None, если интервал всё ещё занят.
+    """
+    try:
+        with transaction.atomic():
+            booking = Booking.objects.create(
+                user_id=entry.user_id,
+                room_id=entry.room_id,
+                start_time=entry.start_time,
+                end_time=entry.end_time,
+                description=entry.description,
+                status='pending',
+            )
+    except IntegrityError as e:
+        if not is_overlap_error(e):
+            raise
+        return None
+
+    entry.status = 'promoted'
+    entry.booking = booking
+    entry.promoted_at = timezone.now()
+    entry.save(update_fields=['status', 'booking', 'promoted_at'])
+    booking_changed(booking)
+    bookings_created([booking])
+
+    # Письмо попадает в outbox в той же транзакции, что и бронь
+    from .email_booking import send_waitlist_promotion
+    send_waitlist_promotion(booking)
+    return booking
+
+
+def _process(entries):
+    """Продвинуть или просрочить заблокированные заявки; вернуть число продвинутых"""
+    now = timezone.now()
+    promoted = 0
+    for entry in entries:
+        if entry.start_time <= now:
+            entry.status = 'expired'
+            entry.save(update_fields=['status'])
+        elif _promote(entry):
+            promoted += 1
+    return promoted
+
+
+def _lock_in_order(queue):
+    """
+    Заблокировать заявки ``queue`` (id, room_id по порядку очереди).
+
+    Свободные строки берутся через SKIP LOCKED, но на заявке, которую
+    держит другой обработчик, очередь её комнаты останавливается: более
+    поздние заявки этой комнаты сейчас не продвигаются.
+    """
+    ids = [entry_id for entry_id, room_id in queue]
+    locked = {
+        entry.id: entry
+        for entry in WaitlistEntry.objects.filter(id__in=ids, status='waiting').select_for_update(skip_locked=True)
+    }
+    # Не попали в выборку: либо уже не ждут (обработаны), либо заблокированы
+    held = set(
+        WaitlistEntry.objects
+        .filter(id__in=[entry_id for entry_id in ids if entry_id not in locked], status='waiting')
+        .values_list('id', flat=True)
+    )
+
+    entries = []
+    blocked_rooms = set()
+    for entry_id, room_id in queue:
+        if room_id in blocked_rooms:
+            continue
+        if entry_id in held:
+            blocked_rooms.add(room_id)
+        elif entry_id in locked:
+            entries.append(locked[entry_id])
+    return entries
+
+
+def promote_waitlist(room_id, start, end):
+    """
+    Интервал [start, end) комнаты освободился — продвинуть очередь.
+
+    Одна транзакция: заявки, пересекающие интервал, блокируются в порядке
+    очереди; заблокированную другим обработчиком заявку не перепрыгиваем.
+    """
+    with transaction.atomic():
+        queue = list(
+            WaitlistEntry.objects
+            .filter(room_id=room_id, status='waiting', start_time__lt=end, end_time__gt=start)
+            .order_by('created_at', 'id')
+            .values_list('id', 'room_id')
+        )
+        return _process(_lock_in_order(queue))
+
+
+def drain_waitlist(batch_size=DEFAULT_BATCH_SIZE, after_id=0):
+    """
+    Разобрать пачку заявок по всем комнатам (по возрастанию id, после ``after_id``).
+
+    Для фоновых обработчиков: несколько процессов могут вызывать функцию
+    одновременно — каждый берёт свои строки благодаря SKIP LOCKED, не
+    перепрыгивая заблокированные заявки своей комнаты.
+    Возвращает (проверено, продвинуто, последний id).
+    """
+    with transaction.atomic():
+        queue = list(
+            WaitlistEntry.objects
+            .filter(status='waiting', id__gt=after_id)
+            .order_by('id')
+            .values_list('id', 'room_id')[:batch_size]
+        )
+        promoted = _process(_lock_in_order(queue))
+    return len(queue), promoted, queue[-1][0] if queue else after_id
+
+
+def booking_released(booking):
+    """Бронь отменена или удалена — после коммита продвинуть очередь"""
+    room_id, start, end = booking.room_id, booking.start_time, booking.end_time
+    transaction.on_commit(lambda: promote_waitlist(room_id, start, end))